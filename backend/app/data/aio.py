@@ -0,0 +1,379 @@
+"""
+Non-blocking access to the synchronous Firestore client.
+
+The admin SDK client blocks the calling thread on every RPC, so calling it
+directly from an ``async def`` handler stalls the whole uvicorn event loop.
+Routers go through the helpers in this module instead: each blocking call is
+run on a bounded thread pool and timed, so one slow collection scan only
+occupies a pool thread while other requests keep being served.
+
+Every call carries the request's deadline (see ``deadline``) as its
+``timeout=`` and retry budget, and point reads may be hedged.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gexc
+
+from app.data import deadline, query_log, replica, unit_of_work
+from app.data.cache import documents as document_cache
+
+MAX_WORKERS = int(os.environ.get("FIRESTORE_MAX_WORKERS", "32"))
+LATENCY_WINDOW = 512
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+class OpStats:
+    """Counters and a rolling latency window for one operation label."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queue_ms = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, elapsed_ms: float, queued_ms: float, failed: bool) -> None:
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.queue_ms += queued_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.latencies.append(elapsed_ms)
+        if failed:
+            self.errors += 1
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        avg = self.total_ms / self.calls if self.calls else 0.0
+        avg_queue = self.queue_ms / self.calls if self.calls else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avgMs": round(avg, 3),
+            "avgQueueMs": round(avg_queue, 3),
+            "maxMs": round(self.max_ms, 3),
+            "p50Ms": _round(self.percentile(50)),
+            "p95Ms": _round(self.percentile(95)),
+            "p99Ms": _round(self.percentile(99)),
+        }
+
+
+_stats: Dict[str, OpStats] = {}
+_stats_lock = threading.Lock()
+_in_flight = 0
+_queued = 0
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS, thread_name_prefix="firestore"
+                )
+    return _executor
+
+
+def _collection_of(target: Any) -> str:
+    """Best-effort collection id for a reference or query, used as a metric label."""
+    if hasattr(target, "_document_path"):
+        # DocumentReference
+        return getattr(target.parent, "id", "?")
+    if hasattr(target, "_parent"):
+        # Query
+        return getattr(target._parent, "id", "?")
+    return getattr(target, "id", "?")
+
+
+def op_stats(label: str) -> Optional[OpStats]:
+    return _stats.get(label)
+
+
+async def run(label: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a blocking Firestore call on the pool and record its latency under
+    ``label``. Raises ``DeadlineExceeded`` once the request's deadline has
+    passed; the pool thread then finishes the call in the background.
+    """
+    global _in_flight, _queued
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+    left = deadline.remaining()
+    expires_at = time.monotonic() + left if left is not None else None
+
+    def call() -> Any:
+        global _in_flight, _queued
+        started = time.perf_counter()
+        with _stats_lock:
+            _queued -= 1
+            _in_flight += 1
+        failed = False
+        try:
+            if expires_at is not None and time.monotonic() >= expires_at:
+                # Waited out the deadline in the pool queue; skip the RPC
+                raise gexc.DeadlineExceeded("Request deadline exceeded before the call started")
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            finished = time.perf_counter()
+            with _stats_lock:
+                _in_flight -= 1
+                stats = _stats.setdefault(label, OpStats())
+                stats.record(
+                    (finished - started) * 1000,
+                    (started - submitted) * 1000,
+                    failed,
+                )
+
+    with _stats_lock:
+        _queued += 1
+    future = loop.run_in_executor(_get_executor(), call)
+    if left is None:
+        return await future
+    try:
+        # shield: a timed-out call keeps its pool thread and still records stats
+        return await asyncio.wait_for(asyncio.shield(future), left)
+    except asyncio.TimeoutError:
+        raise gexc.DeadlineExceeded(f"Request deadline exceeded waiting for {label}")
+
+
+def _with_deadline(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """``kwargs`` plus the current request's ``timeout=`` and ``retry=``."""
+    return {**deadline.call_options(), **kwargs}
+
+
+def _consume(task: asyncio.Future) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+async def _read(label: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    An idempotent read, hedged when the route allows it: if the first
+    attempt has not answered after the operation's p95 latency, a second one
+    is sent and the first successful answer wins.
+    """
+    stats = op_stats(label)
+    if (
+        not deadline.hedging()
+        or stats is None
+        or len(stats.latencies) < deadline.HEDGE_MIN_SAMPLES
+    ):
+        return await run(label, fn, *args, **_with_deadline(kwargs))
+
+    delay_ms = max(stats.percentile(deadline.HEDGE_PERCENTILE), deadline.HEDGE_MIN_DELAY_MS)
+    primary = asyncio.ensure_future(run(label, fn, *args, **_with_deadline(kwargs)))
+    done, _ = await asyncio.wait({primary}, timeout=delay_ms / 1000)
+    if done:
+        return primary.result()
+
+    hedge = asyncio.ensure_future(run(label, fn, *args, **_with_deadline(kwargs)))
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                deadline.note_hedge(won=task is hedge)
+                for other in pending:
+                    other.add_done_callback(_consume)
+                return task.result()
+            error = task.exception()
+    raise error
+
+
+async def get(ref: Any, **kwargs: Any) -> Any:
+    """
+    Read one document: from the request's identity map, then a reference
+    replica, then the document cache, then Firestore.
+    """
+    uow = unit_of_work.current() if not kwargs else None
+    if uow is not None:
+        known = uow.lookup(ref)
+        if known is not None:
+            return known
+    snap = replica.lookup(ref) or document_cache.lookup(ref)
+    if snap is None:
+        started = document_cache.clock()
+        snap = await _read(f"get:{_collection_of(ref)}", ref.get, **kwargs)
+        document_cache.store(ref, snap, started)
+    if uow is not None:
+        uow.remember(ref, snap)
+    return snap
+
+
+async def get_many(client: Any, refs: List[Any]) -> List[Any]:
+    """
+    ``get`` for several documents: what the identity map, replicas and the
+    document cache cannot answer is fetched with a single ``get_all``.
+    """
+    uow = unit_of_work.current()
+    found: Dict[str, Any] = {}
+    missing = []
+    for ref in refs:
+        snap = uow.lookup(ref) if uow is not None else None
+        if snap is None:
+            snap = replica.lookup(ref) or document_cache.lookup(ref)
+            if snap is not None and uow is not None:
+                uow.remember(ref, snap)
+        if snap is None:
+            missing.append(ref)
+        else:
+            found[ref.path] = snap
+    started = document_cache.clock()
+    for snap in await get_all(client, missing):
+        document_cache.store(snap.reference, snap, started)
+        found[snap.reference.path] = snap
+    return [found[ref.path] for ref in refs if ref.path in found]
+
+
+async def get_all(client: Any, refs: List[Any], **kwargs: Any) -> List[Any]:
+    if not refs:
+        return []
+    label = f"get_all:{_collection_of(refs[0])}"
+    snaps = await _read(label, lambda **options: list(client.get_all(refs, **options)), **kwargs)
+    uow = unit_of_work.current() if not kwargs else None
+    if uow is not None:
+        for snap in snaps:
+            uow.remember(snap.reference, snap)
+    return snaps
+
+
+async def stream(query: Any, **kwargs: Any) -> List[Any]:
+    """Run a query and return all of its snapshots as a list."""
+    query_log.record(query)
+    options = _with_deadline(kwargs)
+    return await run(
+        f"stream:{_collection_of(query)}", lambda: list(query.stream(**options))
+    )
+
+
+async def iterate(
+    query: Any, chunk_size: int = 200, streamed: bool = False, **kwargs: Any
+) -> AsyncIterator[List[Any]]:
+    """
+    Run a query and yield its snapshots in chunks as Firestore delivers them.
+
+    Each chunk is pulled from the query's response stream on the pool, so
+    at most ``chunk_size`` snapshots are held at a time. ``streamed`` is for
+    response bodies sent as they are read: the request deadline does not
+    apply, and each chunk gets ``deadline.streaming``'s budget instead.
+    """
+    label = f"iterate:{_collection_of(query)}"
+    query_log.record(query)
+    results = query.stream(**(kwargs if streamed else _with_deadline(kwargs)))
+
+    def take() -> List[Any]:
+        chunk = []
+        for snap in results:
+            chunk.append(snap)
+            if len(chunk) >= chunk_size:
+                break
+        return chunk
+
+    try:
+        while True:
+            if streamed:
+                with deadline.streaming():
+                    chunk = await run(label, take)
+            else:
+                chunk = await run(label, take)
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+    finally:
+        # Cancels the server stream when the consumer stops early
+        close = getattr(results, "close", None)
+        if close is not None:
+            try:
+                close()
+            except ValueError:
+                # Still running on a pool thread after a cancellation
+                pass
+
+
+async def add(collection: Any, data: Dict[str, Any], **kwargs: Any) -> Tuple[Any, Any]:
+    update_time, ref = await run(
+        f"add:{_collection_of(collection)}", collection.add, data, **_with_deadline(kwargs)
+    )
+    replica.note_write(ref, update_time)
+    uow = unit_of_work.current()
+    if uow is not None:
+        uow.record_set(ref, data, update_time)
+    return update_time, ref
+
+
+async def set(ref: Any, data: Dict[str, Any], **kwargs: Any) -> Any:
+    result = await run(f"set:{_collection_of(ref)}", ref.set, data, **_with_deadline(kwargs))
+    document_cache.invalidate(ref)
+    replica.note_write(ref, result.update_time)
+    uow = unit_of_work.current()
+    if uow is not None:
+        uow.record_set(ref, data, result.update_time, merge=bool(kwargs.get("merge")))
+    return result
+
+
+async def update(ref: Any, data: Dict[str, Any], **kwargs: Any) -> Any:
+    result = await run(
+        f"update:{_collection_of(ref)}", ref.update, data, **_with_deadline(kwargs)
+    )
+    document_cache.invalidate(ref)
+    replica.note_write(ref, result.update_time)
+    uow = unit_of_work.current()
+    if uow is not None:
+        uow.record_update(ref, data, result.update_time)
+    return result
+
+
+async def delete(ref: Any, **kwargs: Any) -> Any:
+    delete_time = await run(
+        f"delete:{_collection_of(ref)}", ref.delete, **_with_deadline(kwargs)
+    )
+    document_cache.invalidate(ref)
+    replica.note_write(ref, delete_time, deleted=True)
+    uow = unit_of_work.current()
+    if uow is not None:
+        uow.record_delete(ref, delete_time)
+    return delete_time
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {
+            "maxWorkers": MAX_WORKERS,
+            "inFlight": _in_flight,
+            "queued": _queued,
+            "operations": {label: s.snapshot() for label, s in sorted(_stats.items())},
+            "identityMap": unit_of_work.stats(),
+            "deadlines": deadline.stats(),
+        }
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
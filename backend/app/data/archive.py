@@ -0,0 +1,528 @@
+"""
+Hot/cold archival of closed jobs.
+
+Closed jobs and the records that hang off them (schedule entries, tech
+forms, job notifications, inventory activity) would otherwise stay in the
+collections that job lists, the portals and the reports scan. The
+background ``Archiver`` moves jobs closed more than ``ARCHIVE_AFTER_DAYS``
+ago, with the records ``CHILDREN`` declares, to the ``ARCHIVE_STORE``:
+
+- ``collections`` (default): ``archive_<collection>`` collections in the
+  same database, under the same document ids.
+- ``parquet``: one zstd-compressed Parquet file per job under
+  ``ARCHIVE_PATH``. Needs ``pyarrow``.
+
+The job document is replaced by a stub that keeps ``STUB_FIELDS``, which is
+what job lists, portal lists, the KPI counts and the rollups read, plus
+``archivedAt`` and ``archive`` (the store holding the rest).
+``restore_if_archived`` moves a stub's job and records back; ``get_job``,
+the job writes and the homeowner portal call it, so they always see the
+whole job. A restored job gets ``restoredAt`` and is archived again once
+that is older than the cutoff.
+
+The stub is written first, with a precondition on the version of the job
+that was copied, so an edit in between aborts the move; the records are
+deleted after it. A move too large for one batch marks its stub
+``archiveState: "moving"`` and clears the mark with its last batch, so a
+move that failed part way is visible on the job, counted in
+``partialMoves`` and finished first by the next sweep. Otherwise the sweep
+resumes after the last job it finished, by ``closedAt`` and then id.
+Rollup documents keep their totals.
+"""
+import asyncio
+import logging
+import os
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.data import aio, counters, replica, unit_of_work
+from app.data.cache import documents as document_cache
+from app.data.single_flight import SingleFlight
+from app.data.snapshots import LocalSnapshot
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+STORES = ("collections", "parquet")
+ARCHIVE_STORE = os.environ.get("ARCHIVE_STORE", "collections").strip().lower()
+ARCHIVE_PATH = os.environ.get("ARCHIVE_PATH", "archive")
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+# 0 turns the background sweep off
+SWEEP_INTERVAL_SECONDS = float(os.environ.get("ARCHIVE_SWEEP_INTERVAL", "3600"))
+# Jobs moved per sweep
+MAX_JOBS_PER_SWEEP = 50
+# Firestore's limit on the writes of one batch
+MAX_BATCH_WRITES = 500
+MAX_RESTORE_ATTEMPTS = 3
+PREFIX = "archive_"
+STATE_DOCUMENT = "archiveState/jobs"
+CLOSED = "closed"
+# ``archiveState`` of a stub whose records are not all moved yet
+MOVING = "moving"
+
+# Kept on the stub: the fields lists, filters, counts and rollups read
+STUB_FIELDS = (
+    "customerId",
+    "customerName",
+    "partnerId",
+    "partnerName",
+    "assignedPartnerId",
+    "email",
+    "status",
+    "type",
+    "scheduledDate",
+    "assignedCrewId",
+    "technicianIds",
+    "address",
+    "workflowState",
+    "systemSizeKw",
+    "closedAt",
+    "createdAt",
+    "updatedAt",
+)
+
+
+@dataclass(frozen=True)
+class Child:
+    collection: str
+    # Field holding the job id
+    key: str
+    # Further equality filters a record of the job matches
+    where: Tuple[Tuple[str, Any], ...] = ()
+
+
+CHILDREN: Tuple[Child, ...] = (
+    Child("schedule", "jobId"),
+    Child("tech_jsa", "jobId"),
+    Child("damage_scans", "jobId"),
+    Child("detach_workflows", "jobId"),
+    Child("reset_workflows", "jobId"),
+    Child("notifications", "relatedEntityId", (("relatedEntityType", "job"),)),
+    Child("inventoryActivity", "reference"),
+)
+
+# (collection, document id, data)
+Record = Tuple[str, str, Dict[str, Any]]
+
+_stats = {
+    "sweeps": 0,
+    "jobsArchived": 0,
+    "recordsArchived": 0,
+    "jobsRestored": 0,
+    "recordsRestored": 0,
+    "aborted": 0,
+    "partialMoves": 0,
+    "failures": 0,
+}
+
+_restores = SingleFlight()
+
+
+def _child_query(client: Any, child: Child, job_id: str, prefix: str = "") -> Any:
+    query = client.collection(prefix + child.collection).where(
+        filter=FieldFilter(child.key, "==", job_id)
+    )
+    for field, value in child.where:
+        query = query.where(filter=FieldFilter(field, "==", value))
+    return query
+
+
+async def _children(client: Any, job_id: str, prefix: str = "") -> List[Record]:
+    results = await asyncio.gather(
+        *(aio.stream(_child_query(client, child, job_id, prefix)) for child in CHILDREN)
+    )
+    return [
+        (child.collection, doc.id, doc.to_dict())
+        for child, docs in zip(CHILDREN, results)
+        for doc in docs
+    ]
+
+
+async def _commit(client: Any, label: str, writes: List[Tuple[Any, ...]]) -> Any:
+    """
+    Commit ``writes`` in batches of ``MAX_BATCH_WRITES``, in order, and
+    return the last write time. Each write is ``("set", ref, data)``,
+    ``("delete", ref)`` or ``("update", ref, fields, document, option)``,
+    where ``document`` is the whole document the update leaves.
+    """
+    write_time = None
+    uow = unit_of_work.current()
+    for start in range(0, len(writes), MAX_BATCH_WRITES):
+        chunk = writes[start:start + MAX_BATCH_WRITES]
+        batch = client.batch()
+        for op, ref, *args in chunk:
+            if op == "set":
+                batch.set(ref, args[0])
+            elif op == "update":
+                batch.update(ref, args[0], option=args[2])
+            else:
+                batch.delete(ref)
+        results = await aio.run(label, batch.commit)
+        write_time = max(
+            (result.update_time for result in results if result.update_time is not None),
+            default=write_time,
+        )
+        for op, ref, *args in chunk:
+            document_cache.invalidate(ref)
+            replica.note_write(ref, write_time, deleted=op == "delete")
+            if uow is None:
+                continue
+            if op == "delete":
+                uow.record_delete(ref, write_time)
+            else:
+                uow.record_set(ref, args[0] if op == "set" else args[1], write_time)
+    return write_time
+
+
+async def _adjust_unread(records: List[Record], sign: int) -> None:
+    """Keep the unread notification counters in step with moved notifications."""
+    unread = Counter(
+        data.get("userId")
+        for collection, _, data in records
+        if collection == "notifications" and not data.get("isRead") and data.get("userId")
+    )
+    for user_id, count in unread.items():
+        await counters.unread_notifications_counter(user_id).increment(sign * count)
+
+
+# ---------- Stores ----------
+
+class _CollectionStore:
+    name = "collections"
+
+    async def save(self, client: Any, job_id: str, records: List[Record]) -> None:
+        writes = [
+            ("set", client.collection(PREFIX + collection).document(doc_id), data)
+            for collection, doc_id, data in records
+        ]
+        await _commit(client, "commit:archive", writes)
+
+    async def load(self, client: Any, job_id: str) -> List[Record]:
+        job, children = await asyncio.gather(
+            aio.get(client.collection(PREFIX + "jobs").document(job_id)),
+            _children(client, job_id, PREFIX),
+        )
+        return ([("jobs", job_id, job.to_dict())] if job.exists else []) + children
+
+    async def discard(self, client: Any, job_id: str) -> None:
+        writes = [
+            ("delete", client.collection(PREFIX + collection).document(doc_id))
+            for collection, doc_id, _ in await self.load(client, job_id)
+        ]
+        await _commit(client, "commit:archive", writes)
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        moment = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        return {"__timestamp__": moment.isoformat()}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and "__timestamp__" in value:
+            return datetime.fromisoformat(value["__timestamp__"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+class _ParquetStore:
+    name = "parquet"
+
+    @staticmethod
+    def _path(job_id: str) -> Path:
+        return Path(ARCHIVE_PATH) / f"{job_id}.parquet"
+
+    @staticmethod
+    def _read(path: Path) -> List[Record]:
+        if not path.exists():
+            return []
+        rows = parquet.read_table(path).to_pydict()
+        return [
+            (collection, doc_id, _decode(orjson.loads(data)))
+            for collection, doc_id, data in zip(rows["collection"], rows["id"], rows["data"])
+        ]
+
+    @classmethod
+    def _write(cls, job_id: str, records: List[Record]) -> None:
+        path = cls._path(job_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # An interrupted move adds the records left behind to the file
+        merged = {(collection, doc_id): data for collection, doc_id, data in cls._read(path)}
+        merged.update({(collection, doc_id): data for collection, doc_id, data in records})
+        table = pyarrow.table({
+            "collection": [collection for collection, _ in merged],
+            "id": [doc_id for _, doc_id in merged],
+            "data": [orjson.dumps(_encode(data)).decode() for data in merged.values()],
+        })
+        partial = path.with_suffix(".parquet.partial")
+        parquet.write_table(table, partial, compression="zstd")
+        os.replace(partial, path)
+
+    async def save(self, client: Any, job_id: str, records: List[Record]) -> None:
+        await aio.run("archive:parquet", self._write, job_id, records)
+
+    async def load(self, client: Any, job_id: str) -> List[Record]:
+        return await aio.run("archive:parquet", self._read, self._path(job_id))
+
+    async def discard(self, client: Any, job_id: str) -> None:
+        self._path(job_id).unlink(missing_ok=True)
+
+
+def _store(name: str) -> Any:
+    if name == "collections":
+        return _CollectionStore()
+    if name == "parquet":
+        if pyarrow is None:
+            raise RuntimeError("ARCHIVE_STORE=parquet needs pyarrow")
+        return _ParquetStore()
+    raise ValueError(f"Unknown ARCHIVE_STORE '{name}'. Expected one of: {', '.join(STORES)}")
+
+
+# ---------- Moves ----------
+
+def is_stub(data: Optional[Dict[str, Any]]) -> bool:
+    return bool(data and data.get("archivedAt"))
+
+
+def _option(client: Any, snap: Any) -> Any:
+    if snap.update_time is not None:
+        return client.write_option(last_update_time=snap.update_time)
+    return client.write_option(exists=True)
+
+
+async def archive_job(client: Any, snap: Any) -> bool:
+    """
+    Move the job ``snap`` and its records to the archive, or finish moving
+    the records of a stub. ``False`` if the job changed since ``snap``.
+    """
+    data = snap.to_dict()
+    stubbed = is_stub(data)
+    store = _store(data.get("archive") if stubbed else ARCHIVE_STORE)
+    records = await _children(client, snap.id)
+    ref = client.collection("jobs").document(snap.id)
+    deletes: List[Tuple[Any, ...]] = [
+        ("delete", client.collection(collection).document(doc_id)) for collection, doc_id, _ in records
+    ]
+    writes: List[Tuple[Any, ...]] = []
+    if stubbed:
+        saved = records
+        moving = data.get("archiveState") == MOVING
+        done = {field: value for field, value in data.items() if field != "archiveState"}
+    else:
+        # Copies an interrupted restore left behind are stale
+        await store.discard(client, snap.id)
+        saved = [("jobs", snap.id, data)] + records
+        stub = {field: data[field] for field in STUB_FIELDS if field in data}
+        stub.update(archivedAt=datetime.utcnow(), archive=store.name)
+        done = dict(stub)
+        # Deletes past the stub's batch may fail on their own
+        moving = len(deletes) + 1 > MAX_BATCH_WRITES
+        if moving:
+            stub["archiveState"] = MOVING
+        fields = {field: firestore.DELETE_FIELD for field in data if field not in stub}
+        fields.update(stub)
+        writes.append(("update", ref, fields, stub, _option(client, snap)))
+    if not saved and not moving:
+        return True
+    await store.save(client, snap.id, saved)
+    writes.extend(deletes)
+    if moving:
+        writes.append(("update", ref, {"archiveState": firestore.DELETE_FIELD}, done, None))
+    try:
+        await _commit(client, "commit:archive", writes)
+    except (gexc.FailedPrecondition, gexc.Conflict, gexc.Aborted):
+        # Only the stub's batch has a precondition, so nothing was written.
+        # The job stays hot; the copies are discarded when it is next archived
+        _stats["aborted"] += 1
+        return False
+    except Exception:
+        if moving and ((await aio.get(ref)).to_dict() or {}).get("archiveState") == MOVING:
+            _stats["partialMoves"] += 1
+            logger.error(
+                "Archive of job %s stopped part way; it keeps archiveState=%r until a sweep finishes it",
+                snap.id, MOVING,
+            )
+        raise
+    await _adjust_unread(records, -1)
+    if not stubbed:
+        _stats["jobsArchived"] += 1
+    _stats["recordsArchived"] += len(records)
+    return True
+
+
+async def _restore(client: Any, stub: Any) -> Any:
+    ref = client.collection("jobs").document(stub.id)
+    for _ in range(MAX_RESTORE_ATTEMPTS):
+        data = stub.to_dict()
+        store = _store(data.get("archive") or ARCHIVE_STORE)
+        records = await store.load(client, stub.id)
+        archived = next((record for record in records if record[0] == "jobs"), None)
+        if archived is None:
+            logger.error("Archived job %s is missing from the %s archive", stub.id, store.name)
+            return stub
+        children = [record for record in records if record[0] != "jobs"]
+        # The stub's fields may have been updated since (denormalized names)
+        job = {**archived[2], **{field: data[field] for field in STUB_FIELDS if field in data}}
+        job["restoredAt"] = datetime.utcnow()
+        fields = {
+            **job,
+            "archivedAt": firestore.DELETE_FIELD,
+            "archive": firestore.DELETE_FIELD,
+            "archiveState": firestore.DELETE_FIELD,
+        }
+        writes: List[Tuple[Any, ...]] = [
+            ("set", client.collection(collection).document(doc_id), child)
+            for collection, doc_id, child in children
+        ]
+        writes.append(("update", ref, fields, job, _option(client, stub)))
+        try:
+            write_time = await _commit(client, "commit:restore", writes)
+        except (gexc.FailedPrecondition, gexc.Conflict, gexc.Aborted):
+            stub = await aio.get(ref)
+            if not is_stub(stub.to_dict()):
+                return stub
+            continue
+        await store.discard(client, stub.id)
+        await _adjust_unread(children, 1)
+        _stats["jobsRestored"] += 1
+        _stats["recordsRestored"] += len(children)
+        return LocalSnapshot(stub.id, job, write_time, ref)
+    raise gexc.Aborted(f"Job {stub.id} kept changing while it was being restored")
+
+
+async def restore_if_archived(client: Any, snap: Any) -> Any:
+    """
+    ``snap`` for a job document, unless it is an archived job's stub: then
+    the job and its records are restored and a snapshot of the job is
+    returned. Concurrent calls for one job share the restore.
+    """
+    if snap is None or not snap.exists or not is_stub(snap.to_dict()):
+        return snap
+    restored, _ = await _restores.do(("jobs", snap.id), lambda: _restore(client, snap))
+    return restored
+
+
+# ---------- Sweep ----------
+
+class Archiver:
+    def __init__(self) -> None:
+        self._client: Any = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, client: Any) -> None:
+        if SWEEP_INTERVAL_SECONDS <= 0:
+            return
+        _store(ARCHIVE_STORE)
+        self._client = client
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop between jobs; the next sweep resumes from the checkpoint."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                _stats["failures"] += 1
+                logger.exception("Archive sweep failed")
+            await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+
+    async def sweep(self, client: Any = None) -> int:
+        """Archive up to ``MAX_JOBS_PER_SWEEP`` jobs past the cutoff; returns how many."""
+        client = client or self._client
+        cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+        state_ref = client.document(STATE_DOCUMENT)
+        state = (await aio.get(state_ref)).to_dict() or {}
+        closed = (
+            client.collection("jobs")
+            .where(filter=FieldFilter("workflowState", "==", CLOSED))
+            .where(filter=FieldFilter("closedAt", "<", cutoff))
+            .order_by("closedAt")
+            .order_by("__name__")
+        )
+        if state.get("closedAt") is not None:
+            # The id breaks ties, so jobs closed at the same instant are not skipped
+            cursor = {"closedAt": state["closedAt"]}
+            if state.get("jobId"):
+                cursor["__name__"] = state["jobId"]
+            closed = closed.start_after(cursor)
+        # Moves that stopped part way, which may lie before the checkpoint
+        unfinished = (
+            client.collection("jobs")
+            .where(filter=FieldFilter("archiveState", "==", MOVING))
+            .limit(MAX_JOBS_PER_SWEEP)
+        )
+        finished = set()
+        for snap in await aio.stream(unfinished):
+            if await archive_job(client, snap):
+                finished.add(snap.id)
+        moved = len(finished)
+        closed_docs: List[Any] = []
+        if moved < MAX_JOBS_PER_SWEEP:
+            closed_docs = await aio.stream(closed.limit(MAX_JOBS_PER_SWEEP - moved))
+        for snap in closed_docs:
+            if snap.id not in finished and not await archive_job(client, snap):
+                # Edited meanwhile; retried from the same checkpoint next time
+                break
+            await aio.set(
+                state_ref,
+                {"closedAt": snap.get("closedAt"), "jobId": snap.id, "updatedAt": datetime.utcnow()},
+            )
+            if snap.id not in finished:
+                moved += 1
+
+        if moved < MAX_JOBS_PER_SWEEP:
+            # Jobs restored before the cutoff and not accessed through the archive since
+            restored = (
+                client.collection("jobs")
+                .where(filter=FieldFilter("restoredAt", "<", cutoff))
+                .limit(MAX_JOBS_PER_SWEEP - moved)
+            )
+            for snap in await aio.stream(restored):
+                if snap.to_dict().get("workflowState") == CLOSED and await archive_job(client, snap):
+                    moved += 1
+        _stats["sweeps"] += 1
+        return moved
+
+
+archiver = Archiver()
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "store": ARCHIVE_STORE,
+        "afterDays": ARCHIVE_AFTER_DAYS,
+        "running": archiver._task is not None,
+        "children": [f"{child.collection}.{child.key}" for child in CHILDREN],
+    }
@@ -0,0 +1,407 @@
+"""
+Two-level cache for hot single-document reads.
+
+Level 1 is a bounded LRU with TTL inside each worker process. Level 2 is a
+SQLite file shared by every uvicorn worker on the host, so a document read
+by one worker is served to the others without another Firestore read. It
+holds documents as JSON (``sqlite_store.dumps``), never pickles, in a file
+only the service's user can open; documents JSON cannot hold stay in L1.
+
+Only collections listed in ``DOC_CACHE_NAMESPACES`` are cached, each with
+its own TTL. Writes made through ``app.data.aio`` delete the document from
+both levels and append to an invalidation log in the shared file; every
+worker replays that log into its own LRU at most every
+``INVALIDATION_POLL_SECONDS``, so other workers stop serving the old
+version almost immediately. Writes made outside this service (Cloud
+Functions, the console) are only picked up when the entry expires.
+
+A read that was in flight while its document was invalidated may have
+fetched the old version, so ``store`` drops it: callers pass the ``clock()``
+taken before the read, and the result is not cached if an invalidation for
+the key, by this worker or (checked in the same SQLite transaction as the
+insert) by another one, happened since.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from app.data import sqlite_store
+from app.data.snapshots import LocalSnapshot
+
+logger = logging.getLogger(__name__)
+
+# namespace:ttl_seconds pairs; a namespace is a top-level collection id
+DEFAULT_NAMESPACES = "jobs:30,invoices:30,estimates:30,users:60"
+MAX_ENTRIES = int(os.environ.get("DOC_CACHE_MAX_ENTRIES", "2048"))
+SHARED_PATH = os.environ.get(
+    "DOC_CACHE_SHARED_PATH",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+        "dtrs-erp",
+        "doc-cache.sqlite3",
+    ),
+)
+SHARED_ENABLED = os.environ.get("DOC_CACHE_SHARED", "1") != "0"
+INVALIDATION_POLL_SECONDS = 0.25
+INVALIDATION_RETENTION_SECONDS = 600
+# Longer than any read may take; older local invalidation times are pruned
+STALE_READ_SECONDS = 60
+
+
+def _parse_namespaces(raw: str) -> Dict[str, float]:
+    namespaces = {}
+    for item in raw.split(","):
+        if not item.strip():
+            continue
+        name, _, ttl = item.strip().partition(":")
+        namespaces[name] = float(ttl or 30)
+    return namespaces
+
+
+class NamespaceStats:
+    def __init__(self) -> None:
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "l1Hits": self.l1_hits,
+            "l2Hits": self.l2_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "staleStores": self.stale_stores,
+            "hitRate": round((self.l1_hits + self.l2_hits) / lookups, 4) if lookups else None,
+        }
+
+
+class LRUCache:
+    """Bounded in-process LRU whose entries expire after a fixed TTL."""
+
+    def __init__(self, max_entries: int, ttl: float, stats: NamespaceStats):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = stats
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def discard(self, key: str) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _format_update_time(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, DatetimeWithNanoseconds):
+        # Preconditions compare update times to the nanosecond
+        return "ns:" + value.rfc3339()
+    return value.isoformat()
+
+
+def _parse_update_time(raw: Optional[str]) -> Any:
+    if raw is None:
+        return None
+    if raw.startswith("ns:"):
+        return DatetimeWithNanoseconds.from_rfc3339(raw[3:])
+    return datetime.fromisoformat(raw)
+
+
+def _create_private(path: str) -> None:
+    """Create ``path`` readable by this user only, in a directory no one else can write to."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() or info.st_mode & 0o022:
+            raise PermissionError(f"{directory} must be owned by this user and not writable by others")
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    if hasattr(os, "getuid") and os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by another user")
+    os.chmod(path, 0o600)
+
+
+class SharedTier:
+    """Host-wide cache tier in a SQLite file, shared by all worker processes."""
+
+    def __init__(self, path: str):
+        _create_private(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=0.05, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Pickled entries of earlier versions
+        self._conn.execute("DROP TABLE IF EXISTS entries")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL,"
+            " update_time TEXT, expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS invalidations ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL, at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_invalidations_key ON invalidations (namespace, key, at)"
+        )
+        row = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()
+        self.last_seq = row[0]
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[float, Any]]:
+        """``(expires_at, (data, update_time))`` or ``None``; raises ``ValueError`` on a bad row."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, update_time, expires_at FROM documents WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None or row[2] < time.time():
+            return None
+        return row[2], (sqlite_store.loads(row[0]), _parse_update_time(row[1]))
+
+    def put(self, namespace: str, key: str, value: Any, ttl: float, read_started: float) -> bool:
+        """
+        Store ``value``, a ``(data, update_time)`` pair, unless the key was
+        invalidated since ``read_started``. Raises ``TypeError`` for data
+        JSON cannot hold.
+        """
+        data, update_time = value
+        row = (sqlite_store.dumps(data), _format_update_time(update_time))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                newer = self._conn.execute(
+                    "SELECT 1 FROM invalidations WHERE namespace = ? AND key = ? AND at >= ? LIMIT 1",
+                    (namespace, key, read_started),
+                ).fetchone()
+                if newer is None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO documents (namespace, key, data, update_time, expires_at)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (namespace, key, *row, time.time() + ttl),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return newer is None
+
+    def invalidate(self, namespace: str, key: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM documents WHERE namespace = ? AND key = ?", (namespace, key)
+                )
+                self._conn.execute(
+                    "INSERT INTO invalidations (namespace, key, at) VALUES (?, ?, ?)",
+                    (namespace, key, now),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def invalidations_since(self, seq: int) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, namespace, key, at FROM invalidations WHERE seq > ? ORDER BY seq",
+                (seq,),
+            ).fetchall()
+
+    def prune(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE expires_at < ?", (time.time(),))
+            self._conn.execute(
+                "DELETE FROM invalidations WHERE at < ?",
+                (time.time() - INVALIDATION_RETENTION_SECONDS,),
+            )
+
+
+class DocumentCache:
+    def __init__(self, namespaces: Dict[str, float], shared: Optional[SharedTier]):
+        self.namespaces = namespaces
+        self.shared = shared
+        self.stats = {name: NamespaceStats() for name in namespaces}
+        self._l1 = {
+            name: LRUCache(MAX_ENTRIES, ttl, self.stats[name])
+            for name, ttl in namespaces.items()
+        }
+        self._next_poll = 0.0
+        self._next_prune = 0.0
+        self.shared_errors = 0
+        # (namespace, key) -> when this worker last saw it invalidated
+        self._invalidated: Dict[Tuple[str, str], float] = {}
+
+    def clock(self) -> float:
+        """The time to pass to ``store`` for a read that starts now."""
+        return time.time()
+
+    def _note_invalidated(self, namespace: str, key: str, at: float) -> None:
+        self._invalidated[(namespace, key)] = max(at, self._invalidated.get((namespace, key), 0.0))
+        if len(self._invalidated) > MAX_ENTRIES:
+            horizon = time.time() - STALE_READ_SECONDS
+            self._invalidated = {
+                entry: when for entry, when in self._invalidated.items() if when >= horizon
+            }
+
+    def _namespace_of(self, ref: Any) -> Optional[str]:
+        parent = getattr(ref, "parent", None)
+        if parent is None or getattr(parent, "parent", None) is not None:
+            return None
+        return parent.id if parent.id in self.namespaces else None
+
+    def _sync_invalidations(self) -> None:
+        """Drop L1 entries that another worker has invalidated."""
+        now = time.monotonic()
+        if self.shared is None or now < self._next_poll:
+            return
+        self._next_poll = now + INVALIDATION_POLL_SECONDS
+        try:
+            rows = self.shared.invalidations_since(self.shared.last_seq)
+            if now >= self._next_prune:
+                self._next_prune = now + INVALIDATION_RETENTION_SECONDS / 2
+                self.shared.prune()
+        except sqlite3.Error as exc:
+            self.shared_errors += 1
+            logger.debug("Shared cache poll failed: %s", exc)
+            return
+        for seq, namespace, key, at in rows:
+            self.shared.last_seq = seq
+            l1 = self._l1.get(namespace)
+            if l1 is not None:
+                l1.discard(key)
+                self._note_invalidated(namespace, key, at)
+
+    def lookup(self, ref: Any) -> Optional[LocalSnapshot]:
+        namespace = self._namespace_of(ref)
+        if namespace is None:
+            return None
+        self._sync_invalidations()
+        stats = self.stats[namespace]
+        l1 = self._l1[namespace]
+
+        entry = l1.get(ref.id)
+        if entry is not None:
+            stats.l1_hits += 1
+            data, update_time = entry
+            return LocalSnapshot(ref.id, data, update_time, ref)
+
+        if self.shared is not None:
+            try:
+                shared_entry = self.shared.get(namespace, ref.id)
+            except (sqlite3.Error, ValueError) as exc:
+                self.shared_errors += 1
+                logger.debug("Shared cache read failed: %s", exc)
+                shared_entry = None
+            if shared_entry is not None:
+                expires_at, entry = shared_entry
+                stats.l2_hits += 1
+                l1.put(ref.id, entry, ttl=max(0.0, expires_at - time.time()))
+                data, update_time = entry
+                return LocalSnapshot(ref.id, data, update_time, ref)
+
+        stats.misses += 1
+        return None
+
+    def store(self, ref: Any, snapshot: Any, read_started: float) -> None:
+        """Cache ``snapshot``, read from Firestore by a read that began at ``read_started``."""
+        namespace = self._namespace_of(ref)
+        if namespace is None or not snapshot.exists:
+            return
+        self._sync_invalidations()
+        if self._invalidated.get((namespace, ref.id), 0.0) >= read_started:
+            self.stats[namespace].stale_stores += 1
+            return
+        entry = (snapshot.to_dict(), snapshot.update_time)
+        if self.shared is not None:
+            try:
+                stored = self.shared.put(
+                    namespace, ref.id, entry, self.namespaces[namespace], read_started
+                )
+            except (sqlite3.Error, TypeError, ValueError) as exc:
+                # TypeError: a value JSON cannot hold; the entry stays in L1 only
+                self.shared_errors += 1
+                logger.debug("Shared cache write failed: %s", exc)
+            else:
+                if not stored:
+                    self.stats[namespace].stale_stores += 1
+                    return
+        self._l1[namespace].put(ref.id, entry)
+
+    def invalidate(self, ref: Any) -> None:
+        namespace = self._namespace_of(ref)
+        if namespace is None:
+            return
+        self.stats[namespace].invalidations += 1
+        self._l1[namespace].discard(ref.id)
+        self._note_invalidated(namespace, ref.id, time.time())
+        if self.shared is not None:
+            try:
+                self.shared.invalidate(namespace, ref.id)
+            except sqlite3.Error as exc:
+                self.shared_errors += 1
+                logger.warning("Shared cache invalidation failed for %s: %s", ref.id, exc)
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        return {
+            "sharedTier": self.shared is not None,
+            "sharedErrors": self.shared_errors,
+            "namespaces": {
+                name: {
+                    "ttlSeconds": self.namespaces[name],
+                    "l1Entries": len(self._l1[name]),
+                    **self.stats[name].snapshot(),
+                }
+                for name in self.namespaces
+            },
+        }
+
+
+def _build_cache() -> DocumentCache:
+    namespaces = _parse_namespaces(os.environ.get("DOC_CACHE_NAMESPACES", DEFAULT_NAMESPACES))
+    shared = None
+    if SHARED_ENABLED and namespaces:
+        try:
+            shared = SharedTier(SHARED_PATH)
+        except (sqlite3.Error, OSError) as exc:
+            logger.warning("Shared document cache disabled: %s", exc)
+    return DocumentCache(namespaces, shared)
+
+
+documents = _build_cache()
@@ -0,0 +1,70 @@
+"""
+Conditional GETs: strong ETags and ``304 Not Modified``.
+
+A single document's ETag is its ``update_time`` (the same format that
+``writes`` sends for ``If-Match``), so a read answered by the identity map,
+a replica or the document cache can return 304 without touching Firestore.
+A list's ETag is a hash of the ids and update times of its documents plus
+the page token; the query still runs, but an unchanged page is not
+serialized or sent again. Computed responses (KPIs) hash their body.
+"""
+import hashlib
+from typing import Any, Iterable, Optional, Set
+
+from fastapi import Header, Response
+from fastapi.responses import ORJSONResponse
+
+from app.data.writes import format_etag
+
+
+def if_none_match(
+    value: Optional[str] = Header(default=None, alias="If-None-Match"),
+) -> Optional[Set[str]]:
+    """Dependency parsing ``If-None-Match`` into a set of opaque tags."""
+    if value is None:
+        return None
+    return {_opaque(tag) for tag in value.split(",") if tag.strip()}
+
+
+def _opaque(tag: str) -> str:
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def matches(etag: str, tags: Optional[Set[str]]) -> bool:
+    return bool(tags) and ("*" in tags or etag in tags)
+
+
+def document_etag(snapshot: Any) -> str:
+    return format_etag(snapshot.update_time)
+
+
+def result_etag(docs: Iterable[Any], *extra: Any) -> str:
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(f"{doc.id}@{doc.update_time.isoformat()}\n".encode())
+    for part in extra:
+        digest.update(f"{part}\n".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def conditional(response: Response, etag: str, tags: Optional[Set[str]]) -> Response:
+    """``response`` tagged with ``etag``, or a 304 if the client already has it."""
+    if matches(etag, tags):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return response
+
+
+def conditional_json(content: Any, tags: Optional[Set[str]]) -> Response:
+    response = ORJSONResponse(content=content)
+    return conditional(response, body_etag(response.body), tags)
@@ -0,0 +1,311 @@
+"""
+Sharded counters for values many requests change at once.
+
+Firestore sustains roughly one write per second to a single document, so a
+counter that every crew or every job transition bumps cannot live in one
+field. A ``ShardedCounter`` keeps a compacted base value in a field of its
+base document and spreads increments over ``SHARDS`` shard documents in the
+base document's ``counterShards`` subcollection; an increment touches one
+random shard.
+
+``value`` reads the base document and all shards in a single ``get_all``
+(one consistent read time). Deductions that must not go below zero use
+``take``, which compensates a deduction that overdrew the counter. A background task periodically folds shard
+deltas into the base field, so code that only reads the base field (list
+views, the low-stock trigger on ``inventoryItems.totalQuantity``) lags by
+at most ``COMPACT_INTERVAL_SECONDS``. Compaction resets each shard under a
+``last_update_time`` precondition in the same batch that adds to the base,
+so concurrent compactions in other workers cannot double-apply a delta.
+
+The Cloud Functions write to the same layout (see ``functions/counters.js``).
+"""
+import asyncio
+import logging
+import os
+import random
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.data import aio, query_log, replica, storage
+
+logger = logging.getLogger(__name__)
+
+SHARDS = 10
+SHARD_COLLECTION = "counterShards"
+COUNTERS_COLLECTION = "counters"
+COMPACT_INTERVAL_SECONDS = float(os.environ.get("COUNTER_COMPACT_INTERVAL", "60"))
+# Attempts of a take that racing takes overdrew, and the pause between them
+MAX_TAKE_ATTEMPTS = 3
+TAKE_BACKOFF_SECONDS = 0.05
+
+_client: Any = None
+_compactor: Optional[asyncio.Task] = None
+_stats = {
+    "increments": 0,
+    "reads": 0,
+    "seeded": 0,
+    "overdrawn": 0,
+    "compacted": 0,
+    "compactionConflicts": 0,
+}
+
+
+class ShardedCounter:
+    def __init__(self, base_ref: Any, field: str):
+        self.base_ref = base_ref
+        self.field = field
+
+    def _shard(self, index: int) -> Any:
+        return self.base_ref.collection(SHARD_COLLECTION).document(f"{self.field}-{index}")
+
+    async def _add(self, shard: Any, amount: int) -> None:
+        _stats["increments"] += 1
+        await aio.set(shard, {"field": self.field, "delta": firestore.Increment(amount)}, merge=True)
+
+    async def increment(self, amount: int = 1) -> None:
+        if not amount:
+            return
+        await self._add(self._shard(random.randrange(SHARDS)), amount)
+
+    def _read(self, transaction: Any) -> Tuple[Dict[str, Any], int]:
+        """Base document data and shard total, read in ``transaction``."""
+        refs = [self.base_ref] + [self._shard(i) for i in range(SHARDS)]
+        base_data: Dict[str, Any] = {}
+        total = 0
+        for snap in _client.get_all(refs, transaction=transaction):
+            if not snap.exists:
+                continue
+            if snap.reference.path == self.base_ref.path:
+                base_data = snap.to_dict() or {}
+            else:
+                total += (snap.to_dict() or {}).get("delta", 0)
+        return base_data, total
+
+    async def value(self, seed: Optional[Any] = None) -> int:
+        """
+        Current value: base field plus all shard deltas.
+
+        ``seed`` is a query whose count() is the current value, for a counter
+        whose base field does not exist yet. The seed already includes what
+        the shards hold, so the base is stored as the count minus the shard
+        total, both read in one transaction: an increment racing the seed is
+        either in both or in neither.
+        """
+        _stats["reads"] += 1
+        refs = [self.base_ref] + [self._shard(i) for i in range(SHARDS)]
+        snaps = {snap.reference.path: snap for snap in await aio.get_all(_client, refs)}
+        base_snap = snaps.get(self.base_ref.path)
+        base_data = base_snap.to_dict() if base_snap is not None and base_snap.exists else {}
+        total = sum(
+            (snap.to_dict() or {}).get("delta", 0)
+            for path, snap in snaps.items()
+            if path != self.base_ref.path and snap.exists
+        )
+        if self.field not in base_data and seed is not None:
+            query_log.record(seed)
+            return await aio.run(f"seed:{self.base_ref.parent.id}", self._seed, seed)
+        return base_data.get(self.field, 0) + total
+
+    def _seed(self, query: Any) -> int:
+        def seed(transaction: Any) -> Tuple[int, bool]:
+            base_data, total = self._read(transaction)
+            if self.field in base_data:
+                # Seeded concurrently by another request
+                return base_data[self.field] + total, False
+            counted = int(query.count().get(transaction=transaction)[0][0].value)
+            transaction.set(self.base_ref, {self.field: counted - total}, merge=True)
+            return counted, True
+
+        value, seeded = storage.run_transaction(_client, seed)
+        if seeded:
+            _stats["seeded"] += 1
+        return value
+
+    async def take(self, amount: int) -> bool:
+        """
+        Subtract ``amount`` unless that would take the value below zero.
+        Returns whether ``amount`` was taken.
+
+        A take touches one shard, like ``increment``, so concurrent takes
+        of the same counter do not contend: it checks the value, decrements
+        a random shard, reads the value again and, if the takes racing it
+        overdrew the counter, adds ``amount`` back and tries again after a
+        random pause, up to ``MAX_TAKE_ATTEMPTS`` times. Until the amount is
+        back, readers may see the value below zero, and a compaction landing
+        in that window folds the dip into the base field until the next one.
+        Racing takes that keep overdrawing together may all be refused.
+        """
+        for attempt in range(1, MAX_TAKE_ATTEMPTS + 1):
+            if await self.value() < amount:
+                return False
+            shard = self._shard(random.randrange(SHARDS))
+            await self._add(shard, -amount)
+            if await self.value() >= 0:
+                return True
+            await self._add(shard, amount)
+            _stats["overdrawn"] += 1
+            await asyncio.sleep(random.uniform(0, TAKE_BACKOFF_SECONDS * attempt))
+        return False
+
+
+def counter(name: str) -> ShardedCounter:
+    """A standalone counter stored at ``counters/{name}``."""
+    return ShardedCounter(_client.collection(COUNTERS_COLLECTION).document(name), "value")
+
+
+async def count(query: Any) -> int:
+    """Server-side count() aggregation of ``query``."""
+    query_log.record(query)
+    results = await aio.run("count", lambda: query.count().get())
+    return int(results[0][0].value)
+
+
+# ---------- Domain counters ----------
+
+def job_state_counter(state: str) -> ShardedCounter:
+    return counter(f"jobs.state.{state}")
+
+
+async def job_state_count(state: str) -> int:
+    query = _client.collection("jobs").where(filter=FieldFilter("workflowState", "==", state))
+    return await job_state_counter(state).value(seed=query)
+
+
+async def job_state_counts(states: List[str]) -> Dict[str, int]:
+    values = await asyncio.gather(*(job_state_count(state) for state in states))
+    return dict(zip(states, values))
+
+
+async def job_state_changed(old_state: Optional[str], new_state: Optional[str]) -> None:
+    """
+    Move one job between per-state counters (``None`` state for create/delete).
+    Per-partner counts live in the partner rollups (``rollups``).
+    """
+    if old_state == new_state:
+        return
+    updates = []
+    if old_state:
+        updates.append(job_state_counter(old_state).increment(-1))
+    if new_state:
+        updates.append(job_state_counter(new_state).increment(1))
+    await asyncio.gather(*updates)
+
+
+def unread_notifications_counter(user_id: str) -> ShardedCounter:
+    return counter(f"notifications.unread.{user_id}")
+
+
+async def unread_notification_count(user_id: str) -> int:
+    query = (
+        _client.collection("notifications")
+        .where(filter=FieldFilter("userId", "==", user_id))
+        .where(filter=FieldFilter("isRead", "==", False))
+    )
+    return await unread_notifications_counter(user_id).value(seed=query)
+
+
+async def add_notification(data: Dict[str, Any]) -> Any:
+    """
+    Create a notification and count it in its user's unread counter, in one
+    batch (as ``addNotification`` in ``functions/counters.js``), so a seed
+    sees both or neither. Returns the new document's reference.
+    """
+    ref = _client.collection("notifications").document()
+    batch = _client.batch()
+    batch.set(ref, data)
+    if not data.get("isRead") and data.get("userId"):
+        counter = unread_notifications_counter(data["userId"])
+        shard = counter._shard(random.randrange(SHARDS))
+        batch.set(shard, {"field": counter.field, "delta": firestore.Increment(1)}, merge=True)
+        _stats["increments"] += 1
+    results = await aio.run("commit:notifications", batch.commit)
+    replica.note_write(ref, results[0].update_time)
+    return ref
+
+
+def item_quantity(item_id: str) -> ShardedCounter:
+    """``inventoryItems/{item_id}.totalQuantity``, with shard deltas pending compaction."""
+    return ShardedCounter(_client.collection("inventoryItems").document(item_id), "totalQuantity")
+
+
+# ---------- Compaction ----------
+
+async def compact() -> int:
+    """Fold every non-zero shard into its base field. Returns counters compacted."""
+    query = _client.collection_group(SHARD_COLLECTION).where(filter=FieldFilter("delta", "!=", 0))
+    groups: Dict[Tuple[str, str], List[Any]] = defaultdict(list)
+    bases: Dict[str, Any] = {}
+    for snap in await aio.stream(query):
+        data = snap.to_dict()
+        base_ref = snap.reference.parent.parent
+        bases[base_ref.path] = base_ref
+        groups[(base_ref.path, data.get("field", "value"))].append(snap)
+
+    base_snaps = {
+        snap.reference.path: snap
+        for snap in await aio.get_all(_client, list(bases.values()))
+    }
+    compacted = 0
+    for (base_path, field), shards in groups.items():
+        base_snap = base_snaps.get(base_path)
+        if base_snap is None or not base_snap.exists or base_snap.to_dict().get(field) is None:
+            # Not seeded yet; folding shards into a missing base would make
+            # the seed skip documents counted before the counter existed.
+            continue
+        batch = _client.batch()
+        total = 0
+        for shard in shards:
+            total += shard.to_dict().get("delta", 0)
+            batch.update(
+                shard.reference,
+                {"delta": 0},
+                option=_client.write_option(last_update_time=shard.update_time),
+            )
+        batch.update(
+            bases[base_path],
+            {field: firestore.Increment(total)},
+            option=_client.write_option(last_update_time=base_snap.update_time),
+        )
+        try:
+            await aio.run("commit:counters", batch.commit)
+        except Exception as exc:
+            # A shard changed since it was read; it is picked up next round.
+            _stats["compactionConflicts"] += 1
+            logger.debug("Compaction of %s.%s skipped: %s", base_path, field, exc)
+            continue
+        compacted += 1
+    _stats["compacted"] += compacted
+    return compacted
+
+
+async def _compact_forever() -> None:
+    while True:
+        await asyncio.sleep(COMPACT_INTERVAL_SECONDS)
+        try:
+            await compact()
+        except Exception:
+            logger.exception("Counter compaction failed")
+
+
+def start(client: Any) -> None:
+    global _client, _compactor
+    _client = client
+    _compactor = asyncio.get_running_loop().create_task(_compact_forever())
+
+
+async def stop() -> None:
+    global _compactor
+    if _compactor is not None:
+        _compactor.cancel()
+        try:
+            await _compactor
+        except asyncio.CancelledError:
+            pass
+        _compactor = None
+
+
+def stats() -> Dict[str, Any]:
+    return dict(_stats)
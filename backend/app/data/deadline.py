@@ -0,0 +1,161 @@
+"""
+Request deadlines for Firestore calls.
+
+``DeadlineMiddleware`` starts a deadline for every request, from the
+``RoutePolicy`` of the longest matching path prefix. The helpers in
+``aio`` pass the time left as ``timeout=`` and a ``Retry`` bounded by it to
+every Firestore call, and stop waiting for a call once the deadline has
+passed, so one stuck RPC cannot hold a request past its budget. An expired
+deadline raises ``DeadlineExceeded``, which the middleware turns into a 504.
+
+Policies also decide whether idempotent point reads are hedged: when a
+read has not answered within the p95 latency of its operation, a second
+identical read is sent and whichever answers first is used.
+
+Defaults come from ``REQUEST_TIMEOUT_SECONDS`` and ``HEDGE_READS``;
+``ROUTE_DEADLINES`` overrides them per path prefix as JSON, e.g.
+``{"/reporting": {"timeout": 60, "hedge": false}}``.
+
+A streamed response body (NDJSON exports) is read after its headers have
+been sent, when an expired request deadline could only cut it off without
+an error the client can see. Each chunk it reads gets a fresh budget of
+``STREAM_CHUNK_TIMEOUT_SECONDS`` instead (``streaming``).
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterator, Optional
+
+from google.api_core import exceptions as gexc
+from google.api_core.retry import Retry
+
+DEFAULT_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "10"))
+HEDGE_READS = os.environ.get("HEDGE_READS", "1") == "1"
+STREAM_CHUNK_TIMEOUT_SECONDS = float(os.environ.get("STREAM_CHUNK_TIMEOUT_SECONDS", "30"))
+# A hedge is only sent once the operation has this many latency samples
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 95
+# Floor for the hedge delay, so a fast operation is not read twice routinely
+HEDGE_MIN_DELAY_MS = 5.0
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    timeout: float = DEFAULT_TIMEOUT_SECONDS
+    hedge: bool = HEDGE_READS
+
+
+DEFAULT_POLICY = RoutePolicy()
+
+ROUTE_POLICIES: Dict[str, RoutePolicy] = {
+    # Scans over whole collections or date ranges
+    "/reporting": RoutePolicy(timeout=60, hedge=False),
+    "/automation": RoutePolicy(timeout=60, hedge=False),
+    # Interactive point lookups
+    "/jobs": RoutePolicy(timeout=5),
+    "/portals": RoutePolicy(timeout=5),
+    "/tech": RoutePolicy(timeout=5),
+    "/auth": RoutePolicy(timeout=5),
+    # Caps the deadlines of all of a batch's sub-requests
+    "/batch": RoutePolicy(timeout=30),
+}
+
+for _prefix, _overrides in json.loads(os.environ.get("ROUTE_DEADLINES", "{}")).items():
+    ROUTE_POLICIES[_prefix] = replace(ROUTE_POLICIES.get(_prefix, DEFAULT_POLICY), **_overrides)
+
+
+def policy_for(path: str) -> RoutePolicy:
+    best = ""
+    for prefix in ROUTE_POLICIES:
+        if path.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return ROUTE_POLICIES[best] if best else DEFAULT_POLICY
+
+
+class Deadline:
+    def __init__(self, policy: RoutePolicy):
+        self.policy = policy
+        self.expires_at = time.monotonic() + policy.timeout
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+_stats = {"requests": 0, "exceeded": 0, "hedged": 0, "hedgeWins": 0}
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def begin(policy: RoutePolicy) -> Iterator[Deadline]:
+    """Start a deadline; nested in another one (batch sub-requests) it ends no later."""
+    deadline = Deadline(policy)
+    outer = _current.get()
+    if outer is not None:
+        deadline.expires_at = min(deadline.expires_at, outer.expires_at)
+    token = _current.set(deadline)
+    _stats["requests"] += 1
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def streaming(timeout: float = STREAM_CHUNK_TIMEOUT_SECONDS) -> Iterator[Deadline]:
+    """A deadline for one chunk of a streamed body, replacing the request's."""
+    deadline = Deadline(RoutePolicy(timeout=timeout, hedge=False))
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request; raises once the deadline has passed."""
+    deadline = _current.get()
+    if deadline is None:
+        return None
+    left = deadline.remaining()
+    if left <= 0:
+        _stats["exceeded"] += 1
+        raise gexc.DeadlineExceeded("Request deadline exceeded")
+    return left
+
+
+def call_options() -> Dict[str, Any]:
+    """``timeout=`` and ``retry=`` for a Firestore call made now."""
+    left = remaining()
+    if left is None:
+        return {}
+    return {"timeout": left, "retry": Retry(deadline=left)}
+
+
+def hedging() -> bool:
+    deadline = _current.get()
+    return deadline is not None and deadline.policy.hedge
+
+
+def note_hedge(won: bool) -> None:
+    _stats["hedged"] += 1
+    if won:
+        _stats["hedgeWins"] += 1
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "defaultTimeoutSeconds": DEFAULT_TIMEOUT_SECONDS,
+        "routes": {
+            prefix: {"timeout": policy.timeout, "hedge": policy.hedge}
+            for prefix, policy in sorted(ROUTE_POLICIES.items())
+        },
+    }
@@ -0,0 +1,337 @@
+"""
+Denormalized display fields and their propagation.
+
+Invoices, jobs, estimates and contacts carry copies of names that live on
+other documents (``partnerName``, ``customerName``) so that lists and
+exports never join. ``RULES`` declares each copy: the source collection
+and fields, how the copied value is derived, and every target collection
+and field it is copied to, found through a key field (``partnerId``,
+``customerId``).
+
+New documents get the current values from ``fill`` when they are created.
+When a copied field of a source document changes, ``source_changed``
+records a propagation job in ``denormalizationJobs``; the background ``Propagator`` then walks
+each target collection in pages of ``BATCH_SIZE`` and rewrites the copies
+that differ. Each page's writes and the job's checkpoint (target index and
+cursor) are committed in one batch with a precondition on the job's
+previous version, so a restarted worker resumes where the last one
+stopped, and a rename that arrives mid-run restarts the job with the new
+value instead of racing it.
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gexc
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.data import aio, replica
+from app.data.cache import documents as document_cache
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "denormalizationJobs"
+BATCH_SIZE = int(os.environ.get("DENORMALIZE_BATCH_SIZE", "200"))
+POLL_INTERVAL_SECONDS = float(os.environ.get("DENORMALIZE_POLL_INTERVAL", "30"))
+# Pending jobs taken per pass
+MAX_JOBS_PER_PASS = 20
+
+
+@dataclass(frozen=True)
+class Target:
+    collection: str
+    # The denormalized copy, e.g. ``partnerName``
+    field: str
+    # Field of the target document that holds the source's key
+    key: str
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    source: str
+    # Source fields the copy is derived from; a change to any of them propagates
+    fields: Tuple[str, ...]
+    targets: Tuple[Target, ...]
+    # Source field the targets' key refers to; the document id when None
+    key: Optional[str] = None
+    derive: Optional[Callable[[Dict[str, Any]], Any]] = None
+
+    def value(self, data: Dict[str, Any]) -> Any:
+        if self.derive is not None:
+            return self.derive(data)
+        return data.get(self.fields[0])
+
+    def source_key(self, snap: Any) -> Optional[str]:
+        if self.key is None:
+            return snap.id
+        return (snap.to_dict() or {}).get(self.key)
+
+
+def _full_name(data: Dict[str, Any]) -> Optional[str]:
+    name = f"{data.get('firstName') or ''} {data.get('lastName') or ''}".strip()
+    return name or None
+
+
+RULES: Tuple[Rule, ...] = (
+    Rule(
+        name="partners.name",
+        source="roofingPartners",
+        fields=("companyName",),
+        targets=(
+            Target("invoices", "partnerName", "partnerId"),
+            Target("jobs", "partnerName", "partnerId"),
+            Target("contacts", "partnerName", "partnerId"),
+        ),
+    ),
+    Rule(
+        name="customers.name",
+        source="users",
+        fields=("firstName", "lastName"),
+        key="customerId",
+        derive=_full_name,
+        targets=(
+            Target("invoices", "customerName", "customerId"),
+            Target("jobs", "customerName", "customerId"),
+            Target("estimates", "customerName", "customerId"),
+        ),
+    ),
+)
+
+RULES_BY_NAME = {rule.name: rule for rule in RULES}
+
+_stats = {
+    "filled": 0,
+    "queued": 0,
+    "completed": 0,
+    "batches": 0,
+    "documentsUpdated": 0,
+    "restarts": 0,
+    "failures": 0,
+}
+
+
+async def _source(client: Any, rule: Rule, key: str) -> Optional[Any]:
+    """The source document targets refer to with ``key``, or ``None``."""
+    if rule.key is None:
+        snap = await aio.get(client.collection(rule.source).document(key))
+        return snap if snap.exists else None
+    local = replica.fresh_replica(rule.source)
+    if local is not None:
+        found = local.where(**{rule.key: key})
+    else:
+        query = client.collection(rule.source).where(filter=FieldFilter(rule.key, "==", key))
+        found = await aio.stream(query.limit(1))
+    return found[0] if found else None
+
+
+async def fill(client: Any, collection: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Set the denormalized fields of a new ``collection`` document from their sources."""
+    for rule in RULES:
+        for target in rule.targets:
+            key = data.get(target.key) if target.collection == collection else None
+            if not key:
+                continue
+            source = await _source(client, rule, key)
+            if source is None:
+                continue
+            value = rule.value(source.to_dict() or {})
+            if value is not None:
+                data[target.field] = value
+                _stats["filled"] += 1
+    return data
+
+
+def _job_ref(client: Any, rule: Rule, source_ref: Any) -> Any:
+    return client.collection(JOBS_COLLECTION).document(f"{rule.name}:{source_ref.id}")
+
+
+def source_fields(collection: str, data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The fields of a ``collection`` document that rules copy from, or ``None``."""
+    if data is None:
+        return None
+    fields = {field for rule in RULES if rule.source == collection for field in rule.fields}
+    return {field: data[field] for field in fields if field in data}
+
+
+async def source_changed(
+    client: Any, ref: Any, before: Optional[Dict[str, Any]], after: Dict[str, Any]
+) -> None:
+    """
+    Queue propagation for the rules whose source fields changed from
+    ``before`` (``None`` for a new document) to ``after``, both as returned
+    by ``source_fields``. Fields missing from ``after`` were not written.
+    Resets a job already queued for the source.
+    """
+    queued = False
+    for rule in RULES:
+        if rule.source != ref.parent.id:
+            continue
+        written = [field for field in rule.fields if field in after]
+        if not written:
+            continue
+        if before is not None and all(before.get(field) == after[field] for field in written):
+            continue
+        await aio.set(
+            _job_ref(client, rule, ref),
+            {
+                "rule": rule.name,
+                "source": ref.path,
+                "status": "pending",
+                "target": 0,
+                "cursor": None,
+                "requestedAt": datetime.utcnow(),
+            },
+        )
+        _stats["queued"] += 1
+        queued = True
+    if queued:
+        propagator.wake()
+
+
+class Propagator:
+    def __init__(self) -> None:
+        self._client: Any = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self, client: Any) -> None:
+        self._client = client
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop after the current page; unfinished jobs resume from their checkpoint."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_pending()
+            except Exception:
+                _stats["failures"] += 1
+                logger.exception("Denormalization pass failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_pending(self) -> None:
+        """Run queued jobs, including those another worker left unfinished."""
+        query = (
+            self._client.collection(JOBS_COLLECTION)
+            .where(filter=FieldFilter("status", "==", "pending"))
+            .limit(MAX_JOBS_PER_PASS)
+        )
+        for job in await aio.stream(query):
+            try:
+                await self.run_job(job)
+            except gexc.FailedPrecondition:
+                # Requeued or advanced by someone else; the next pass picks it up
+                _stats["restarts"] += 1
+            except gexc.NotFound as exc:
+                # Targets keep being deleted under the job; it resumes next pass
+                _stats["failures"] += 1
+                logger.warning("Denormalization job %s stopped: %s", job.id, exc)
+
+    async def run_job(self, job: Any) -> None:
+        client = self._client
+        state = job.to_dict()
+        rule = RULES_BY_NAME.get(state.get("rule"))
+        source = await aio.get(client.document(state["source"]))
+        key = rule.source_key(source) if rule is not None and source.exists else None
+        value = rule.value(source.to_dict()) if key else None
+        if value is None:
+            # Unknown rule, a deleted source, or no value to copy (as in
+            # ``fill``): the copies keep their last value
+            await aio.update(
+                job.reference,
+                {"status": "done", "updatedAt": datetime.utcnow()},
+                option=client.write_option(last_update_time=job.update_time),
+            )
+            return
+        version = job.update_time
+        target_index, cursor = state.get("target", 0), state.get("cursor")
+        retried = False
+        while target_index < len(rule.targets):
+            target = rule.targets[target_index]
+            query = (
+                client.collection(target.collection)
+                .where(filter=FieldFilter(target.key, "==", key))
+                .order_by("__name__")
+            )
+            if cursor:
+                query = query.start_after({"__name__": cursor})
+            docs = await aio.stream(query.limit(BATCH_SIZE))
+
+            batch = client.batch()
+            changed: List[Any] = [
+                doc.reference for doc in docs if (doc.to_dict() or {}).get(target.field) != value
+            ]
+            for ref in changed:
+                batch.update(ref, {target.field: value})
+            if len(docs) < BATCH_SIZE:
+                next_index, next_cursor = target_index + 1, None
+            else:
+                next_index, next_cursor = target_index, docs[-1].id
+            done = next_index >= len(rule.targets)
+            batch.update(
+                job.reference,
+                {
+                    "status": "done" if done else "pending",
+                    "target": next_index,
+                    "cursor": next_cursor,
+                    "value": value,
+                    "updatedAt": datetime.utcnow(),
+                },
+                option=client.write_option(last_update_time=version),
+            )
+            try:
+                results = await aio.run("commit:denormalize", batch.commit)
+            except gexc.NotFound:
+                if retried:
+                    raise
+                # A target was deleted since the page was read; read it again
+                retried = True
+                continue
+            retried = False
+            target_index, cursor = next_index, next_cursor
+            version = results[-1].update_time
+            for ref in changed:
+                document_cache.invalidate(ref)
+                replica.note_write(ref, version)
+            _stats["batches"] += 1
+            _stats["documentsUpdated"] += len(changed)
+        _stats["completed"] += 1
+
+
+propagator = Propagator()
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        **_stats,
+        "running": propagator._task is not None,
+        "rules": {
+            rule.name: {
+                "source": f"{rule.source}.{'+'.join(rule.fields)}",
+                "targets": [f"{target.collection}.{target.field}" for target in rule.targets],
+            }
+            for rule in RULES
+        },
+    }
@@ -0,0 +1,199 @@
+"""
+Adaptive concurrency limit for requests, with priority classes.
+
+The limit follows request latency instead of being fixed: a short-term
+latency average is compared with a long-term baseline, and the limit
+shrinks when requests get slower than the baseline (Firestore or the pool
+is saturating) and grows back while they are not (gradient). Failed or
+timed-out requests cut the limit multiplicatively (AIMD backoff).
+
+Each priority may only fill its share of the limit, so reports and
+exports are the first to wait and tech field writes and payment webhooks
+the last. A request over its share waits in a bounded per-priority queue
+for at most its ``max_wait``; when the queue is full or the wait runs out
+it is shed, and the middleware answers 503 with ``Retry-After``.
+"""
+import asyncio
+import math
+import os
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Deque, Dict
+
+
+class Priority(IntEnum):
+    CRITICAL = 0
+    NORMAL = 1
+    LOW = 2
+
+
+@dataclass(frozen=True)
+class PriorityClass:
+    share: float  # fraction of the limit this priority may fill
+    max_queue: int
+    max_wait: float  # seconds
+    retry_after: int  # seconds, sent with a 503
+
+
+CLASSES: Dict[Priority, PriorityClass] = {
+    Priority.CRITICAL: PriorityClass(share=1.0, max_queue=200, max_wait=5.0, retry_after=1),
+    Priority.NORMAL: PriorityClass(share=0.9, max_queue=100, max_wait=2.0, retry_after=2),
+    Priority.LOW: PriorityClass(share=0.5, max_queue=20, max_wait=1.0, retry_after=10),
+}
+
+INITIAL_LIMIT = float(os.environ.get("CONCURRENCY_INITIAL_LIMIT", "64"))
+MIN_LIMIT = float(os.environ.get("CONCURRENCY_MIN_LIMIT", "8"))
+MAX_LIMIT = float(os.environ.get("CONCURRENCY_MAX_LIMIT", "512"))
+# Latency may rise to this multiple of the baseline before the limit shrinks
+TOLERANCE = 1.5
+SHORT_ALPHA = 0.1
+# The baseline follows latency down at once but up only slowly, so it
+# approximates the unloaded latency
+LONG_ALPHA = 0.002
+SMOOTHING = 0.2
+BACKOFF = 0.9
+
+
+class Shed(Exception):
+    def __init__(self, priority: Priority):
+        super().__init__(f"Shed {priority.name.lower()} request")
+        self.retry_after = CLASSES[priority].retry_after
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: float = INITIAL_LIMIT,
+        min_limit: float = MIN_LIMIT,
+        max_limit: float = MAX_LIMIT,
+    ):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.short_rtt = 0.0
+        self.long_rtt = 0.0
+        self._waiters: Dict[Priority, Deque[asyncio.Future]] = {p: deque() for p in Priority}
+        self.admitted = {p.name.lower(): 0 for p in Priority}
+        self.queued = {p.name.lower(): 0 for p in Priority}
+        self.shed = {p.name.lower(): 0 for p in Priority}
+
+    def _fits(self, priority: Priority) -> bool:
+        return self.in_flight < max(1.0, self.limit * CLASSES[priority].share)
+
+    def _waiting_ahead(self, priority: Priority) -> bool:
+        return any(self._waiters[p] for p in Priority if p <= priority)
+
+    async def acquire(self, priority: Priority) -> None:
+        """Take a slot, waiting in the priority's queue if needed; raises ``Shed``."""
+        name = priority.name.lower()
+        if self._fits(priority) and not self._waiting_ahead(priority):
+            self.in_flight += 1
+            self.admitted[name] += 1
+            return
+        cls = CLASSES[priority]
+        queue = self._waiters[priority]
+        if len(queue) >= cls.max_queue:
+            self.shed[name] += 1
+            raise Shed(priority)
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        self.queued[name] += 1
+        try:
+            # The slot is handed over (in_flight already counted) by _wake
+            await asyncio.wait_for(asyncio.shield(waiter), cls.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Woken in the same tick the wait ran out; keep the slot
+                self.admitted[name] += 1
+                return
+            waiter.cancel()
+            queue.remove(waiter)
+            self.shed[name] += 1
+            raise Shed(priority)
+        except asyncio.CancelledError:
+            # The request went away while queued (client disconnect)
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over first; pass it on
+                self.in_flight -= 1
+                self._wake()
+            else:
+                waiter.cancel()
+                queue.remove(waiter)
+            raise
+        self.admitted[name] += 1
+
+    def release(self, rtt_ms: float, failed: bool = False, sample: bool = True) -> None:
+        """
+        Return a slot. ``sample=False`` skips the latency update, for requests
+        whose duration says nothing about load (long exports and streams).
+        """
+        self.in_flight -= 1
+        if failed:
+            self.limit = max(self.min_limit, self.limit * BACKOFF)
+        elif sample:
+            self._update(rtt_ms)
+        self._wake()
+
+    def _update(self, rtt_ms: float) -> None:
+        if not self.long_rtt:
+            self.short_rtt = self.long_rtt = rtt_ms
+            return
+        self.short_rtt += SHORT_ALPHA * (rtt_ms - self.short_rtt)
+        self.long_rtt = min(self.short_rtt, self.long_rtt + LONG_ALPHA * (rtt_ms - self.long_rtt))
+        gradient = max(0.5, min(1.0, TOLERANCE * self.long_rtt / self.short_rtt))
+        # sqrt(limit) of headroom lets the limit probe upwards while latency holds
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self.limit += SMOOTHING * (target - self.limit)
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+    def _wake(self) -> None:
+        for priority in Priority:
+            queue = self._waiters[priority]
+            while queue and self._fits(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.in_flight += 1
+                waiter.set_result(None)
+            if queue:
+                # Lower priorities wait behind this one
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "inFlight": self.in_flight,
+            "shortRttMs": round(self.short_rtt, 3),
+            "longRttMs": round(self.long_rtt, 3),
+            "waiting": {p.name.lower(): len(q) for p, q in self._waiters.items()},
+            "admitted": dict(self.admitted),
+            "queued": dict(self.queued),
+            "shed": dict(self.shed),
+        }
+
+
+limiter = AdaptiveLimiter()
+
+CRITICAL_WRITE_PREFIXES = ("/tech",)
+CRITICAL_PREFIXES = ("/payments/webhook",)
+LOW_PREFIXES = ("/reporting",)
+
+
+def classify(method: str, path: str, accept: str = "") -> Priority:
+    if path.startswith(CRITICAL_PREFIXES):
+        return Priority.CRITICAL
+    if path.startswith(CRITICAL_WRITE_PREFIXES) and method in ("POST", "PUT", "PATCH", "DELETE"):
+        return Priority.CRITICAL
+    if path.startswith(LOW_PREFIXES) or path.endswith("/export") or "application/x-ndjson" in accept:
+        return Priority.LOW
+    return Priority.NORMAL
+
+
+def exempt(path: str) -> bool:
+    return path == "/" or path.startswith("/metrics")
+
+
+def stats() -> Dict[str, Any]:
+    return limiter.stats()
@@ -0,0 +1,116 @@
+"""
+DataLoader-style batching for Firestore reads.
+
+A ``DataLoader`` collects the keys requested during one event-loop tick and
+resolves them together: ``load`` calls made by a loop or by concurrently
+awaited coroutines turn into a few ``get_all`` calls or ``in`` queries
+instead of one read per key. Results are memoised for the life of the
+loader.
+
+Routers get loaders through ``documents`` and ``by_field``, which share one
+loader per collection (and field) across the current request's unit of work.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.data import aio, unit_of_work
+
+# Firestore accepts at most 30 values in an ``in`` filter.
+MAX_IN_VALUES = 30
+MAX_GET_ALL = 100
+
+BatchFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class DataLoader:
+    def __init__(self, batch_fn: BatchFn, max_batch_size: int, default: Any = None):
+        self._batch_fn = batch_fn
+        self._max_batch_size = max_batch_size
+        self._default = default
+        self._futures: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._queue: List[Hashable] = []
+        self.batches = 0
+
+    def load(self, key: Hashable) -> "asyncio.Future[Any]":
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._futures[key] = future
+        self._queue.append(key)
+        if len(self._queue) == 1:
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        for start in range(0, len(keys), self._max_batch_size):
+            asyncio.ensure_future(self._resolve(keys[start:start + self._max_batch_size]))
+
+    async def _resolve(self, keys: List[Hashable]) -> None:
+        self.batches += 1
+        try:
+            results = await self._batch_fn(keys)
+        except Exception as exc:
+            for key in keys:
+                # Let a later load retry the key instead of replaying the error
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key in keys:
+            future = self._futures[key]
+            if not future.done():
+                future.set_result(results.get(key, self._default))
+
+
+def _document_batch(client: Any, collection: str) -> BatchFn:
+    async def batch(doc_ids: List[Hashable]) -> Dict[Hashable, Any]:
+        refs = [client.collection(collection).document(doc_id) for doc_id in doc_ids]
+        snaps = await aio.get_many(client, refs)
+        return {snap.id: snap for snap in snaps if snap.exists}
+
+    return batch
+
+
+def _field_batch(client: Any, collection: str, field: str) -> BatchFn:
+    async def batch(values: List[Hashable]) -> Dict[Hashable, Any]:
+        query = client.collection(collection).where(filter=FieldFilter(field, "in", values))
+        grouped: Dict[Hashable, List[Any]] = {value: [] for value in values}
+        for snap in await aio.stream(query):
+            grouped.setdefault(snap.get(field), []).append(snap)
+        return grouped
+
+    return batch
+
+
+def _request_loader(key: str, factory: Callable[[], DataLoader]) -> DataLoader:
+    uow = unit_of_work.current()
+    if uow is None:
+        return factory()
+    loader: Optional[DataLoader] = uow.loaders.get(key)
+    if loader is None:
+        loader = uow.loaders[key] = factory()
+    return loader
+
+
+def documents(client: Any, collection: str) -> DataLoader:
+    """Loader resolving document ids of ``collection`` to snapshots (``None`` if missing)."""
+    return _request_loader(
+        f"doc:{collection}",
+        lambda: DataLoader(_document_batch(client, collection), MAX_GET_ALL),
+    )
+
+
+def by_field(client: Any, collection: str, field: str) -> DataLoader:
+    """Loader resolving values of ``field`` to the list of matching snapshots."""
+    return _request_loader(
+        f"in:{collection}.{field}",
+        lambda: DataLoader(_field_batch(client, collection, field), MAX_IN_VALUES, default=[]),
+    )
@@ -0,0 +1,205 @@
+"""
+Cursor-based pagination for list endpoints.
+
+List routes accept ``page_token``, ``limit`` and ``order_by`` query
+parameters. Results are ordered server-side and the next page starts after
+the last returned document through a Firestore ``start_after`` cursor, so a
+page costs ``limit + 1`` reads no matter how large the collection is.
+
+``order_by`` is a field name, prefixed with ``-`` for descending order. Each
+route whitelists the orderings it has composite indexes for (see
+``firestore.indexes.json``). Page tokens are opaque to clients: they encode
+the ordering and the cursor values of the last document on the page.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from google.cloud.firestore_v1 import Query as FirestoreQuery
+
+from app.data import aio
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class PageParams:
+    """Query parameters shared by every paginated list route."""
+
+    def __init__(
+        self,
+        page_token: Optional[str] = Query(default=None),
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        order_by: Optional[str] = Query(default=None),
+    ):
+        self.page_token = page_token
+        self.limit = limit
+        self.order_by = order_by
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$t": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$t" in value:
+        return datetime.fromisoformat(value["$t"])
+    return value
+
+
+def encode_page_token(order: str, value: Any, doc_id: str) -> str:
+    payload = {"o": order, "v": _encode_value(value), "id": doc_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_token(token: str, order: str) -> Tuple[Any, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        token_order, value, doc_id = payload["o"], payload["v"], payload["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page token")
+    if token_order != order:
+        raise HTTPException(
+            status_code=400, detail="Page token was issued for a different order_by"
+        )
+    return _decode_value(value), doc_id
+
+
+def resolve_order(order_by: Optional[str], allowed: Sequence[str], default: str) -> str:
+    order = order_by or default
+    if order not in allowed:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported order_by '{order}'. Allowed: {', '.join(allowed)}",
+        )
+    return order
+
+
+def apply_order(query: Any, order: str) -> Any:
+    field = order.lstrip("-")
+    direction = (
+        FirestoreQuery.DESCENDING if order.startswith("-") else FirestoreQuery.ASCENDING
+    )
+    # Order on the document name as well so that ties on the field resolve
+    # identically on every page.
+    return query.order_by(field, direction=direction).order_by(
+        "__name__", direction=direction
+    )
+
+
+def ordered_query(
+    query: Any,
+    params: PageParams,
+    allowed: Sequence[str],
+    default: str,
+    select: Optional[Sequence[str]] = None,
+) -> Tuple[Any, str]:
+    """
+    ``query`` ordered by the requested ``order_by`` and started after the
+    page token's cursor, without a limit. Returns the query and the order.
+
+    ``select`` restricts the returned fields; the order field is always
+    added because cursors are built from it.
+    """
+    order = resolve_order(params.order_by, allowed, default)
+    field = order.lstrip("-")
+    query = apply_order(query, order)
+    if select is not None:
+        query = query.select(list(dict.fromkeys([*select, field])))
+
+    if params.page_token:
+        value, doc_id = decode_page_token(params.page_token, order)
+        query = query.start_after({field: value, "__name__": doc_id})
+    return query, order
+
+
+async def fetch_page(
+    query: Any,
+    params: PageParams,
+    allowed: Sequence[str],
+    default: str,
+    select: Optional[Sequence[str]] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Run one page of ``query`` (see ``ordered_query`` for ``select``).
+
+    Returns the page's document snapshots and the token for the next page,
+    or ``None`` when this was the last page. Firestore orders by value type
+    first and leaves out documents missing the field, so the ordering field
+    must be stored with one type everywhere (see
+    ``tools.backfill_order_fields``).
+    """
+    query, order = ordered_query(query, params, allowed, default, select)
+    field = order.lstrip("-")
+
+    docs = await aio.stream(query.limit(params.limit + 1))
+
+    next_token = None
+    if len(docs) > params.limit:
+        docs = docs[: params.limit]
+        last = docs[-1]
+        next_token = encode_page_token(order, last.get(field), last.id)
+    return docs, next_token
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    """Sort key following Firestore's cross-type value ordering."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5, str(value))
+
+
+def paginate_local(
+    docs: List[Any],
+    params: PageParams,
+    allowed: Sequence[str],
+    default: str,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    ``fetch_page`` for snapshots already held in memory, such as a replica.
+
+    Uses the same ordering and page tokens as ``fetch_page``, so a client can
+    keep paging whether a page was served locally or by Firestore.
+    """
+    order = resolve_order(params.order_by, allowed, default)
+    field = order.lstrip("-")
+    descending = order.startswith("-")
+
+    keyed = []
+    for doc in docs:
+        try:
+            value = doc.get(field)
+        except KeyError:
+            # Firestore omits documents that lack the order field
+            continue
+        keyed.append(((_sort_key(value), doc.id), doc))
+    keyed.sort(key=lambda item: item[0], reverse=descending)
+
+    if params.page_token:
+        value, doc_id = decode_page_token(params.page_token, order)
+        cursor = (_sort_key(value), doc_id)
+        keyed = [
+            item for item in keyed
+            if (item[0] < cursor if descending else item[0] > cursor)
+        ]
+
+    page = [doc for _, doc in keyed[: params.limit]]
+    next_token = None
+    if len(keyed) > params.limit:
+        last = page[-1]
+        next_token = encode_page_token(order, last.get(field), last.id)
+    return page, next_token
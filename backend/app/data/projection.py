@@ -0,0 +1,85 @@
+"""
+Field projection for list endpoints.
+
+List routes accept ``view=summary`` to return their ``*Summary`` model, or
+``fields=a,b,c`` to return only the named fields. Both push the field list
+down to Firestore ``select()``, so unrequested fields (photo arrays, nested
+equipment blocks, line items) are never sent by Firestore, decoded or
+validated.
+"""
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel
+
+from app.data.serialization import page_response
+
+
+def model_fields(model: Type[BaseModel]) -> List[str]:
+    """Stored field names of ``model``; ``id`` is the document id, not a field."""
+    return [name for name in model.model_fields if name != "id"]
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated ``fields`` parameter into Firestore field paths.
+
+    Dotted paths select nested fields (``address.city``). Raises 400 for
+    names that are not fields of ``model``.
+    """
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    if not names:
+        raise HTTPException(status_code=400, detail="fields must name at least one field")
+    unknown = [
+        name for name in names
+        if name != "id" and name.split(".")[0] not in model.model_fields
+    ]
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return [name for name in names if name != "id"]
+
+
+def resolve_select(
+    fields: Optional[str],
+    view: str,
+    model: Type[BaseModel],
+    summary_model: Type[BaseModel],
+) -> Optional[List[str]]:
+    """Field paths to select for a list request, or ``None`` for full documents."""
+    selected = parse_fields(fields, model)
+    if selected is None and view == "summary":
+        selected = model_fields(summary_model)
+    return selected
+
+
+def project(doc: Any, fields: List[str]) -> Dict[str, Any]:
+    """Build a sparse item from a projected snapshot, keeping only ``fields``."""
+    data = doc.to_dict() or {}
+    top_level = {name.split(".")[0] for name in fields}
+    item = {key: value for key, value in data.items() if key in top_level}
+    item["id"] = doc.id
+    return item
+
+
+def projected_page(items: List[Any], next_token: Optional[str]) -> ORJSONResponse:
+    """
+    Page response for projected items.
+
+    Returned as a response object so FastAPI does not re-validate the sparse
+    items against the route's full ``response_model``.
+    """
+    return ORJSONResponse(
+        content=jsonable_encoder({"items": items, "nextPageToken": next_token})
+    )
+
+
+def summary_page(
+    docs: List[Any], summary_model: Type[BaseModel], next_token: Optional[str]
+) -> Response:
+    return page_response(summary_model, docs, next_token)
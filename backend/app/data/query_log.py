@@ -0,0 +1,103 @@
+"""
+Log of the query shapes the API runs, for ``tools.index_advisor``.
+
+A shape is what decides the index a query needs: the collection (or
+collection group), each filter's field and operator, and the order-by
+fields with their directions. Values, limits, cursors and projections do
+not matter and are dropped.
+
+When ``QUERY_LOG_PATH`` is set, ``aio.stream``, ``aio.iterate`` and
+``counters.count`` record every query they run, and each worker appends a
+shape to the file, as one JSON line, the first time it sees it. This
+covers queries built where the advisor's source scan cannot follow them:
+variable collection names, loops over declarative registries, and helpers
+that take a query as an argument.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_PATH = os.environ.get("QUERY_LOG_PATH", "")
+
+# Firestore's StructuredQuery operator names
+_OPERATORS = {
+    "LESS_THAN": "<",
+    "LESS_THAN_OR_EQUAL": "<=",
+    "GREATER_THAN": ">",
+    "GREATER_THAN_OR_EQUAL": ">=",
+    "EQUAL": "==",
+    "NOT_EQUAL": "!=",
+    "ARRAY_CONTAINS": "array_contains",
+    "IN": "in",
+    "ARRAY_CONTAINS_ANY": "array_contains_any",
+    "NOT_IN": "not-in",
+    "IS_NAN": "==",
+    "IS_NULL": "==",
+    "IS_NOT_NAN": "!=",
+    "IS_NOT_NULL": "!=",
+}
+
+_seen: Set[str] = set()
+_lock = threading.Lock()
+
+
+def _proto_filters(filters: Any) -> Iterator[Tuple[str, str]]:
+    for item in filters:
+        if hasattr(item, "filters"):
+            # CompositeFilter
+            yield from _proto_filters(item.filters)
+        elif hasattr(item, "field"):
+            # FieldFilter or UnaryFilter
+            yield item.field.field_path, _OPERATORS.get(item.op.name, item.op.name)
+        else:
+            # A composite filter's member: a Filter holding one of the above
+            for name in ("composite_filter", "field_filter", "unary_filter"):
+                if name in item:
+                    yield from _proto_filters([getattr(item, name)])
+
+
+def shape_of(query: Any) -> Optional[Dict[str, Any]]:
+    """The shape of a Firestore or ``sqlite_store`` query, or ``None`` if unrecognised."""
+    if hasattr(query, "_scope"):
+        kind, scope = query._scope
+        return {
+            "collection": scope.rsplit("/", 1)[-1],
+            "scope": "COLLECTION_GROUP" if kind == "group" else "COLLECTION",
+            "filters": [[field, op] for field, op, _ in query._filters],
+            "orders": [[field, direction] for field, direction in query._orders],
+        }
+    parent = getattr(query, "_parent", None)
+    if parent is None or not hasattr(query, "_field_filters"):
+        return None
+    return {
+        "collection": parent.id,
+        "scope": "COLLECTION_GROUP" if getattr(query, "_all_descendants", False) else "COLLECTION",
+        "filters": [list(item) for item in _proto_filters(query._field_filters)],
+        "orders": [
+            [order.field.field_path, order.direction.name] for order in (query._orders or ())
+        ],
+    }
+
+
+def record(query: Any) -> None:
+    """Append ``query``'s shape to the log if logging is on and the shape is new."""
+    if not QUERY_LOG_PATH:
+        return
+    try:
+        shape = shape_of(query)
+    except Exception:
+        logger.debug("Query shape not recognised", exc_info=True)
+        return
+    if shape is None:
+        return
+    key = json.dumps(shape, sort_keys=True)
+    with _lock:
+        if key in _seen:
+            return
+        _seen.add(key)
+        with open(QUERY_LOG_PATH, "a", encoding="utf-8") as log:
+            log.write(key + "\n")
@@ -0,0 +1,247 @@
+"""
+In-process replicas of small, read-mostly reference collections.
+
+Each replica holds every document of one top-level collection in memory and
+is kept current by a Firestore ``on_snapshot`` listener. Point reads made
+through ``app.data.aio.get`` are answered from a ready replica without a
+Firestore read, and list routes on these collections filter and page the
+replica in memory.
+
+Writes made by this process mark the written document dirty until the
+listener delivers a version at least as new as the write. While a replica
+has dirty documents, routers fall back to Firestore, so a client always
+reads its own writes.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.data.snapshots import LocalSnapshot
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_COLLECTIONS = ("crews", "vehicles", "skus", "automations", "bomRules", "users")
+# A dirty mark is dropped after this long even if the listener never
+# reported the write (e.g. a no-op update), so a replica cannot stay
+# bypassed forever.
+DIRTY_TTL_SECONDS = float(os.environ.get("REPLICA_DIRTY_TTL_SECONDS", "30"))
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if hasattr(value, "ToDatetime"):
+        # protobuf Timestamp
+        return value.ToDatetime(tzinfo=timezone.utc)
+    return value
+
+
+class CollectionReplica:
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._update_times: Dict[str, Any] = {}
+        self._dirty: Dict[str, Tuple[Optional[datetime], float]] = {}
+        self._lock = threading.Lock()
+        self._watch = None
+        self._ready = threading.Event()
+        self._last_read_time: Optional[datetime] = None
+        self._last_event_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.events = 0
+
+    # ----- lifecycle -----
+
+    def start(self, client: Any) -> None:
+        self._watch = client.collection(self.name).on_snapshot(self._on_snapshot)
+
+    def stop(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self._ready.clear()
+
+    def _on_snapshot(self, docs: List[Any], changes: List[Any], read_time: Any) -> None:
+        read_time = _as_datetime(read_time)
+        with self._lock:
+            for change in changes:
+                snap = change.document
+                change_type = getattr(change.type, "name", str(change.type))
+                if change_type == "REMOVED":
+                    self._docs.pop(snap.id, None)
+                    self._update_times.pop(snap.id, None)
+                    seen_at = read_time
+                else:
+                    self._docs[snap.id] = snap.to_dict()
+                    self._update_times[snap.id] = snap.update_time
+                    seen_at = _as_datetime(snap.update_time)
+                if snap.id in self._dirty:
+                    written_at, _ = self._dirty[snap.id]
+                    if written_at is None or (seen_at is not None and seen_at >= written_at):
+                        del self._dirty[snap.id]
+            self._last_read_time = read_time
+            self._last_event_at = time.time()
+            self.events += 1
+        self._ready.set()
+
+    # ----- state -----
+
+    @property
+    def active(self) -> bool:
+        return (
+            self._watch is not None
+            and self._ready.is_set()
+            and getattr(self._watch, "is_active", True)
+        )
+
+    def fresh(self, doc_id: Optional[str] = None) -> bool:
+        """Whether the replica can answer a read (for one document, or for the whole collection)."""
+        if not self.active:
+            return False
+        with self._lock:
+            expired = time.monotonic() - DIRTY_TTL_SECONDS
+            for dirty_id in [k for k, (_, marked) in self._dirty.items() if marked < expired]:
+                del self._dirty[dirty_id]
+            if doc_id is None:
+                return not self._dirty
+            return doc_id not in self._dirty
+
+    def note_write(self, doc_id: str, write_time: Any = None, deleted: bool = False) -> None:
+        """Record a write made by this process so reads bypass the replica until it catches up."""
+        written_at = _as_datetime(write_time)
+        with self._lock:
+            if deleted and doc_id not in self._docs:
+                # The listener has already applied the delete
+                return
+            current = self._update_times.get(doc_id)
+            if (
+                not deleted
+                and written_at is not None
+                and current is not None
+                and _as_datetime(current) >= written_at
+            ):
+                return
+            self._dirty[doc_id] = (written_at, time.monotonic())
+
+    # ----- reads -----
+
+    def get(self, doc_id: str, reference: Any = None) -> LocalSnapshot:
+        with self._lock:
+            self.hits += 1
+            return LocalSnapshot(
+                doc_id,
+                self._docs.get(doc_id),
+                self._update_times.get(doc_id),
+                reference,
+            )
+
+    def where(self, **equals: Any) -> List[LocalSnapshot]:
+        """All documents whose fields equal the given values."""
+        return self.filter(
+            lambda data: all(data.get(field) == value for field, value in equals.items())
+        )
+
+    def filter(self, predicate: Callable[[Dict[str, Any]], bool]) -> List[LocalSnapshot]:
+        with self._lock:
+            self.hits += 1
+            return [
+                LocalSnapshot(doc_id, data, self._update_times.get(doc_id))
+                for doc_id, data in self._docs.items()
+                if predicate(data)
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.fallbacks
+            staleness = (
+                round(time.time() - self._last_event_at, 3)
+                if self._last_event_at is not None
+                else None
+            )
+            return {
+                "active": self.active,
+                "documents": len(self._docs),
+                "dirty": len(self._dirty),
+                "events": self.events,
+                "lastReadTime": self._last_read_time.isoformat() if self._last_read_time else None,
+                "secondsSinceLastEvent": staleness,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fallbacks": self.fallbacks,
+                "hitRate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+_replicas: Dict[str, CollectionReplica] = {
+    name: CollectionReplica(name) for name in REFERENCE_COLLECTIONS
+}
+
+
+def get_replica(name: str) -> Optional[CollectionReplica]:
+    return _replicas.get(name)
+
+
+def fresh_replica(name: str) -> Optional[CollectionReplica]:
+    """The replica for ``name`` if it can answer a list query right now, else ``None``."""
+    replica = _replicas.get(name)
+    if replica is None:
+        return None
+    if replica.fresh():
+        return replica
+    replica.fallbacks += 1
+    return None
+
+
+def _top_level_collection(ref: Any) -> Optional[str]:
+    parent = getattr(ref, "parent", None)
+    if parent is None or getattr(parent, "parent", None) is not None:
+        return None
+    return parent.id
+
+
+def lookup(ref: Any) -> Optional[LocalSnapshot]:
+    """Serve a point read from a replica, or return ``None`` to read Firestore."""
+    name = _top_level_collection(ref)
+    replica = _replicas.get(name) if name else None
+    if replica is None:
+        return None
+    if not replica.fresh(ref.id):
+        replica.misses += 1
+        return None
+    return replica.get(ref.id, reference=ref)
+
+
+def note_write(ref: Any, write_time: Any = None, deleted: bool = False) -> None:
+    name = _top_level_collection(ref)
+    replica = _replicas.get(name) if name else None
+    if replica is not None:
+        replica.note_write(ref.id, write_time, deleted)
+
+
+def enabled_collections() -> Iterable[str]:
+    configured = os.environ.get("REFERENCE_REPLICAS")
+    if configured is None:
+        return REFERENCE_COLLECTIONS
+    return [name.strip() for name in configured.split(",") if name.strip() in _replicas]
+
+
+def start_all(client: Any) -> None:
+    for name in enabled_collections():
+        try:
+            _replicas[name].start(client)
+        except Exception as exc:
+            logger.warning("Replica for %s not started: %s", name, exc)
+
+
+def stop_all() -> None:
+    for replica in _replicas.values():
+        replica.stop()
+
+
+def stats() -> Dict[str, Any]:
+    return {name: replica.stats() for name, replica in _replicas.items()}
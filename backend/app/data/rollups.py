@@ -0,0 +1,376 @@
+"""
+Per-entity rollup documents.
+
+Dashboards read one precomputed document instead of aggregating the
+documents behind it:
+
+- ``job_rollups/{jobId}``: the job's state and owners, invoice totals,
+  schedule entries by type, and counts and completion flags of the tech
+  forms (JSA, damage scan, detach, reset).
+- ``customer_rollups/{customerId}`` and ``partner_rollups/{partnerId}``:
+  invoice totals and jobs by ``workflowState``.
+
+``SOURCES`` declares what each source document contributes to which
+rollup. Writes to a source go through ``add``, ``update`` and ``delete``,
+which commit the source write and the rollup increments (the difference
+between the document's contributions before and after) in one batch, so a
+rollup never sees a write twice or misses one. Their ``before`` snapshot
+should come from ``read``: the caches may hold a version that a Cloud
+Function has since replaced, and the precondition would then fail on every
+retry. The Cloud Functions that create sources commit the same increments
+(see ``functions/rollups.js``); keep the two in step.
+
+A rollup that has never been rebuilt (data written before rollups existed,
+or only partial increments since) is rebuilt from its sources on first
+read. The rebuild writes under a precondition on the rollup version it
+started from, so an increment landing while it scans makes it start over.
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.data import aio, replica, unit_of_work
+from app.data.cache import documents as document_cache
+
+
+JOB_ROLLUPS = "job_rollups"
+CUSTOMER_ROLLUPS = "customer_rollups"
+PARTNER_ROLLUPS = "partner_rollups"
+ROLLUPS = (JOB_ROLLUPS, CUSTOMER_ROLLUPS, PARTNER_ROLLUPS)
+
+# Tech form collections and their key in ``forms`` / ``formsComplete``
+FORMS = {
+    "tech_jsa": "jsa",
+    "damage_scans": "damageScan",
+    "detach_workflows": "detach",
+    "reset_workflows": "reset",
+}
+# Source key meaning "the source document's own id"
+DOCUMENT_ID = "__id__"
+MAX_REBUILD_ATTEMPTS = 5
+# Rebuilds get_many runs at once; each is a read and a query per source
+MAX_CONCURRENT_REBUILDS = int(os.environ.get("ROLLUP_REBUILD_CONCURRENCY", "4"))
+
+_stats = {"commits": 0, "increments": 0, "reads": 0, "rebuilds": 0, "rebuildConflicts": 0}
+
+
+@dataclass(frozen=True)
+class Contribution:
+    """What one source document adds to the rollup its ``key`` field names."""
+
+    rollup: str
+    key: str
+    # Dotted field path -> amount, applied as increments
+    totals: Callable[[Dict[str, Any]], Dict[str, float]]
+    # Dotted field path -> value, written as is
+    fields: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+
+
+def _label(value: Any, default: str) -> str:
+    """A map key for ``value``; enum members that were written unconverted use their value."""
+    return str(getattr(value, "value", value) or default)
+
+
+def _invoice_totals(data: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "invoices.count": 1,
+        f"invoices.byStatus.{_label(data.get('status'), 'Draft')}": 1,
+        "invoices.total": data.get("total") or 0,
+        "invoices.paid": data.get("paidAmount") or 0,
+        "invoices.balance": data.get("balanceDue") or 0,
+    }
+
+
+def _job_totals(data: Dict[str, Any]) -> Dict[str, float]:
+    return {"jobs.count": 1, f"jobs.byState.{_label(data.get('workflowState'), 'intake_quoting')}": 1}
+
+
+def _job_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "workflowState": _label(data.get("workflowState"), "intake_quoting"),
+        "customerId": data.get("customerId"),
+        "partnerId": data.get("partnerId"),
+    }
+
+
+def _schedule_totals(data: Dict[str, Any]) -> Dict[str, float]:
+    return {"schedule.count": 1, f"schedule.byType.{_label(data.get('type'), 'other')}": 1}
+
+
+def _form(name: str) -> Contribution:
+    return Contribution(
+        JOB_ROLLUPS,
+        "jobId",
+        lambda data: {f"forms.{name}": 1},
+        lambda data: {f"formsComplete.{name}": True},
+    )
+
+
+SOURCES: Dict[str, Tuple[Contribution, ...]] = {
+    "invoices": (
+        Contribution(JOB_ROLLUPS, "jobId", _invoice_totals),
+        Contribution(CUSTOMER_ROLLUPS, "customerId", _invoice_totals),
+        Contribution(PARTNER_ROLLUPS, "partnerId", _invoice_totals),
+    ),
+    "jobs": (
+        Contribution(JOB_ROLLUPS, DOCUMENT_ID, lambda data: {}, _job_fields),
+        Contribution(CUSTOMER_ROLLUPS, "customerId", _job_totals),
+        Contribution(PARTNER_ROLLUPS, "partnerId", _job_totals),
+    ),
+    "schedule": (Contribution(JOB_ROLLUPS, "jobId", _schedule_totals),),
+    **{collection: (_form(name),) for collection, name in FORMS.items()},
+}
+
+
+def _key(contribution: Contribution, doc_id: str, data: Dict[str, Any]) -> Optional[str]:
+    return doc_id if contribution.key == DOCUMENT_ID else data.get(contribution.key)
+
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for path, value in flat.items():
+        node = nested
+        *parents, last = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[last] = value
+    return nested
+
+
+def _changes(
+    collection: str, doc_id: str, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """(rollup, id) -> dotted field -> Increment or value for a write from ``before`` to ``after``."""
+    amounts: Dict[Tuple[str, str], Dict[str, float]] = {}
+    values: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for contribution in SOURCES.get(collection, ()):
+        for data, sign in ((before, -1), (after, 1)):
+            if data is None:
+                continue
+            key = _key(contribution, doc_id, data)
+            if not key:
+                continue
+            target = amounts.setdefault((contribution.rollup, key), {})
+            for path, amount in contribution.totals(data).items():
+                target[path] = target.get(path, 0) + sign * amount
+            if sign > 0 and contribution.fields is not None:
+                values.setdefault((contribution.rollup, key), {}).update(contribution.fields(data))
+
+    changes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for target, totals in amounts.items():
+        increments = {path: firestore.Increment(amount) for path, amount in totals.items() if amount}
+        if increments:
+            changes.setdefault(target, {}).update(increments)
+    for target, fields in values.items():
+        changes.setdefault(target, {}).update(fields)
+    return changes
+
+
+async def _commit(
+    client: Any, ref: Any, op: str, data: Optional[Dict[str, Any]],
+    changes: Dict[Tuple[str, str], Dict[str, Any]], option: Any = None,
+) -> Any:
+    batch = client.batch()
+    if op == "create":
+        batch.create(ref, data)
+    elif op == "update":
+        batch.update(ref, data, option=option)
+    else:
+        batch.delete(ref, option=option)
+    rollup_writes = []
+    now = datetime.utcnow()
+    for (rollup, key), fields in changes.items():
+        rollup_ref = client.collection(rollup).document(key)
+        rollup_data = _nest({**fields, "updatedAt": now})
+        batch.set(rollup_ref, rollup_data, merge=True)
+        rollup_writes.append((rollup_ref, rollup_data))
+
+    try:
+        results = await aio.run(f"commit:{ref.parent.id}", batch.commit)
+    except (gexc.FailedPrecondition, gexc.Conflict, gexc.Aborted):
+        if op == "create":
+            raise
+        # The version the caller read may have come from a cache; let a retry read past it
+        document_cache.invalidate(ref)
+        raise HTTPException(status_code=409, detail="Document was modified by another request")
+    # A delete's own result carries no update time
+    write_time = max(result.update_time for result in results if result.update_time is not None)
+    _stats["commits"] += 1
+    _stats["increments"] += len(rollup_writes)
+
+    uow = unit_of_work.current()
+    document_cache.invalidate(ref)
+    replica.note_write(ref, write_time, deleted=op == "delete")
+    if uow is not None:
+        if op == "create":
+            uow.record_set(ref, data, write_time)
+        elif op == "update":
+            uow.record_update(ref, data, write_time)
+        else:
+            uow.record_delete(ref, write_time)
+    for rollup_ref, rollup_data in rollup_writes:
+        document_cache.invalidate(rollup_ref)
+        replica.note_write(rollup_ref, write_time)
+        if uow is not None:
+            uow.record_set(rollup_ref, rollup_data, write_time, merge=True)
+    return results[0]
+
+
+async def read(ref: Any) -> Any:
+    """
+    The current version of ``ref``, read from Firestore past the replicas and
+    the document cache, for ``update`` and ``delete``. It refreshes the
+    document cache and the request's identity map.
+    """
+    started = document_cache.clock()
+    snap = await aio.run(f"get:{ref.parent.id}", ref.get)
+    document_cache.store(ref, snap, started)
+    uow = unit_of_work.current()
+    if uow is not None:
+        uow.remember(ref, snap)
+    return snap
+
+
+async def add(client: Any, collection: Any, data: Dict[str, Any]) -> Tuple[Any, Any]:
+    """Like ``aio.add``, updating the rollups in the same commit."""
+    ref = collection.document()
+    result = await _commit(client, ref, "create", data, _changes(collection.id, ref.id, None, data))
+    return result.update_time, ref
+
+
+async def update(client: Any, ref: Any, data: Dict[str, Any], before: Any, **kwargs: Any) -> Any:
+    """
+    Like ``aio.update`` for a document last read as ``before``. The write
+    carries a precondition on that version, since the rollup increments are
+    computed from it; a concurrent change makes it a 409.
+    """
+    current = before.to_dict() or {}
+    changes = _changes(ref.parent.id, ref.id, current, {**current, **data})
+    option = client.write_option(last_update_time=before.update_time)
+    return await _commit(client, ref, "update", data, changes, option)
+
+
+async def delete(client: Any, ref: Any, before: Any) -> Any:
+    """Like ``aio.delete`` for a document last read as ``before``, under the same precondition."""
+    changes = _changes(ref.parent.id, ref.id, before.to_dict() or {}, None)
+    option = client.write_option(last_update_time=before.update_time)
+    return await _commit(client, ref, "delete", None, changes, option)
+
+
+# ---------- Reads ----------
+
+async def _sources(client: Any, rollup: str, key: str) -> List[Tuple[str, Any]]:
+    found: List[Tuple[str, Any]] = []
+    for collection, contributions in SOURCES.items():
+        for contribution in contributions:
+            if contribution.rollup != rollup:
+                continue
+            if contribution.key == DOCUMENT_ID:
+                # Uncached: the rebuild would keep a stale copy's fields for good
+                source = client.collection(collection).document(key)
+                snap = await aio.run(f"get:{collection}", source.get)
+                docs = [snap] if snap.exists else []
+            else:
+                query = client.collection(collection).where(
+                    filter=FieldFilter(contribution.key, "==", key)
+                )
+                docs = await aio.stream(query)
+            found.extend((collection, doc) for doc in docs)
+    return found
+
+
+async def rebuild(client: Any, rollup: str, key: str) -> Dict[str, Any]:
+    """Recompute ``rollup/{key}`` from its sources and store it."""
+    ref = client.collection(rollup).document(key)
+    for _ in range(MAX_REBUILD_ATTEMPTS):
+        # Bypass the identity map and caches: the precondition needs the current version
+        snap = await aio.run(f"get:{rollup}", ref.get)
+        flat: Dict[str, Any] = {}
+        for collection, doc in await _sources(client, rollup, key):
+            data = doc.to_dict() or {}
+            for contribution in SOURCES[collection]:
+                if contribution.rollup != rollup or _key(contribution, doc.id, data) != key:
+                    continue
+                for path, amount in contribution.totals(data).items():
+                    flat[path] = flat.get(path, 0) + amount
+                if contribution.fields is not None:
+                    flat.update(contribution.fields(data))
+        now = datetime.utcnow()
+        document = _nest({**flat, "updatedAt": now, "rebuiltAt": now})
+        try:
+            if snap.exists:
+                # set() takes no precondition; update() replaces each top-level
+                # field whole and deletes the ones no source contributes any more
+                stale = {field: firestore.DELETE_FIELD for field in snap.to_dict() if field not in document}
+                option = client.write_option(last_update_time=snap.update_time)
+                await aio.update(ref, {**document, **stale}, option=option)
+            else:
+                await aio.run(f"create:{rollup}", ref.create, document)
+                document_cache.invalidate(ref)
+        except (gexc.FailedPrecondition, gexc.AlreadyExists):
+            # A source write landed while scanning
+            _stats["rebuildConflicts"] += 1
+            continue
+        _stats["rebuilds"] += 1
+        return document
+    raise gexc.Aborted(f"Rollup {rollup}/{key} kept changing during rebuild")
+
+
+async def get(client: Any, rollup: str, key: str) -> Dict[str, Any]:
+    """The rollup document's data, rebuilt first if it never was."""
+    _stats["reads"] += 1
+    snap = await aio.get(client.collection(rollup).document(key))
+    data = snap.to_dict() if snap.exists else None
+    if data is None or "rebuiltAt" not in data:
+        return await rebuild(client, rollup, key)
+    return data
+
+
+async def get_many(client: Any, rollup: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Rollups for ``keys`` in one batched read, rebuilding those that never
+    were, at most ``MAX_CONCURRENT_REBUILDS`` at a time so that a first
+    report over many jobs does not take the whole executor pool.
+    """
+    _stats["reads"] += len(keys)
+    refs = [client.collection(rollup).document(key) for key in keys]
+    snaps = {snap.id: snap for snap in await aio.get_many(client, refs)}
+    result: Dict[str, Dict[str, Any]] = {}
+    for key in keys:
+        snap = snaps.get(key)
+        data = snap.to_dict() if snap is not None and snap.exists else None
+        if data is not None and "rebuiltAt" in data:
+            result[key] = data
+    missing = [key for key in keys if key not in result]
+    slots = asyncio.Semaphore(MAX_CONCURRENT_REBUILDS)
+
+    async def bounded(key: str) -> Dict[str, Any]:
+        async with slots:
+            return await rebuild(client, rollup, key)
+
+    rebuilt = await asyncio.gather(*(bounded(key) for key in missing))
+    result.update(zip(missing, rebuilt))
+    return result
+
+
+def amounts(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Invoice totals of a rollup, rounded to cents (increments accumulate float error)."""
+    invoices = data.get("invoices") or {}
+    return {
+        "invoiceCount": int(invoices.get("count", 0)),
+        "total": round(invoices.get("total", 0), 2),
+        "paid": round(invoices.get("paid", 0), 2),
+        "balance": round(invoices.get("balance", 0), 2),
+        "byStatus": invoices.get("byStatus") or {},
+    }
+
+
+def stats() -> Dict[str, Any]:
+    return dict(_stats)
@@ -0,0 +1,124 @@
+"""
+Parallel scans for reports over whole collections or long date ranges.
+
+A single ``stream()`` reads a result set sequentially from one server
+stream. A scan splits the work into ``SCAN_PARALLELISM`` partitions and
+reads them concurrently on the Firestore pool:
+
+* ``collection_partitions`` asks Firestore for cursor partitions of a whole
+  collection (``CollectionGroup.get_partitions``). Partition cursors cannot
+  be combined with other filters, so this is for unfiltered scans.
+* ``range_partitions`` splits a ``field >= start`` / ``field <= end`` query
+  into contiguous sub-ranges, for date-filtered reports.
+
+``iterate`` merges the partitions through a bounded queue, so a fast
+partition cannot buffer unboundedly ahead of the consumer; ``collect``
+returns a list in partition order, matching what one ordered ``stream()``
+would have returned.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.data import aio
+
+SCAN_PARALLELISM = int(os.environ.get("SCAN_PARALLELISM", "4"))
+# Chunks (of aio.iterate's chunk size) buffered per partition
+QUEUE_CHUNKS_PER_PARTITION = 2
+
+
+async def collection_partitions(
+    client: Any, collection: str, parallelism: Optional[int] = None
+) -> List[Any]:
+    """
+    Queries that together cover every document of ``collection``.
+
+    Uses a collection-group partition query, so documents of same-named
+    subcollections are included too; only use it for collections that
+    have none.
+    """
+    count = parallelism or SCAN_PARALLELISM
+    if count <= 1:
+        return [client.collection(collection)]
+    group = client.collection_group(collection)
+    partitions = await aio.run(
+        f"partition:{collection}", lambda: list(group.get_partitions(count))
+    )
+    return [partition.query() for partition in partitions] or [client.collection(collection)]
+
+
+def range_partitions(
+    query: Any,
+    field: str,
+    start: datetime,
+    end: datetime,
+    parallelism: Optional[int] = None,
+    as_value: Callable[[datetime], Any] = lambda value: value,
+) -> List[Any]:
+    """
+    Split ``field`` between ``start`` and ``end`` (inclusive) into contiguous
+    sub-range queries on top of ``query``.
+
+    ``as_value`` converts a boundary to the stored representation, e.g. a
+    ``YYYY-MM-DD`` string for the schedule's ``date``. Boundaries that
+    convert to the same value are merged, so a short range of day strings
+    yields fewer partitions.
+    """
+    count = max(1, parallelism or SCAN_PARALLELISM)
+    step = (end - start) / count
+    bounds: List[Any] = []
+    for i in range(count):
+        value = as_value(start + step * i)
+        if not bounds or value > bounds[-1]:
+            bounds.append(value)
+    upper = as_value(end)
+
+    queries = []
+    for i, lower in enumerate(bounds):
+        part = query.where(filter=FieldFilter(field, ">=", lower))
+        if i + 1 < len(bounds):
+            part = part.where(filter=FieldFilter(field, "<", bounds[i + 1]))
+        else:
+            part = part.where(filter=FieldFilter(field, "<=", upper))
+        queries.append(part)
+    return queries
+
+
+async def iterate(queries: List[Any]) -> AsyncIterator[Any]:
+    """Yield the snapshots of all ``queries``, read concurrently, in arrival order."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_CHUNKS_PER_PARTITION * len(queries))
+    finished = object()
+
+    async def produce(query: Any) -> None:
+        try:
+            async for chunk in aio.iterate(query):
+                await queue.put(chunk)
+        except Exception as exc:
+            await queue.put(exc)
+            return
+        await queue.put(finished)
+
+    producers = [asyncio.ensure_future(produce(query)) for query in queries]
+    remaining = len(producers)
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                for snap in item:
+                    yield snap
+    finally:
+        for producer in producers:
+            producer.cancel()
+
+
+async def collect(queries: List[Any]) -> List[Any]:
+    """All snapshots of ``queries``, read concurrently, concatenated in query order."""
+    results = await asyncio.gather(*(aio.stream(query) for query in queries))
+    return [snap for result in results for snap in result]
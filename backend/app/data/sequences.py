@@ -0,0 +1,103 @@
+"""
+Block-allocated number sequences (invoice, estimate and RMA numbers).
+
+Each sequence lives in one ``sequences/{name}`` document holding the next
+unleased number. A worker leases ``BLOCK_SIZE`` numbers at a time in a
+transaction and hands them out from memory, so the counter document sees
+one write per block instead of one per number, and two workers can never
+hand out the same number.
+
+Sequences are keyed per prefix and year (``invoice-2026``), so numbering
+restarts every year. Numbers are unique and increase within a worker, but
+not gap-free: a block that is not used up before the worker exits is lost,
+and blocks leased by different workers interleave.
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from google.cloud import firestore
+
+from app.data import aio, storage
+
+SEQUENCES_COLLECTION = "sequences"
+BLOCK_SIZE = int(os.environ.get("SEQUENCE_BLOCK_SIZE", "20"))
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _lease(client: Any, ref: Any, size: int) -> int:
+    def take(transaction: Any) -> int:
+        snap = ref.get(transaction=transaction)
+        start = (snap.to_dict() or {}).get("next", 1) if snap.exists else 1
+        transaction.set(
+            ref,
+            {"next": start + size, "leasedBy": WORKER_ID, "leasedAt": firestore.SERVER_TIMESTAMP},
+            merge=True,
+        )
+        return start
+
+    return storage.run_transaction(client, take)
+
+
+class SequenceAllocator:
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        # sequence name -> (next number, end of leased block)
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.leases = 0
+        self.allocated = 0
+
+    async def next(self, client: Any, name: str) -> int:
+        """The next number of sequence ``name``, leasing a new block when needed."""
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            current, end = self._blocks.get(name, (0, 0))
+            if current >= end:
+                ref = client.collection(SEQUENCES_COLLECTION).document(name)
+                current = await aio.run(
+                    f"lease:{SEQUENCES_COLLECTION}", _lease, client, ref, self.block_size
+                )
+                end = current + self.block_size
+                self.leases += 1
+            self._blocks[name] = (current + 1, end)
+            self.allocated += 1
+            return current
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "blockSize": self.block_size,
+            "leases": self.leases,
+            "allocated": self.allocated,
+            "remaining": {name: end - current for name, (current, end) in self._blocks.items()},
+        }
+
+
+allocator = SequenceAllocator()
+
+
+async def next_number(
+    client: Any, prefix: str, year: Optional[int] = None, width: int = 6
+) -> str:
+    """Format the next number of the ``prefix`` sequence for ``year``, e.g. INV-2026-000042."""
+    year = year or datetime.utcnow().year
+    number = await allocator.next(client, f"{prefix.lower()}-{year}")
+    return f"{prefix}-{year}-{number:0{width}d}"
+
+
+async def invoice_number(client: Any) -> str:
+    return await next_number(client, "INV")
+
+
+async def estimate_number(client: Any) -> str:
+    return await next_number(client, "EST")
+
+
+async def rma_number(client: Any) -> str:
+    return await next_number(client, "RMA")
+
+
+def stats() -> Dict[str, Any]:
+    return allocator.stats()
@@ -0,0 +1,47 @@
+"""
+Fast response serialization for list endpoints.
+
+Building ``Model(**doc.to_dict())`` per document and returning a ``Page``
+makes FastAPI validate every document a second time against the route's
+``response_model`` and then encode it with the stdlib ``json`` module.
+``page_response`` validates the page's documents once, in bulk, through a
+cached ``TypeAdapter`` and writes the JSON body with pydantic's serializer,
+returning a ready ``Response`` that FastAPI sends as-is.
+
+Bulk validation is used rather than ``model_construct``: documents written
+by older code may lack defaults or store enums and nested models as plain
+values, which ``model_construct`` would pass through unchecked and the
+serializer would then warn about.
+"""
+from functools import lru_cache
+from typing import Any, List, Optional, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+from app.models.schemas import Page
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def validate_docs(model: Type[BaseModel], docs: List[Any]) -> List[BaseModel]:
+    """Validate snapshots into ``model`` instances with one call into pydantic-core."""
+    rows = []
+    for doc in docs:
+        data = doc.to_dict()
+        data["id"] = doc.id
+        rows.append(data)
+    return _list_adapter(model).validate_python(rows)
+
+
+def page_response(
+    model: Type[BaseModel], docs: List[Any], next_token: Optional[str]
+) -> Response:
+    """JSON ``Page[model]`` response for ``docs``, validated and encoded once."""
+    page = Page[model].model_construct(
+        items=validate_docs(model, docs), nextPageToken=next_token
+    )
+    return Response(content=page.model_dump_json(), media_type="application/json")
@@ -0,0 +1,117 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+At crew start time dozens of technicians request the same job, schedule
+and crew list at once. ``SingleFlight.do`` runs the first call for a key
+and lets every identical call that arrives while it is in flight wait for
+that result instead of issuing its own Firestore reads. Nothing is cached:
+once the call finishes, the next request for the key starts a new one.
+
+``CoalescingMiddleware`` applies this to whole GET requests on the routes
+in ``COALESCED_ROUTES``, which must return the same response to everyone
+with the same credentials. The key is the normalized path, the sorted query
+string, the ``Accept`` and ``If-None-Match`` headers and a hash of the
+``Authorization`` header.
+"""
+import asyncio
+import hashlib
+import re
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+# Path templates; ``{name}`` matches one path segment
+COALESCED_ROUTES = (
+    "/jobs/{job_id}",
+    "/dispatch/schedule",
+    "/crews/",
+    "/crews/{crew_id}",
+    "/vehicles/",
+    "/vehicles/{vehicle_id}",
+)
+
+
+def _compile(template: str) -> "re.Pattern[str]":
+    pattern = re.sub(r"\\{[^/]+?\\}", "[^/]+", re.escape(template))
+    return re.compile(f"^{pattern}$")
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: Dict[Any, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    async def do(self, key: Any, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` unless a call for ``key`` is already in flight, in which
+        case wait for its result. Returns ``(result, shared)``; the leader's
+        exception is raised in every waiter.
+        """
+        existing = self._calls.get(key)
+        if existing is not None:
+            self.coalesced += 1
+            return await asyncio.shield(existing), True
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await fn()
+        except BaseException as exc:
+            self.failures += 1
+            if not future.done():
+                future.set_exception(exc)
+                # Retrieved here so an unwaited failure is not logged as lost
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.coalesced
+        return {
+            "inFlight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "coalescedRatio": round(self.coalesced / calls, 4) if calls else 0.0,
+        }
+
+
+class RouteSet:
+    def __init__(self, templates: Iterable[str]):
+        self.templates = tuple(templates)
+        self._patterns = [_compile(template) for template in self.templates]
+
+    def match(self, path: str) -> Optional[str]:
+        for template, pattern in zip(self.templates, self._patterns):
+            if pattern.match(path):
+                return template
+        return None
+
+
+requests = SingleFlight()
+routes = RouteSet(COALESCED_ROUTES)
+
+
+def request_key(scope: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    """Coalescing key of an ASGI request, or ``None`` if it must run on its own."""
+    if scope.get("method") != "GET" or routes.match(scope["path"]) is None:
+        return None
+    headers = dict(scope.get("headers") or [])
+    accept = headers.get(b"accept", b"").decode("latin-1")
+    if "application/x-ndjson" in accept:
+        # Streams are not buffered for sharing
+        return None
+    query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"))))
+    # A conditional request may get a 304 that another client cannot use
+    condition = headers.get(b"if-none-match", b"").decode("latin-1")
+    auth = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()
+    return scope["path"].rstrip("/") or "/", query, accept, condition, auth
+
+
+def stats() -> Dict[str, Any]:
+    return {**requests.stats(), "routes": list(routes.templates)}
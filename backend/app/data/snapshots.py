@@ -0,0 +1,41 @@
+"""
+Snapshot objects for documents served without a Firestore read.
+
+Replicas and caches hand out ``LocalSnapshot`` instances, which expose the
+parts of ``DocumentSnapshot`` that routers use (``id``, ``exists``,
+``to_dict()``, ``get()``, ``update_time``, ``reference``). Data is copied
+on the way out so callers can mutate what they receive.
+"""
+import copy
+from typing import Any, Dict, Optional
+
+
+class LocalSnapshot:
+    """Read-only stand-in for a DocumentSnapshot served from process memory."""
+
+    def __init__(
+        self,
+        doc_id: str,
+        data: Optional[Dict[str, Any]],
+        update_time: Any = None,
+        reference: Any = None,
+    ):
+        self.id = doc_id
+        self._data = data
+        self.update_time = update_time
+        self.reference = reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value: Any = self._data
+        for part in field_path.split("."):
+            if not isinstance(value, dict) or part not in value:
+                raise KeyError(field_path)
+            value = value[part]
+        return copy.deepcopy(value)
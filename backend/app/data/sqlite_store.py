@@ -0,0 +1,898 @@
+"""
+Embedded SQLite document store behind the Firestore client API.
+
+``Client`` implements the part of ``google.cloud.firestore.Client`` that the
+routers and the data layer use: collection and document references,
+subcollections, ``where``/``order_by``/``limit``/``start_after``/``select``
+queries, collection groups, ``count()``, ``get_all``, batches,
+transactions, write preconditions and the ``Increment``, ``ArrayUnion``,
+``ArrayRemove``, ``SERVER_TIMESTAMP`` and ``DELETE_FIELD`` transforms.
+``STORAGE_ENGINE=sqlite`` puts it behind ``app.main.db`` (see ``storage``).
+
+Every document is one row of the ``documents`` table with its fields as
+JSON. The fields routers filter and sort on (``INDEXED_FIELDS``) have
+expression indexes per collection, and filters and orders are translated
+to SQL on the same expressions so SQLite can use them; the filters are then
+re-checked in Python with Firestore's type rules. Results are read in
+keyset-paginated chunks, so a ``limit`` stops reading early and a stream
+never holds a SQLite cursor across pool threads.
+
+Differences from Firestore: documents whose order field is ``null`` are
+left out of ordered queries (as are documents missing it), ``or`` filters
+and listeners are not supported, and a partition query returns a single
+partition.
+"""
+import base64
+import os
+import random
+import re
+import sqlite3
+import string
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+
+from app.data.snapshots import LocalSnapshot
+
+# Fields with an expression index on (collection, field)
+INDEXED_FIELDS = tuple(
+    field.strip()
+    for field in os.environ.get(
+        "SQLITE_INDEXED_FIELDS",
+        "status,customerId,partnerId,date,crewId,jobId,userId,workflowState,"
+        "type,email,technicianId,createdAt,scheduledDate",
+    ).split(",")
+    if field.strip()
+)
+# Rows read per SQL statement while a query is streamed
+CHUNK_SIZE = 500
+BUSY_TIMEOUT_SECONDS = 30.0
+
+# Stored forms of values JSON has no type for
+_TIMESTAMP = "\u0001ts:"
+_BYTES = "\u0001b:"
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+_SEGMENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_AUTO_ID = string.ascii_letters + string.digits
+_MISSING = object()
+_TICK = timedelta(microseconds=1)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " path TEXT PRIMARY KEY, collection TEXT NOT NULL, group_id TEXT NOT NULL,"
+    " data TEXT NOT NULL, create_time TEXT NOT NULL, update_time TEXT NOT NULL"
+    ") WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_collection ON documents (collection, path)",
+    "CREATE INDEX IF NOT EXISTS idx_group ON documents (group_id, path)",
+)
+
+
+# ---------- Values ----------
+
+def _utc(value: datetime) -> datetime:
+    # Firestore reads naive datetimes as UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return _TIMESTAMP + _utc(value).strftime(_TIMESTAMP_FORMAT)
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, bytes):
+        return _BYTES + base64.b64encode(value).decode()
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, str):
+        if value.startswith(_TIMESTAMP):
+            return datetime.strptime(value[len(_TIMESTAMP):], _TIMESTAMP_FORMAT).replace(
+                tzinfo=timezone.utc
+            )
+        if value.startswith(_BYTES):
+            return base64.b64decode(value[len(_BYTES):])
+        return value
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def loads(raw: str) -> Dict[str, Any]:
+    """Document data from ``dumps``, timestamps and bytes restored."""
+    data = orjson.loads(raw)
+    # Only documents holding timestamps or bytes need the walk
+    return _decode(data) if "\\u0001" in raw else data
+
+
+def dumps(data: Dict[str, Any]) -> str:
+    """Document data as JSON, timestamps and bytes tagged so that ``loads`` restores them."""
+    return orjson.dumps(_encode(data)).decode()
+
+
+def _format_time(value: datetime) -> str:
+    return value.strftime(_TIMESTAMP_FORMAT)
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.strptime(value, _TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _kind(value: Any) -> int:
+    """Firestore type order; values of different kinds never compare equal."""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, (list, tuple)):
+        return 6
+    return 7
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return _utc(value)
+    if isinstance(value, tuple):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _equal(a: Any, b: Any) -> bool:
+    return _kind(a) == _kind(b) and a == b
+
+
+def _compare(a: Any, op: str, b: Any) -> bool:
+    if _kind(a) != _kind(b) or _kind(a) in (0, 6, 7):
+        return False
+    if op == "<":
+        return a < b
+    if op == "<=":
+        return a <= b
+    if op == ">":
+        return a > b
+    return a >= b
+
+
+def _scalar(value: Any) -> bool:
+    return isinstance(value, (bool, int, float, str, datetime))
+
+
+# ---------- Field paths ----------
+
+def _split(field_path: str) -> List[str]:
+    return field_path.split(".")
+
+
+def _json_path(field_path: str) -> str:
+    segments = _split(field_path)
+    if not all(_SEGMENT.match(segment) for segment in segments):
+        raise ValueError(f"Unsupported field path for the SQLite engine: {field_path!r}")
+    return "$." + ".".join(segments)
+
+
+def _expr(field_path: str) -> str:
+    return f"json_extract(data, '{_json_path(field_path)}')"
+
+
+def _lookup(data: Dict[str, Any], field_path: str) -> Any:
+    value: Any = data
+    for segment in _split(field_path):
+        if not isinstance(value, dict) or segment not in value:
+            return _MISSING
+        value = value[segment]
+    return value
+
+
+def _project(data: Dict[str, Any], field_paths: Sequence[str]) -> Dict[str, Any]:
+    projected: Dict[str, Any] = {}
+    for field_path in field_paths:
+        value = _lookup(data, field_path)
+        if value is _MISSING:
+            continue
+        *parents, last = _split(field_path)
+        target = projected
+        for segment in parents:
+            target = target.setdefault(segment, {})
+        target[last] = value
+    return projected
+
+
+# ---------- Writes ----------
+
+def _transform(current: Any, value: Any, write_time: datetime) -> Any:
+    """The stored value of a field written as ``value``; ``_MISSING`` deletes it."""
+    if value is firestore.SERVER_TIMESTAMP:
+        return write_time
+    if value is firestore.DELETE_FIELD:
+        return _MISSING
+    if isinstance(value, firestore.Increment):
+        base = current if _kind(current) == 2 else 0
+        return base + value.value
+    if isinstance(value, firestore.ArrayUnion):
+        items = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if not any(_equal(item, existing) for existing in items):
+                items.append(item)
+        return items
+    if isinstance(value, firestore.ArrayRemove):
+        items = list(current) if isinstance(current, list) else []
+        return [item for item in items if not any(_equal(item, gone) for gone in value.values)]
+    if isinstance(value, dict):
+        return _merge({}, value, write_time)
+    return _normalize(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any], write_time: datetime) -> Dict[str, Any]:
+    """Apply ``data`` to ``target`` in place, merging nested maps."""
+    for key, value in data.items():
+        current = target.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(current, dict):
+            _merge(current, value, write_time)
+            continue
+        result = _transform(None if current is _MISSING else current, value, write_time)
+        if result is _MISSING:
+            target.pop(key, None)
+        else:
+            target[key] = result
+    return target
+
+
+def _update_paths(target: Dict[str, Any], data: Dict[str, Any], write_time: datetime) -> Dict[str, Any]:
+    """Apply ``update()`` field paths to ``target`` in place."""
+    for field_path, value in data.items():
+        *parents, last = _split(field_path)
+        node = target
+        for segment in parents:
+            child = node.get(segment)
+            if not isinstance(child, dict):
+                child = node[segment] = {}
+            node = child
+        result = _transform(node.get(last), value, write_time)
+        if result is _MISSING:
+            node.pop(last, None)
+        else:
+            node[last] = result
+    return target
+
+
+class WriteResult:
+    def __init__(self, update_time: datetime):
+        self.update_time = update_time
+
+
+class _Option:
+    """Write precondition, with the attributes of the Firestore client's options."""
+
+    def __init__(self, exists: Optional[bool] = None, last_update_time: Optional[datetime] = None):
+        self._exists = exists
+        self._last_update_time = last_update_time
+
+
+def _check_option(path: str, option: Any, row: Optional[Tuple[Any, ...]]) -> None:
+    if option is None:
+        return
+    exists = getattr(option, "_exists", None)
+    last_update_time = getattr(option, "_last_update_time", None)
+    if last_update_time is not None:
+        if row is None:
+            raise gexc.NotFound(f"No document to update: {path}")
+        if _parse_time(row[2]) != _utc(last_update_time):
+            raise gexc.FailedPrecondition(f"Document {path} has been modified")
+    elif exists is True and row is None:
+        raise gexc.NotFound(f"No document to update: {path}")
+    elif exists is False and row is not None:
+        raise gexc.AlreadyExists(f"Document already exists: {path}")
+
+
+# ---------- References ----------
+
+class DocumentReference:
+    def __init__(self, client: "Client", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def _document_path(self) -> str:
+        return self.path
+
+    @property
+    def parent(self) -> "CollectionReference":
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str) -> "CollectionReference":
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def get(self, field_paths: Optional[Sequence[str]] = None, transaction: Any = None, **_options: Any) -> LocalSnapshot:
+        return next(self._client.get_all([self], field_paths=field_paths))
+
+    def create(self, document_data: Dict[str, Any], **_options: Any) -> WriteResult:
+        return self._client._commit([("create", self, document_data, False, None)])[0]
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False, **_options: Any) -> WriteResult:
+        return self._client._commit([("set", self, document_data, merge, None)])[0]
+
+    def update(self, field_updates: Dict[str, Any], option: Any = None, **_options: Any) -> WriteResult:
+        return self._client._commit([("update", self, field_updates, False, option)])[0]
+
+    def delete(self, option: Any = None, **_options: Any) -> datetime:
+        return self._client._commit([("delete", self, None, False, option)])[0].update_time
+
+
+class _Partition:
+    def __init__(self, query: "Query"):
+        self._query = query
+
+    def query(self) -> "Query":
+        return self._query
+
+
+class _AggregationResult:
+    def __init__(self, alias: str, value: int):
+        self.alias = alias
+        self.value = value
+
+
+class _CountQuery:
+    def __init__(self, query: "Query", alias: Optional[str]):
+        self._query = query
+        self._alias = alias or "field_1"
+
+    def get(self, transaction: Any = None, **_options: Any) -> List[List[_AggregationResult]]:
+        count = sum(1 for _ in self._query._rows())
+        return [[_AggregationResult(self._alias, count)]]
+
+
+class Query:
+    def __init__(
+        self,
+        client: "Client",
+        parent: Optional["CollectionReference"],
+        scope: Tuple[str, str],
+        filters: Tuple[Tuple[str, str, Any], ...] = (),
+        orders: Tuple[Tuple[str, str], ...] = (),
+        limit: Optional[int] = None,
+        offset: int = 0,
+        start: Optional[Tuple[Dict[str, Any], bool]] = None,
+        projection: Optional[Tuple[str, ...]] = None,
+    ):
+        self._client = client
+        self._parent = parent
+        self._scope = scope
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._offset = offset
+        self._start = start
+        self._projection = projection
+
+    def _copy(self, **changes: Any) -> "Query":
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "offset": self._offset,
+            "start": self._start,
+            "projection": self._projection,
+            **changes,
+        }
+        return Query(self._client, self._parent, self._scope, **state)
+
+    # ----- building -----
+
+    def where(
+        self,
+        field_path: Optional[str] = None,
+        op_string: Optional[str] = None,
+        value: Any = None,
+        *,
+        filter: Any = None,
+    ) -> "Query":
+        if filter is None:
+            added = [(field_path, op_string, value)]
+        else:
+            added = list(self._flatten(filter))
+        for added_path, _, _ in added:
+            _json_path(added_path)
+        return self._copy(filters=self._filters + tuple(added))
+
+    @staticmethod
+    def _flatten(filter: Any) -> Iterator[Tuple[str, str, Any]]:
+        if hasattr(filter, "field_path"):
+            yield filter.field_path, filter.op_string, filter.value
+            return
+        if type(filter).__name__ != "And":
+            raise NotImplementedError("The SQLite engine supports only AND-combined filters")
+        for part in filter.filters:
+            yield from Query._flatten(part)
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "Query":
+        if field_path != "__name__":
+            _json_path(field_path)
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip: int) -> "Query":
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths: Iterable[str]) -> "Query":
+        return self._copy(projection=tuple(field_paths))
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "Query":
+        return self._copy(start=(self._cursor_values(document_fields_or_snapshot), False))
+
+    def start_at(self, document_fields_or_snapshot: Any) -> "Query":
+        return self._copy(start=(self._cursor_values(document_fields_or_snapshot), True))
+
+    @staticmethod
+    def _cursor_values(value: Any) -> Dict[str, Any]:
+        if isinstance(value, dict):
+            return value
+        # A snapshot: its fields plus its name
+        return {**(value.to_dict() or {}), "__name__": value.reference.path}
+
+    def count(self, alias: Optional[str] = None) -> _CountQuery:
+        return _CountQuery(self, alias)
+
+    def get_partitions(self, partition_count: int, **_options: Any) -> Iterator[_Partition]:
+        yield _Partition(self)
+
+    # ----- running -----
+
+    def get(self, transaction: Any = None, **_options: Any) -> List[LocalSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+    def stream(self, transaction: Any = None, **_options: Any) -> Iterator[LocalSnapshot]:
+        for path, raw, update_time in self._rows():
+            data = loads(raw)
+            if self._projection is not None:
+                data = _project(data, self._projection)
+            reference = DocumentReference(self._client, path)
+            yield LocalSnapshot(reference.id, data, _parse_time(update_time), reference)
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        orders = list(self._orders)
+        if not orders:
+            # Firestore orders by the inequality field first
+            for field_path, op, _ in self._filters:
+                if op in ("<", "<=", ">", ">=", "!=", "not-in"):
+                    orders.append((field_path, "ASCENDING"))
+                    break
+        if not orders or orders[-1][0] != "__name__":
+            direction = orders[-1][1] if orders else "ASCENDING"
+            orders.append(("__name__", direction))
+        # Nothing sorts after the document name
+        return orders[: [field for field, _ in orders].index("__name__") + 1]
+
+    def _name(self, value: str) -> str:
+        if "/" in value or self._parent is None:
+            return value
+        return f"{self._parent.path}/{value}"
+
+    def _sql_filters(self) -> Tuple[List[str], List[Any], bool]:
+        """WHERE clauses for the filters, their parameters and whether an index applies."""
+        clauses: List[str] = []
+        params: List[Any] = []
+        indexed = False
+        for field_path, op, value in self._filters:
+            expr = _expr(field_path)
+            value = _normalize(value)
+            if op == "==" and value is None:
+                clauses.append(f"json_type(data, '{_json_path(field_path)}') = 'null'")
+            elif op in ("==", "<", "<=", ">", ">=") and _scalar(value):
+                clauses.append(f"{expr} {'=' if op == '==' else op} ?")
+                params.append(_encode(value))
+            elif op == "in" and value and all(_scalar(item) for item in value):
+                clauses.append(f"{expr} IN ({', '.join('?' for _ in value)})")
+                params.extend(_encode(item) for item in value)
+            elif op in ("!=", "not-in"):
+                clauses.append(f"json_type(data, '{_json_path(field_path)}') IS NOT NULL")
+                continue
+            elif op == "array_contains" and _scalar(value):
+                clauses.append(
+                    f"EXISTS (SELECT 1 FROM json_each(data, '{_json_path(field_path)}')"
+                    " WHERE json_each.value = ?)"
+                )
+                params.append(_encode(value))
+                continue
+            else:
+                continue
+            indexed = indexed or field_path in INDEXED_FIELDS
+        return clauses, params, indexed
+
+    def _matches(self, values: Dict[str, Any]) -> bool:
+        """
+        Firestore's check of the filters against the filtered fields' values.
+        The SQL clauses have already dropped documents missing a field.
+        """
+        for field_path, op, value in self._filters:
+            actual = values[field_path]
+            value = _normalize(value)
+            if op == "==":
+                ok = _equal(actual, value)
+            elif op == "!=":
+                ok = not _equal(actual, value)
+            elif op == "in":
+                ok = any(_equal(actual, item) for item in value)
+            elif op == "not-in":
+                ok = actual is not None and not any(_equal(actual, item) for item in value)
+            elif op == "array_contains":
+                ok = isinstance(actual, list) and any(_equal(item, value) for item in actual)
+            elif op == "array_contains_any":
+                ok = isinstance(actual, list) and any(
+                    _equal(item, wanted) for item in actual for wanted in value
+                )
+            elif op in ("<", "<=", ">", ">="):
+                ok = _compare(actual, op, value)
+            else:
+                raise ValueError(f"Unsupported operator: {op}")
+            if not ok:
+                return False
+        return True
+
+    def _rows(self) -> Iterator[Tuple[str, str, str]]:
+        """``(path, JSON data, update_time)`` of matching documents, in query order."""
+        kind, scope = self._scope
+        where = ["collection = ?" if kind == "collection" else "group_id = ?"]
+        params: List[Any] = [scope]
+        filters, filter_params, indexed = self._sql_filters()
+        where += filters
+        params += filter_params
+
+        orders = self._effective_orders()
+        columns: List[str] = []
+        for field_path, _ in orders:
+            if field_path == "__name__":
+                columns.append("path")
+            else:
+                columns.append(_expr(field_path))
+                where.append(f"{_expr(field_path)} IS NOT NULL")
+        descending = [direction == "DESCENDING" for _, direction in orders]
+        order_sql = ", ".join(
+            f"{column} {'DESC' if desc else 'ASC'}" for column, desc in zip(columns, descending)
+        )
+        indexed = indexed or orders[0][0] in INDEXED_FIELDS
+
+        cursor: Optional[List[Any]] = None
+        inclusive = False
+        if self._start is not None:
+            values, inclusive = self._start
+            cursor = []
+            for field_path, _ in orders:
+                if field_path == "__name__":
+                    if "__name__" not in values:
+                        # Without a name, start after every document with these values
+                        cursor.append("" if inclusive else "\uffff")
+                        continue
+                    cursor.append(self._name(values["__name__"]))
+                else:
+                    cursor.append(_encode(_normalize(values[field_path])))
+
+        skip = self._offset
+        remaining = self._limit
+        chunk = min(CHUNK_SIZE, remaining + skip + 1) if remaining is not None else CHUNK_SIZE
+        self._client._note_query(indexed)
+        # The filtered fields come back as one JSON array, so the Python
+        # check does not parse whole documents
+        checked = list(dict.fromkeys(field_path for field_path, _, _ in self._filters))
+        paths = [f"'{_json_path(field_path)}'" for field_path in checked]
+        if len(paths) == 1:
+            # With a single path json_extract returns the bare value
+            paths *= 2
+        values_sql = f"json_extract(data, {', '.join(paths)})" if paths else "NULL"
+        select = f"SELECT path, data, update_time, {values_sql}, {', '.join(columns)} FROM documents"
+        while remaining is None or remaining > 0:
+            clauses = list(where)
+            chunk_params = list(params)
+            if cursor is not None:
+                keyset, keyset_params = _keyset(columns, descending, cursor, inclusive)
+                clauses.append(keyset)
+                chunk_params += keyset_params
+            sql = f"{select} WHERE {' AND '.join(clauses)} ORDER BY {order_sql} LIMIT ?"
+            rows = self._client._read(sql, chunk_params + [chunk])
+            self._client._note_rows(len(rows))
+            for row in rows:
+                if checked and not self._matches(dict(zip(checked, loads(row[3])))):
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                yield row[0], row[1], row[2]
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining == 0:
+                        return
+            if len(rows) < chunk:
+                return
+            cursor = list(rows[-1][4:])
+            inclusive = False
+
+
+def _keyset(
+    columns: List[str], descending: List[bool], values: List[Any], inclusive: bool
+) -> Tuple[str, List[Any]]:
+    """Rows after (or at) ``values`` in the order of ``columns``."""
+    terms: List[str] = []
+    params: List[Any] = []
+    for i, (column, desc) in enumerate(zip(columns, descending)):
+        parts = [f"{columns[j]} = ?" for j in range(i)] + [f"{column} {'<' if desc else '>'} ?"]
+        terms.append("(" + " AND ".join(parts) + ")")
+        params += values[:i] + [values[i]]
+    if inclusive:
+        terms.append("(" + " AND ".join(f"{column} = ?" for column in columns) + ")")
+        params += values
+    return "(" + " OR ".join(terms) + ")", params
+
+
+class CollectionReference(Query):
+    def __init__(self, client: "Client", path: str):
+        super().__init__(client, self, ("collection", path))
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> Optional[DocumentReference]:
+        if "/" not in self.path:
+            return None
+        return DocumentReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, f"{self.path}/{document_id or _auto_id()}")
+
+    def add(
+        self, document_data: Dict[str, Any], document_id: Optional[str] = None, **_options: Any
+    ) -> Tuple[datetime, DocumentReference]:
+        ref = self.document(document_id)
+        return ref.create(document_data).update_time, ref
+
+    def on_snapshot(self, callback: Any) -> Any:
+        raise NotImplementedError("The SQLite engine has no listeners")
+
+
+def _auto_id() -> str:
+    return "".join(random.choices(_AUTO_ID, k=20))
+
+
+# ---------- Batches and transactions ----------
+
+class WriteBatch:
+    def __init__(self, client: "Client"):
+        self._client = client
+        self._writes: List[Tuple[str, DocumentReference, Any, bool, Any]] = []
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> "WriteBatch":
+        self._writes.append(("create", reference, document_data, False, None))
+        return self
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False) -> "WriteBatch":
+        self._writes.append(("set", reference, document_data, merge, None))
+        return self
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any], option: Any = None) -> "WriteBatch":
+        self._writes.append(("update", reference, field_updates, False, option))
+        return self
+
+    def delete(self, reference: DocumentReference, option: Any = None) -> "WriteBatch":
+        self._writes.append(("delete", reference, None, False, option))
+        return self
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def commit(self, **_options: Any) -> List[WriteResult]:
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+
+class Transaction(WriteBatch):
+    """Writes of a ``Client.run_transaction`` callback, applied when it returns."""
+
+    def commit(self, **_options: Any) -> List[WriteResult]:
+        raise RuntimeError("Transactions commit when the run_transaction callback returns")
+
+
+# ---------- Client ----------
+
+class Client:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._clock_lock = threading.Lock()
+        self._last_time: Optional[datetime] = None
+        self._stats = {
+            "queries": 0,
+            "indexedQueries": 0,
+            "rowsRead": 0,
+            "writes": 0,
+            "commits": 0,
+            "transactions": 0,
+        }
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        for field in INDEXED_FIELDS:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{field.replace('.', '_')}"
+                f" ON documents (collection, {_expr(field)})"
+            )
+        conn.execute("PRAGMA optimize")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per pool thread; WAL lets readers run beside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False, isolation_level=None
+            )
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, sql: str, params: Sequence[Any]) -> List[Tuple[Any, ...]]:
+        return self._conn().execute(sql, params).fetchall()
+
+    def _note_query(self, indexed: bool) -> None:
+        self._stats["queries"] += 1
+        if indexed:
+            self._stats["indexedQueries"] += 1
+
+    def _note_rows(self, count: int) -> None:
+        self._stats["rowsRead"] += count
+
+    def _now(self) -> datetime:
+        """Commit time, strictly increasing so update times identify versions."""
+        with self._clock_lock:
+            now = datetime.now(timezone.utc)
+            if self._last_time is not None and now <= self._last_time:
+                now = self._last_time + _TICK
+            self._last_time = now
+            return now
+
+    # ----- Firestore client API -----
+
+    def collection(self, *collection_path: str) -> CollectionReference:
+        return CollectionReference(self, "/".join(collection_path))
+
+    def document(self, *document_path: str) -> DocumentReference:
+        return DocumentReference(self, "/".join(document_path))
+
+    def collection_group(self, collection_id: str) -> Query:
+        return Query(self, None, ("group", collection_id))
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    @staticmethod
+    def write_option(**kwargs: Any) -> _Option:
+        return _Option(**kwargs)
+
+    def get_all(
+        self,
+        references: Iterable[DocumentReference],
+        field_paths: Optional[Sequence[str]] = None,
+        transaction: Any = None,
+        **_options: Any,
+    ) -> Iterator[LocalSnapshot]:
+        references = list(references)
+        rows: Dict[str, Tuple[str, str]] = {}
+        for start in range(0, len(references), CHUNK_SIZE):
+            paths = [ref.path for ref in references[start:start + CHUNK_SIZE]]
+            for path, raw, update_time in self._read(
+                f"SELECT path, data, update_time FROM documents"
+                f" WHERE path IN ({', '.join('?' for _ in paths)})",
+                paths,
+            ):
+                rows[path] = (raw, update_time)
+        self._stats["rowsRead"] += len(rows)
+        for ref in references:
+            row = rows.get(ref.path)
+            if row is None:
+                yield LocalSnapshot(ref.id, None, None, ref)
+                continue
+            data = loads(row[0])
+            if field_paths is not None:
+                data = _project(data, field_paths)
+            yield LocalSnapshot(ref.id, data, _parse_time(row[1]), ref)
+
+    def run_transaction(self, fn: Any) -> Any:
+        """
+        Run ``fn(transaction)`` under SQLite's write lock. Reads made by
+        ``fn`` see no concurrent writes; its writes are applied atomically
+        when it returns.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            transaction = Transaction(self)
+            result = fn(transaction)
+            self._apply(conn, transaction._writes)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._stats["transactions"] += 1
+        return result
+
+    def _commit(self, writes: List[Tuple[str, DocumentReference, Any, bool, Any]]) -> List[WriteResult]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = self._apply(conn, writes)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._stats["commits"] += 1
+        return results
+
+    def _apply(self, conn: sqlite3.Connection, writes: List[Tuple[str, DocumentReference, Any, bool, Any]]) -> List[WriteResult]:
+        write_time = self._now()
+        stamp = _format_time(write_time)
+        for kind, ref, data, merge, option in writes:
+            row = conn.execute(
+                "SELECT data, create_time, update_time FROM documents WHERE path = ?", (ref.path,)
+            ).fetchone()
+            _check_option(ref.path, option, row)
+            if kind == "delete":
+                conn.execute("DELETE FROM documents WHERE path = ?", (ref.path,))
+                continue
+            if kind == "create" and row is not None:
+                raise gexc.AlreadyExists(f"Document already exists: {ref.path}")
+            if kind == "update":
+                if row is None:
+                    raise gexc.NotFound(f"No document to update: {ref.path}")
+                document = _update_paths(loads(row[0]), data, write_time)
+            elif kind == "set" and merge and row is not None:
+                document = _merge(loads(row[0]), data, write_time)
+            else:
+                document = _merge({}, data, write_time)
+            collection = ref.path.rsplit("/", 1)[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO documents"
+                " (path, collection, group_id, data, create_time, update_time)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    ref.path,
+                    collection,
+                    collection.rsplit("/", 1)[-1],
+                    dumps(document),
+                    row[1] if row is not None else stamp,
+                    stamp,
+                ),
+            )
+        self._stats["writes"] += len(writes)
+        return [WriteResult(write_time) for _ in writes]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "indexedFields": list(INDEXED_FIELDS), **self._stats}
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
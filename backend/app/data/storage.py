@@ -0,0 +1,57 @@
+"""
+Choice of document store.
+
+Routers and the data layer reach the database through ``app.main.db`` and
+the ``aio`` helpers, using the Firestore client API. ``STORAGE_ENGINE``
+decides what stands behind ``db``:
+
+- ``firestore`` (default): the Firebase Admin Firestore client.
+- ``sqlite``: ``sqlite_store.Client``, an embedded engine in the file at
+  ``SQLITE_PATH``, for on-prem installs and local load tests.
+
+Both engines are held to the same contract by
+``benchmarks.storage_engines``. The few operations whose API differs
+between them (transactions) go through the helpers here.
+"""
+import os
+from typing import Any, Callable, Dict
+
+from google.cloud import firestore
+
+from app.data import sqlite_store
+
+ENGINES = ("firestore", "sqlite")
+ENGINE = os.environ.get("STORAGE_ENGINE", "firestore").strip().lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "dtrs-erp.sqlite3")
+
+
+def connect(engine: str = ENGINE) -> Any:
+    """A client for ``engine``; Firebase must already be initialized for Firestore."""
+    if engine == "sqlite":
+        return sqlite_store.Client(SQLITE_PATH)
+    if engine == "firestore":
+        from firebase_admin import firestore as admin_firestore
+
+        return admin_firestore.client()
+    raise ValueError(f"Unknown STORAGE_ENGINE '{engine}'. Expected one of: {', '.join(ENGINES)}")
+
+
+def is_embedded(client: Any) -> bool:
+    return isinstance(client, sqlite_store.Client)
+
+
+def run_transaction(client: Any, fn: Callable[[Any], Any]) -> Any:
+    """
+    Run ``fn(transaction)`` in a transaction of ``client``'s engine. ``fn``
+    reads with ``ref.get(transaction=transaction)`` and writes through
+    ``transaction``; Firestore retries it on contention.
+    """
+    if is_embedded(client):
+        return client.run_transaction(fn)
+    return firestore.transactional(fn)(client.transaction())
+
+
+def stats(client: Any) -> Dict[str, Any]:
+    if is_embedded(client):
+        return {"engine": "sqlite", **client.stats()}
+    return {"engine": "firestore"}
@@ -0,0 +1,90 @@
+"""
+Newline-delimited JSON streaming for list endpoints.
+
+A list route called with ``Accept: application/x-ndjson`` answers with one
+JSON document per line instead of a ``Page``. Rows are read from the
+Firestore response stream a chunk at a time and written out as soon as
+they are encoded, so memory stays flat however many documents match and the
+client can render the first rows before the query finishes. The body is
+not bound by the request deadline, only by a budget per chunk read (see
+``deadline.streaming``).
+
+The stream covers the whole result set in the requested ``order_by``,
+starting after ``page_token`` if one is given; ``limit`` does not apply.
+"""
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Type
+
+import orjson
+from fastapi import Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+
+from app.data import aio
+from app.data.pagination import PageParams, ordered_query
+from app.data.projection import project
+
+NDJSON = "application/x-ndjson"
+CHUNK_SIZE = 200
+
+
+def wants_ndjson(accept: Optional[str] = Header(default=None)) -> bool:
+    """Dependency: whether the client asked for an NDJSON stream."""
+    return accept is not None and NDJSON in accept
+
+
+@lru_cache(maxsize=None)
+def _adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def _encoder(model: Type[BaseModel], fields: Optional[List[str]]) -> Callable[[Any], bytes]:
+    if fields is not None:
+        return lambda snap: orjson.dumps(jsonable_encoder(project(snap, fields)))
+    adapter = _adapter(model)
+
+    def encode(snap: Any) -> bytes:
+        data = snap.to_dict()
+        data["id"] = snap.id
+        return adapter.dump_json(adapter.validate_python(data))
+
+    return encode
+
+
+async def _lines(
+    query: Any,
+    encode: Callable[[Any], bytes],
+    predicate: Optional[Callable[[Dict[str, Any]], bool]],
+) -> AsyncIterator[bytes]:
+    async for chunk in aio.iterate(query, chunk_size=CHUNK_SIZE, streamed=True):
+        lines = [
+            encode(snap) + b"\n"
+            for snap in chunk
+            if predicate is None or predicate(snap.to_dict())
+        ]
+        if lines:
+            yield b"".join(lines)
+
+
+def ndjson_response(
+    query: Any,
+    params: PageParams,
+    allowed: Sequence[str],
+    default: str,
+    model: Type[BaseModel],
+    select: Optional[Sequence[str]] = None,
+    fields: Optional[List[str]] = None,
+    predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> StreamingResponse:
+    """
+    Stream ``query`` as NDJSON.
+
+    Rows are validated against ``model``, or projected to ``fields`` when
+    given; ``predicate`` filters rows on their data, for in-memory filters
+    such as lead search.
+    """
+    query, _ = ordered_query(query, params, allowed, default, select)
+    return StreamingResponse(
+        _lines(query, _encoder(model, fields), predicate), media_type=NDJSON
+    )
@@ -0,0 +1,134 @@
+"""
+Request-scoped identity map for Firestore documents.
+
+``UnitOfWorkMiddleware`` opens a ``UnitOfWork`` for every HTTP request.
+While it is open, ``app.data.aio`` remembers each document it reads or
+writes by path: a second read of the same document in the same request is
+served from the map, and after an update the map holds the merged
+document, so handlers that "update then re-read" cost one round trip.
+
+Writes are still sent to Firestore immediately; the unit of work records
+them (``writes``) and keeps the merged state. Updates the map cannot merge
+locally (dotted field paths, server-side transforms such as Increment or
+SERVER_TIMESTAMP) evict the document so the next read goes to Firestore.
+"""
+import contextlib
+import copy
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.data.snapshots import LocalSnapshot
+
+_current: ContextVar[Optional["UnitOfWork"]] = ContextVar("unit_of_work", default=None)
+
+totals = {"units": 0, "hits": 0, "misses": 0, "writes": 0}
+
+
+def _is_transform(value: Any) -> bool:
+    return type(value).__module__.startswith("google.cloud.firestore_v1.transforms")
+
+
+def _mergeable(data: Dict[str, Any]) -> bool:
+    """Whether applying ``data`` locally gives the same result as Firestore."""
+    for key, value in data.items():
+        if "." in key or _is_transform(value):
+            return False
+        if isinstance(value, dict) and not _mergeable(value):
+            return False
+    return True
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    """Apply ``data`` to ``target`` as ``set(merge=True)`` does: maps merge field by field."""
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class UnitOfWork:
+    def __init__(self) -> None:
+        self._documents: Dict[str, LocalSnapshot] = {}
+        self.writes: List[Tuple[str, str]] = []
+        # Request-scoped DataLoaders, see app.data.loader
+        self.loaders: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, ref: Any) -> Optional[LocalSnapshot]:
+        snap = self._documents.get(ref.path)
+        if snap is None:
+            self.misses += 1
+            totals["misses"] += 1
+            return None
+        self.hits += 1
+        totals["hits"] += 1
+        return snap
+
+    def remember(self, ref: Any, snapshot: Any) -> None:
+        data = snapshot.to_dict() if snapshot.exists else None
+        self._documents[ref.path] = LocalSnapshot(ref.id, data, snapshot.update_time, ref)
+
+    def _record(self, op: str, ref: Any) -> None:
+        self.writes.append((op, ref.path))
+        totals["writes"] += 1
+
+    def record_set(self, ref: Any, data: Dict[str, Any], update_time: Any, merge: bool = False) -> None:
+        self._record("set", ref)
+        if not _mergeable(data):
+            self._documents.pop(ref.path, None)
+            return
+        if merge:
+            current = self._documents.get(ref.path)
+            if current is None:
+                return
+            merged = current.to_dict() or {}
+            _merge(merged, data)
+            data = merged
+        self._documents[ref.path] = LocalSnapshot(ref.id, copy.deepcopy(data), update_time, ref)
+
+    def record_update(self, ref: Any, data: Dict[str, Any], update_time: Any) -> None:
+        self._record("update", ref)
+        current = self._documents.get(ref.path)
+        if current is None or not current.exists or not _mergeable(data):
+            self._documents.pop(ref.path, None)
+            return
+        merged = current.to_dict()
+        merged.update(copy.deepcopy(data))
+        self._documents[ref.path] = LocalSnapshot(ref.id, merged, update_time, ref)
+
+    def record_delete(self, ref: Any, delete_time: Any) -> None:
+        self._record("delete", ref)
+        self._documents[ref.path] = LocalSnapshot(ref.id, None, delete_time, ref)
+
+
+def current() -> Optional[UnitOfWork]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def begin() -> Iterator[UnitOfWork]:
+    """
+    Open a unit of work, or join the one already open: the sub-requests of
+    a ``POST /batch`` share the batch's identity map and loaders.
+    """
+    active = _current.get()
+    if active is not None:
+        yield active
+        return
+    unit = UnitOfWork()
+    token = _current.set(unit)
+    totals["units"] += 1
+    try:
+        yield unit
+    finally:
+        _current.reset(token)
+
+
+def stats() -> Dict[str, Any]:
+    lookups = totals["hits"] + totals["misses"]
+    return {
+        **totals,
+        "hitRate": round(totals["hits"] / lookups, 4) if lookups else None,
+    }
@@ -0,0 +1,151 @@
+"""
+Write-behind buffer for append-only audit documents.
+
+Activity logs and notifications are written by request handlers but never
+read back by the same request, so they do not need to hold up the response.
+``append`` assigns the new document's id immediately, queues the write in
+process and returns; a background task commits queued writes in
+``WriteBatch``es once ``FLUSH_SIZE`` writes are waiting or every
+``FLUSH_INTERVAL_SECONDS``. At most ``MAX_PENDING`` writes are queued:
+when Firestore falls behind that far, ``append`` writes synchronously, so
+the callers are slowed down instead of the queue growing without bound.
+
+Queued writes are flushed when the app shuts down. A batch that fails is
+retried on later flushes and dropped, with an error log, after
+``MAX_ATTEMPTS``. With ``WRITE_BEHIND_SYNC=1`` (or before ``start`` has
+been called) ``append`` writes synchronously instead, which tests can rely
+on.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.data import aio
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = int(os.environ.get("WRITE_BEHIND_FLUSH_SIZE", "100"))
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+SYNC = os.environ.get("WRITE_BEHIND_SYNC", "0") == "1"
+MAX_PENDING = int(os.environ.get("WRITE_BEHIND_MAX_PENDING", "10000"))
+MAX_ATTEMPTS = 5
+# Firestore's limit on writes per batch commit
+MAX_BATCH_WRITES = 500
+
+
+class WriteBehindBuffer:
+    def __init__(self) -> None:
+        self._client: Any = None
+        self._pending: Deque[Tuple[Any, Dict[str, Any], int]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.appended = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.overflowed = 0
+
+    @property
+    def buffering(self) -> bool:
+        return self._task is not None and not SYNC
+
+    def start(self, client: Any) -> None:
+        self._client = client
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write out everything still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush(final=True)
+
+    async def append(self, collection: Any, data: Dict[str, Any]) -> Any:
+        """Queue ``data`` as a new document of ``collection`` and return its reference."""
+        ref = collection.document()
+        self.appended += 1
+        if not self.buffering or len(self._pending) >= MAX_PENDING:
+            if self.buffering:
+                self.overflowed += 1
+                self._wakeup.set()
+            await aio.set(ref, data)
+            self.written += 1
+            return ref
+        self._pending.append((ref, data, 0))
+        if len(self._pending) >= FLUSH_SIZE:
+            self._wakeup.set()
+        return ref
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    async def flush(self, final: bool = False) -> None:
+        """Commit queued writes; with ``final``, retry failures until they are dropped."""
+        async with self._flush_lock:
+            while self._pending:
+                size = min(len(self._pending), MAX_BATCH_WRITES)
+                items = [self._pending.popleft() for _ in range(size)]
+                if not await self._commit(items) and not final:
+                    break
+
+    async def _commit(self, items: List[Tuple[Any, Dict[str, Any], int]]) -> bool:
+        batch = self._client.batch()
+        for ref, data, _ in items:
+            batch.set(ref, data)
+        try:
+            await aio.run("commit:write_behind", batch.commit)
+        except Exception as exc:
+            self.failures += 1
+            retry = [(ref, data, attempts + 1) for ref, data, attempts in items]
+            keep = [item for item in retry if item[2] < MAX_ATTEMPTS]
+            self.dropped += len(retry) - len(keep)
+            if len(keep) < len(retry):
+                logger.error(
+                    "Dropping %d write-behind writes after %d attempts: %s",
+                    len(retry) - len(keep), MAX_ATTEMPTS, exc,
+                )
+            self._pending.extendleft(reversed(keep))
+            return False
+        self.batches += 1
+        self.written += len(items)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffering": self.buffering,
+            "pending": len(self._pending),
+            "appended": self.appended,
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "overflowed": self.overflowed,
+            "maxPending": MAX_PENDING,
+        }
+
+
+buffer = WriteBehindBuffer()
+
+
+async def append(collection: Any, data: Dict[str, Any]) -> Any:
+    return await buffer.append(collection, data)
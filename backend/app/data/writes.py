@@ -0,0 +1,89 @@
+"""
+Conditional writes that replace read-then-write existence checks.
+
+``update_existing`` and ``delete_existing`` send the write with a Firestore
+precondition instead of reading the document first: the document must
+exist and, when the client sent ``If-Match``, must not have changed since
+the version it saw. A failed precondition becomes a 404 or 409 response,
+so each guarded write costs one round trip.
+
+Versions are the document's ``update_time``; responses of guarded writes
+carry it as an ``ETag`` that clients can send back in ``If-Match``.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Header, HTTPException, Response
+from google.api_core import exceptions as gexc
+from google.cloud.firestore_v1.client import Client
+
+from app.data import aio
+
+
+def format_etag(update_time: Any) -> str:
+    return f'"{update_time.isoformat()}"'
+
+
+def expected_update_time(
+    if_match: Optional[str] = Header(default=None, alias="If-Match"),
+) -> Optional[datetime]:
+    """Dependency parsing ``If-Match`` into the update time a write must match."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    try:
+        return datetime.fromisoformat(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+
+def _write_option(last_update_time: Optional[datetime]) -> Any:
+    if last_update_time is not None:
+        return Client.write_option(last_update_time=last_update_time)
+    return Client.write_option(exists=True)
+
+
+def _raise_for(exc: Exception, not_found: str) -> None:
+    if isinstance(exc, gexc.NotFound):
+        raise HTTPException(status_code=404, detail=not_found)
+    if isinstance(exc, (gexc.FailedPrecondition, gexc.Conflict, gexc.Aborted)):
+        raise HTTPException(
+            status_code=409, detail="Document was modified by another request"
+        )
+    raise exc
+
+
+async def update_existing(
+    ref: Any,
+    data: Dict[str, Any],
+    not_found: str,
+    last_update_time: Optional[datetime] = None,
+    response: Optional[Response] = None,
+) -> Any:
+    """Update ``ref`` only if it exists (and still has ``last_update_time``)."""
+    # update() always carries an exists precondition; Firestore rejects an
+    # explicit exists option on it.
+    kwargs = {}
+    if last_update_time is not None:
+        kwargs["option"] = _write_option(last_update_time)
+    try:
+        result = await aio.update(ref, data, **kwargs)
+    except gexc.GoogleAPICallError as exc:
+        _raise_for(exc, not_found)
+    if response is not None:
+        response.headers["ETag"] = format_etag(result.update_time)
+    return result
+
+
+async def delete_existing(
+    ref: Any,
+    not_found: str,
+    last_update_time: Optional[datetime] = None,
+) -> Any:
+    """Delete ``ref`` only if it exists (and still has ``last_update_time``)."""
+    try:
+        return await aio.delete(ref, option=_write_option(last_update_time))
+    except gexc.GoogleAPICallError as exc:
+        _raise_for(exc, not_found)
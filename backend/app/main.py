@@ -1,7 +1,8 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -38,10 +39,26 @@ if not firebase_admin._apps:
 else:
     print("✅ Firebase already initialized.")
 
-# Initialize Firestore
-db = firestore.client()
+# Initialize the document store: Firestore, or SQLite when STORAGE_ENGINE=sqlite
+from app.data import storage
 
-app = FastAPI(title="DTRS PRO ERP Backend")
+db = storage.connect()
+
+app = FastAPI(title="DTRS PRO ERP Backend", default_response_class=ORJSONResponse)
+
+from app.middleware.coalescing import CoalescingMiddleware
+from app.middleware.concurrency import ConcurrencyLimitMiddleware
+from app.middleware.content_negotiation import MsgPackMiddleware
+from app.middleware.deadline import DeadlineMiddleware
+from app.middleware.unit_of_work import UnitOfWorkMiddleware
+
+# Last added runs first: identical GETs are coalesced, then admitted, then
+# MessagePack is negotiated, then they get a deadline and a unit of work.
+app.add_middleware(UnitOfWorkMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MsgPackMiddleware)
+app.add_middleware(ConcurrencyLimitMiddleware)
+app.add_middleware(CoalescingMiddleware)
 
 # CORS
 origins = os.environ.get('CORS_ORIGINS', '*').split(',')
@@ -72,6 +89,8 @@ from app.routers import (
     automation,
     weather,
     tech,
+    metrics,
+    batch,
 )
 
 app.include_router(auth.router)
@@ -92,6 +111,34 @@ app.include_router(reporting.router)
 app.include_router(automation.router)
 app.include_router(weather.router)
 app.include_router(tech.router)
+app.include_router(metrics.router)
+app.include_router(batch.router)
+
+
+@app.on_event("startup")
+async def start_data_path():
+    from app.data import archive, counters, denormalize, replica, write_behind
+
+    if not storage.is_embedded(db):
+        # Reads are already local on the embedded engine, which has no listeners
+        replica.start_all(db)
+    write_behind.buffer.start(db)
+    counters.start(db)
+    denormalize.propagator.start(db)
+    archive.archiver.start(db)
+
+
+@app.on_event("shutdown")
+async def shutdown_data_path():
+    from app.data import aio, archive, counters, denormalize, replica, write_behind
+
+    await archive.archiver.stop()
+    await denormalize.propagator.stop()
+    await counters.stop()
+    await write_behind.buffer.stop()
+    replica.stop_all()
+    aio.shutdown()
+
 
 @app.get("/")
 async def root():
@@ -0,0 +1,32 @@
+from app.data import single_flight
+
+
+class CoalescingMiddleware:
+    """Shares one response among identical concurrent GETs on opted-in routes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        key = single_flight.request_key(scope) if scope["type"] == "http" else None
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def respond():
+            messages = []
+
+            async def capture(message):
+                messages.append(message)
+
+            await self.app(scope, receive, capture)
+            return messages
+
+        messages, shared = await single_flight.requests.do(key, respond)
+        for message in messages:
+            if shared and message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(b"x-coalesced", b"1")],
+                }
+            await send(message)
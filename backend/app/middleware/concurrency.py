@@ -0,0 +1,60 @@
+import time
+
+from google.api_core import exceptions as gexc
+
+from app.data import limiter
+
+# Statuses that mean the backend is overloaded, not that the request was bad
+OVERLOAD_STATUSES = (503, 504)
+
+
+class ConcurrencyLimitMiddleware:
+    """Admits requests through the adaptive limiter; shed requests get a 503."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Batch sub-requests run inside the batch request's slot
+        if scope["type"] != "http" or scope.get("batch") or limiter.exempt(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        priority = limiter.classify(
+            scope["method"], scope["path"], headers.get(b"accept", b"").decode("latin-1")
+        )
+        try:
+            await limiter.limiter.acquire(priority)
+        except limiter.Shed as shed:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(shed.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Server busy"}'})
+            return
+
+        status = None
+
+        async def tracking_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            await self.app(scope, receive, tracking_send)
+        except (gexc.DeadlineExceeded, gexc.ResourceExhausted):
+            failed = True
+            raise
+        finally:
+            limiter.limiter.release(
+                (time.perf_counter() - started) * 1000,
+                failed=failed or status in OVERLOAD_STATUSES,
+                sample=priority != limiter.Priority.LOW,
+            )
@@ -0,0 +1,130 @@
+"""
+MessagePack as an alternative wire format.
+
+Clients that send ``Accept: application/msgpack`` get JSON responses
+re-encoded as MessagePack, which is smaller and cheaper to parse on
+low-end devices. ``/tech`` POSTs may send their body as MessagePack
+(``Content-Type: application/msgpack``); it is decoded to JSON before
+FastAPI parses it, so the route models are unchanged.
+
+``msgpack`` is optional: without it, ``Accept`` is ignored and JSON is
+sent, and MessagePack request bodies are answered with 415.
+"""
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+MSGPACK = MSGPACK_TYPES[0]
+DECODED_PREFIXES = ("/tech",)
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def wants_msgpack(accept: str) -> bool:
+    for part in accept.split(","):
+        media, *params = [piece.strip() for piece in part.split(";")]
+        if media in MSGPACK_TYPES:
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip() == "q":
+                    try:
+                        return float(value) > 0
+                    except ValueError:
+                        return False
+            return True
+    return False
+
+
+def _replace_headers(headers, content_type: bytes, length: int):
+    kept = [
+        (key, value) for key, value in headers
+        if key not in (b"content-type", b"content-length")
+    ]
+    return kept + [(b"content-type", content_type), (b"content-length", str(length).encode())]
+
+
+async def _send_error(send, status: int, detail: str) -> None:
+    body = orjson.dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class MsgPackMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_type = _header(scope, b"content-type").split(";")[0].strip()
+        if content_type in MSGPACK_TYPES and scope["path"].startswith(DECODED_PREFIXES):
+            if msgpack is None:
+                await _send_error(send, 415, "MessagePack bodies are not supported")
+                return
+            chunks = []
+            while True:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            try:
+                body = orjson.dumps(msgpack.unpackb(b"".join(chunks), timestamp=3))
+            except (ValueError, TypeError, msgpack.UnpackException):
+                await _send_error(send, 400, "Invalid MessagePack body")
+                return
+            scope = {
+                **scope,
+                "headers": _replace_headers(scope["headers"], b"application/json", len(body)),
+            }
+            delivered = False
+
+            async def receive():
+                nonlocal delivered
+                if delivered:
+                    return {"type": "http.disconnect"}
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+        if msgpack is None or not wants_msgpack(_header(scope, b"accept")):
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def encoding_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers") or [])
+                if headers.get(b"content-type", b"").startswith(b"application/json"):
+                    start = message
+                    return
+            elif message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                if message.get("more_body"):
+                    return
+                body = b"".join(chunks)
+                if body:
+                    body = msgpack.packb(orjson.loads(body))
+                headers = _replace_headers(start.get("headers") or [], MSGPACK.encode(), len(body))
+                await send({**start, "headers": headers + [(b"vary", b"Accept")]})
+                await send({"type": "http.response.body", "body": body})
+                return
+            await send(message)
+
+        await self.app(scope, receive, encoding_send)
@@ -0,0 +1,38 @@
+from google.api_core import exceptions as gexc
+
+from app.data import deadline
+
+
+class DeadlineMiddleware:
+    """Starts the route's request deadline; an exceeded deadline becomes a 504."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = False
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        with deadline.begin(deadline.policy_for(scope["path"])):
+            try:
+                await self.app(scope, receive, tracking_send)
+            except gexc.DeadlineExceeded:
+                if started:
+                    raise
+                await send({
+                    "type": "http.response.start",
+                    "status": 504,
+                    "headers": [(b"content-type", b"application/json")],
+                })
+                await send({
+                    "type": "http.response.body",
+                    "body": b'{"detail":"Request deadline exceeded"}',
+                })
@@ -0,0 +1,15 @@
+from app.data import unit_of_work
+
+
+class UnitOfWorkMiddleware:
+    """Opens a request-scoped identity map around every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with unit_of_work.begin():
+            await self.app(scope, receive, send)
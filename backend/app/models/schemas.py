@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr, constr, conint, confloat
-from typing import List, Optional, Any, Dict, Literal
+from typing import List, Optional, Any, Dict, Literal, Generic, TypeVar
 from datetime import datetime
 from enum import Enum
 
@@ -141,6 +141,36 @@ class Job(BaseModel):
     notes: Optional[str] = None
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
+    # Set while the job is archived and its document is a stub (see app.data.archive)
+    archivedAt: Optional[datetime] = Field(
+        default=None,
+        description=(
+            "Set while the job is archived. List items for archived jobs hold only the "
+            "summary fields; milestones, specs, photos and notes are empty until "
+            "GET /jobs/{id} restores the job."
+        ),
+    )
+    archiveState: Optional[str] = Field(
+        default=None, description="'moving' while an archive move is not yet complete"
+    )
+
+
+class JobSummary(BaseModel):
+    """List-view subset of Job used by the Jobs and Dispatch pages."""
+    id: Optional[str] = None
+    customerId: str
+    status: JobStatus = JobStatus.SCHEDULED
+    type: JobType
+    scheduledDate: datetime
+    assignedCrewId: Optional[str] = None
+    technicianIds: List[str] = []
+    address: Address
+    workflowState: JobWorkflowState = JobWorkflowState.INTAKE_QUOTING
+    systemSizeKw: Optional[float] = None
+    createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
+    archivedAt: Optional[datetime] = None
+    archiveState: Optional[str] = None
 
 
 class InventoryBinLocationType(str, Enum):
@@ -308,6 +338,21 @@ class Lead(BaseModel):
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
 
+class LeadSummary(BaseModel):
+    """List-view subset of Lead."""
+    id: Optional[str] = None
+    customerName: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    partnerId: Optional[str] = None
+    source: Optional[LeadIntakeSource] = None
+    score: Optional[int] = None
+    estimatedValue: float = 0
+    status: LeadStatus = LeadStatus.NEW
+    assignedTo: Optional[str] = None
+    createdAt: Optional[datetime] = None
+
+
 # ---------- Job workflow helpers ----------
 
 ALLOWED_JOB_TRANSITIONS = {
@@ -421,10 +466,10 @@ class ScheduleEntry(BaseModel):
     status: ScheduleStatus = ScheduleStatus.SCHEDULED
 
     # YYYY-MM-DD for easy querying and UI mapping
-    date: constr(regex=r"^\d{4}-\d{2}-\d{2}$")
+    date: constr(pattern=r"^\d{4}-\d{2}-\d{2}$")
     # HH:MM 24h format
-    startTime: constr(regex=r"^\d{2}:\d{2}$")
-    endTime: constr(regex=r"^\d{2}:\d{2}$")
+    startTime: constr(pattern=r"^\d{2}:\d{2}$")
+    endTime: constr(pattern=r"^\d{2}:\d{2}$")
 
     # Optional weather overlay stored on each entry
     weather: Optional[Dict[str, Any]] = None
@@ -495,6 +540,9 @@ class EstimateLineItem(BaseModel):
 
 class Estimate(BaseModel):
     id: Optional[str] = None
+    estimateNumber: Optional[str] = Field(
+        default=None, description="Assigned from the estimate sequence on create"
+    )
     jobId: Optional[str] = None
     customerId: Optional[str] = None
     customerName: Optional[str] = None
@@ -534,7 +582,9 @@ class InvoiceLineItem(BaseModel):
 
 class Invoice(BaseModel):
     id: Optional[str] = None
-    invoiceNumber: str
+    invoiceNumber: str = Field(
+        default="", description="Assigned from the invoice sequence when empty"
+    )
     jobId: str
     customerId: str
     customerName: str
@@ -559,6 +609,23 @@ class Invoice(BaseModel):
     sentDate: Optional[datetime] = None
 
 
+class InvoiceSummary(BaseModel):
+    """List-view subset of Invoice, without line items."""
+    id: Optional[str] = None
+    invoiceNumber: str
+    jobId: str
+    customerId: str
+    customerName: str
+    partnerName: Optional[str] = None
+    type: InvoiceType
+    status: InvoiceStatus = InvoiceStatus.DRAFT
+    total: float = 0
+    paidAmount: float = 0
+    balanceDue: float = 0
+    dueDate: Optional[datetime] = None
+    createdAt: Optional[datetime] = None
+
+
 # ---------- Authentication & Authorization ----------
 
 class UserRole(str, Enum):
@@ -682,3 +749,36 @@ class TechReset(BaseModel):
     notes: Optional[str] = None
     stringSizingValid: bool = True
     createdAt: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ---------- API Responses ----------
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    """One page of a cursor-paginated list endpoint."""
+    items: List[T] = []
+    nextPageToken: Optional[str] = None
+
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str = Field(..., description="Path with optional query string, e.g. /jobs?limit=20")
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
+
+class BatchSubResponse(BaseModel):
+    id: Optional[str] = None
+    status: int
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
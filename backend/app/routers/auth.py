@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth as firebase_auth
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 from app.models.schemas import (
     User,
     UserRole,
@@ -11,15 +12,24 @@ from app.models.schemas import (
 )
 from pydantic import BaseModel
 from app.main import db
+from app.data import aio, denormalize
+from app.data.replica import fresh_replica
+from google.api_core import exceptions as gexc
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 security = HTTPBearer()
 
+# (token, user) verified by an enclosing POST /batch, reused by its sub-requests
+verified_user: ContextVar[Optional[Tuple[str, User]]] = ContextVar("verified_user", default=None)
+
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     """Verify Firebase ID token and return user."""
+    verified = verified_user.get()
+    if verified is not None and verified[0] == credentials.credentials:
+        return verified[1]
     try:
         # Verify the Firebase ID token
         decoded_token = firebase_auth.verify_id_token(credentials.credentials)
@@ -33,7 +43,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         
         # Get user from Firestore
         user_ref = db.collection("users").document(uid)
-        user_doc = user_ref.get()
+        user_doc = await aio.get(user_ref)
         
         if not user_doc.exists:
             raise HTTPException(
@@ -50,6 +60,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication token"
         )
+    except gexc.DeadlineExceeded:
+        # A slow user lookup is a timeout, not an authentication failure
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -81,9 +94,12 @@ async def register(request: RegisterRequest):
     password = request.password
     
     # Check if user already exists in Firestore
-    users_ref = db.collection("users")
-    query = users_ref.where(filter=FieldFilter("email", "==", user.email))
-    existing = list(query.stream())
+    replica = fresh_replica("users")
+    if replica:
+        existing = replica.where(email=user.email)
+    else:
+        query = db.collection("users").where(filter=FieldFilter("email", "==", user.email))
+        existing = await aio.stream(query)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -101,7 +117,10 @@ async def register(request: RegisterRequest):
         user_dict["createdAt"] = datetime.utcnow()
         user_dict["updatedAt"] = datetime.utcnow()
         
-        db.collection("users").document(firebase_user.uid).set(user_dict)
+        user_ref = db.collection("users").document(firebase_user.uid)
+        await aio.set(user_ref, user_dict)
+        # Jobs and invoices may already carry this customer's id
+        await denormalize.source_changed(db, user_ref, None, denormalize.source_fields("users", user_dict))
         
         user.id = firebase_user.uid
         return user
@@ -121,7 +140,7 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
         
         # Get user from Firestore
         user_ref = db.collection("users").document(uid)
-        user_doc = user_ref.get()
+        user_doc = await aio.get(user_ref)
         
         if not user_doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
@@ -134,6 +153,8 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
             "uid": uid,
             "email": decoded_token.get('email')
         }
+    except gexc.DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
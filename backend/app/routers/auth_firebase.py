@@ -11,6 +11,8 @@ from app.models.schemas import (
 )
 from pydantic import BaseModel
 from app.main import db
+from app.data import aio
+from app.data.replica import fresh_replica
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -33,7 +35,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         
         # Get user from Firestore
         user_ref = db.collection("users").document(uid)
-        user_doc = user_ref.get()
+        user_doc = await aio.get(user_ref)
         
         if not user_doc.exists:
             raise HTTPException(
@@ -81,9 +83,12 @@ async def register(request: RegisterRequest):
     password = request.password
     
     # Check if user already exists in Firestore
-    users_ref = db.collection("users")
-    query = users_ref.where(filter=FieldFilter("email", "==", user.email))
-    existing = list(query.stream())
+    replica = fresh_replica("users")
+    if replica:
+        existing = replica.where(email=user.email)
+    else:
+        query = db.collection("users").where(filter=FieldFilter("email", "==", user.email))
+        existing = await aio.stream(query)
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -101,7 +106,7 @@ async def register(request: RegisterRequest):
         user_dict["createdAt"] = datetime.utcnow()
         user_dict["updatedAt"] = datetime.utcnow()
         
-        db.collection("users").document(firebase_user.uid).set(user_dict)
+        await aio.set(db.collection("users").document(firebase_user.uid), user_dict)
         
         user.id = firebase_user.uid
         return user
@@ -121,7 +126,7 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
         
         # Get user from Firestore
         user_ref = db.collection("users").document(uid)
-        user_doc = user_ref.get()
+        user_doc = await aio.get(user_ref)
         
         if not user_doc.exists:
             raise HTTPException(status_code=404, detail="User not found")
@@ -4,6 +4,9 @@ from pydantic import BaseModel
 from datetime import datetime
 from app.routers.auth import get_current_active_user, User
 from app.main import db
+from app.data import aio
+from app.data.replica import fresh_replica
+from app.data.writes import update_existing
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/automation", tags=["automation"])
@@ -27,14 +30,17 @@ async def list_automations(
     current_user: User = Depends(get_current_active_user)
 ):
     """List all automation rules."""
-    automations_ref = db.collection("automations")
-    query = automations_ref
-    
-    if enabled is not None:
-        query = query.where(filter=FieldFilter("enabled", "==", enabled))
+    replica = fresh_replica("automations")
+    if replica:
+        docs = replica.where(enabled=enabled) if enabled is not None else replica.where()
+    else:
+        query = db.collection("automations")
+        if enabled is not None:
+            query = query.where(filter=FieldFilter("enabled", "==", enabled))
+        docs = await aio.stream(query)
     
     automations = []
-    for doc in query.stream():
+    for doc in docs:
         data = doc.to_dict()
         data["id"] = doc.id
         automations.append(AutomationRule(**data))
@@ -52,7 +58,7 @@ async def create_automation(
     automation_dict["createdAt"] = datetime.utcnow()
     automation_dict["updatedAt"] = datetime.utcnow()
     
-    _, ref = db.collection("automations").add(automation_dict)
+    _, ref = await aio.add(db.collection("automations"), automation_dict)
     automation.id = ref.id
     return automation
 
@@ -65,7 +71,7 @@ async def update_automation(
 ):
     """Update an automation rule."""
     doc_ref = db.collection("automations").document(automation_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Automation not found")
@@ -73,7 +79,7 @@ async def update_automation(
     automation_dict = automation.model_dump(exclude={"id"})
     automation_dict["updatedAt"] = datetime.utcnow()
     
-    doc_ref.update(automation_dict)
+    await aio.update(doc_ref, automation_dict)
     automation.id = automation_id
     return automation
 
@@ -85,12 +91,12 @@ async def delete_automation(
 ):
     """Delete an automation rule."""
     doc_ref = db.collection("automations").document(automation_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Automation not found")
     
-    doc_ref.delete()
+    await aio.delete(doc_ref)
     return {"message": "Automation deleted successfully"}
 
 
@@ -102,12 +108,11 @@ async def toggle_automation(
 ):
     """Enable or disable an automation rule."""
     doc_ref = db.collection("automations").document(automation_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Automation not found")
-    
-    doc_ref.update({"enabled": enabled, "updatedAt": datetime.utcnow()})
+    await update_existing(
+        doc_ref,
+        {"enabled": enabled, "updatedAt": datetime.utcnow()},
+        "Automation not found",
+    )
     return {"message": f"Automation {'enabled' if enabled else 'disabled'}"}
 
 
@@ -125,7 +130,7 @@ async def get_automation_logs(
         query = query.where(filter=FieldFilter("automationId", "==", automation_id))
     
     logs = []
-    for doc in query.stream():
+    for doc in await aio.stream(query):
         data = doc.to_dict()
         data["id"] = doc.id
         logs.append(data)
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.models.schemas import BatchRequest, BatchResponse, BatchSubRequest, BatchSubResponse
+from app.routers.auth import get_current_active_user, security, verified_user, User
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+MAX_SUB_REQUESTS = 20
+MAX_CONCURRENT_SUB_REQUESTS = 8
+MAX_BODY_BYTES = 256 * 1024
+# Response headers passed through to the caller
+FORWARDED_HEADERS = ("content-type", "etag", "retry-after")
+
+
+async def _dispatch(
+    app: Any, parent: Dict[str, Any], sub: BatchSubRequest, token: str
+) -> BatchSubResponse:
+    """Run one sub-request through the full ASGI app, in process."""
+    path, _, query = sub.path.partition("?")
+    body = orjson.dumps(sub.body) if sub.body is not None else b""
+    headers = [
+        (b"authorization", f"Bearer {token}".encode()),
+        (b"accept", b"application/json"),
+    ]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    scope = {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": sub.method,
+        "scheme": parent.get("scheme", "http"),
+        "server": parent.get("server"),
+        "client": parent.get("client"),
+        "root_path": parent.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": headers,
+        "batch": True,
+    }
+    delivered = False
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # No disconnect while the sub-request runs
+        await asyncio.Event().wait()
+
+    status = 500
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            for key, value in message.get("headers", []):
+                name = key.decode("latin-1").lower()
+                if name in FORWARDED_HEADERS:
+                    response_headers[name] = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # The app has already answered 500; keep the rest of the batch
+        logger.exception("Batch sub-request %s %s failed", sub.method, sub.path)
+    raw = b"".join(chunks)
+    if not raw:
+        content = None
+    elif response_headers.get("content-type", "").startswith("application/json"):
+        content = orjson.loads(raw)
+    else:
+        content = raw.decode("utf-8", errors="replace")
+    return BatchSubResponse(id=sub.id, status=status, headers=response_headers, body=content)
+
+
+@router.post("", response_model=BatchResponse)
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Run up to ``MAX_SUB_REQUESTS`` API calls in one round trip.
+
+    The token is verified and the user loaded once for the whole batch.
+    Sub-requests run concurrently (at most ``MAX_CONCURRENT_SUB_REQUESTS``
+    at a time, in no guaranteed order) against the regular routes and share
+    this request's identity map, so a document read by one sub-request is
+    not read again by another. Each result carries its own status; a failed
+    sub-request does not fail the batch.
+    """
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(batch.requests) > MAX_SUB_REQUESTS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {MAX_SUB_REQUESTS} requests per batch"
+        )
+    for sub in batch.requests:
+        if not sub.path.startswith("/") or sub.path.split("?")[0].rstrip("/") == "/batch":
+            raise HTTPException(status_code=400, detail=f"Invalid sub-request path: {sub.path}")
+        if sub.body is not None and len(orjson.dumps(sub.body)) > MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail=f"Sub-request body too large: {sub.path}")
+
+    token = credentials.credentials
+    slots = asyncio.Semaphore(MAX_CONCURRENT_SUB_REQUESTS)
+
+    async def run(sub: BatchSubRequest) -> BatchSubResponse:
+        async with slots:
+            return await _dispatch(request.app, request.scope, sub, token)
+
+    verified = verified_user.set((token, current_user))
+    try:
+        responses = await asyncio.gather(*(run(sub) for sub in batch.requests))
+    finally:
+        verified_user.reset(verified)
+    return BatchResponse(responses=list(responses))
@@ -1,27 +1,34 @@
-from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from typing import List, Optional
-from app.models.schemas import Contact
+from app.models.schemas import Contact, Page
 from app.main import db
+from app.data import aio, denormalize
+from app.data.pagination import PageParams, fetch_page
+from app.data.writes import delete_existing, expected_update_time, update_existing
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
 @router.post("/", response_model=Contact)
 async def create_contact(contact: Contact):
-    contact_dict = contact.model_dump(exclude={"id"})
-    update_time, contact_ref = db.collection("contacts").add(contact_dict)
+    contact_dict = await denormalize.fill(db, "contacts", contact.model_dump(exclude={"id"}))
+    contact.partnerName = contact_dict.get("partnerName")
+    update_time, contact_ref = await aio.add(db.collection("contacts"), contact_dict)
     contact.id = contact_ref.id
     return contact
 
-@router.get("/", response_model=List[Contact])
-async def get_contacts(partnerId: Optional[str] = None, search: Optional[str] = None):
-    contacts_ref = db.collection("contacts")
+@router.get("/", response_model=Page[Contact])
+async def get_contacts(
+    partnerId: Optional[str] = None,
+    search: Optional[str] = None,
+    page: PageParams = Depends(),
+):
+    query = db.collection("contacts")
     
     if partnerId:
-        query = contacts_ref.where(filter=FieldFilter("partnerId", "==", partnerId))
-        docs = query.stream()
-    else:
-        docs = contacts_ref.stream()
+        query = query.where(filter=FieldFilter("partnerId", "==", partnerId))
+    docs, next_token = await fetch_page(query, page, ("lastName",), "lastName")
         
     contacts = []
     for doc in docs:
@@ -39,12 +46,12 @@ async def get_contacts(partnerId: Optional[str] = None, search: Optional[str] =
         else:
             contacts.append(Contact(**data))
             
-    return contacts
+    return Page(items=contacts, nextPageToken=next_token)
 
 @router.get("/{contact_id}", response_model=Contact)
 async def get_contact(contact_id: str):
     doc_ref = db.collection("contacts").document(contact_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Contact not found")
     
@@ -53,21 +60,23 @@ async def get_contact(contact_id: str):
     return Contact(**data)
 
 @router.put("/{contact_id}", response_model=Contact)
-async def update_contact(contact_id: str, contact: Contact):
+async def update_contact(
+    contact_id: str,
+    contact: Contact,
+    response: Response,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     doc_ref = db.collection("contacts").document(contact_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Contact not found")
-        
     data = contact.model_dump(exclude={"id"})
-    doc_ref.update(data)
+    await update_existing(doc_ref, data, "Contact not found", if_match, response)
     contact.id = contact_id
     return contact
 
 @router.delete("/{contact_id}")
-async def delete_contact(contact_id: str):
+async def delete_contact(
+    contact_id: str,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     doc_ref = db.collection("contacts").document(contact_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Contact not found")
-        
-    doc_ref.delete()
+    await delete_existing(doc_ref, "Contact not found", if_match)
     return {"message": "Contact deleted successfully"}
@@ -1,9 +1,15 @@
-from typing import List
+from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Response
 
 from app.main import db
-from app.models.schemas import Crew
+from app.data import aio
+from app.data.pagination import PageParams, fetch_page, paginate_local
+from app.data.replica import fresh_replica
+from app.data.serialization import page_response
+from app.data.writes import delete_existing, expected_update_time, update_existing
+from app.models.schemas import Crew, Page
 
 
 router = APIRouter(prefix="/crews", tags=["crews"])
@@ -12,25 +18,24 @@ router = APIRouter(prefix="/crews", tags=["crews"])
 @router.post("/", response_model=Crew)
 async def create_crew(crew: Crew):
     data = crew.model_dump(exclude={"id"})
-    _, ref = db.collection("crews").add(data)
+    _, ref = await aio.add(db.collection("crews"), data)
     crew.id = ref.id
     return crew
 
 
-@router.get("/", response_model=List[Crew])
-async def list_crews():
-    docs = db.collection("crews").stream()
-    crews: List[Crew] = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["id"] = doc.id
-        crews.append(Crew(**data))
-    return crews
+@router.get("/", response_model=Page[Crew])
+async def list_crews(page: PageParams = Depends()):
+    replica = fresh_replica("crews")
+    if replica:
+        docs, next_token = paginate_local(replica.where(), page, ("name",), "name")
+    else:
+        docs, next_token = await fetch_page(db.collection("crews"), page, ("name",), "name")
+    return page_response(Crew, docs, next_token)
 
 
 @router.get("/{crew_id}", response_model=Crew)
 async def get_crew(crew_id: str):
-    snap = db.collection("crews").document(crew_id).get()
+    snap = await aio.get(db.collection("crews").document(crew_id))
     if not snap.exists:
         raise HTTPException(status_code=404, detail="Crew not found")
     data = snap.to_dict()
@@ -39,22 +44,26 @@ async def get_crew(crew_id: str):
 
 
 @router.put("/{crew_id}", response_model=Crew)
-async def update_crew(crew_id: str, crew: Crew):
+async def update_crew(
+    crew_id: str,
+    crew: Crew,
+    response: Response,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     ref = db.collection("crews").document(crew_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Crew not found")
     data = crew.model_dump(exclude={"id"})
-    ref.update(data)
+    await update_existing(ref, data, "Crew not found", if_match, response)
     crew.id = crew_id
     return crew
 
 
 @router.delete("/{crew_id}")
-async def delete_crew(crew_id: str):
+async def delete_crew(
+    crew_id: str,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     ref = db.collection("crews").document(crew_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Crew not found")
-    ref.delete()
+    await delete_existing(ref, "Crew not found", if_match)
     return {"deleted": True}
 
 
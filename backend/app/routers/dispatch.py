@@ -1,14 +1,21 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Optional
 import requests
 import os
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 
 from app.main import db
+from app.data import loader, rollups
+from app.data.pagination import PageParams, fetch_page
+from app.data.serialization import page_response
+from app.data.streaming import ndjson_response, wants_ndjson
+from app.data.writes import expected_update_time, format_etag
 from app.models.schemas import (
     ScheduleEntry,
     ScheduleType,
     Job,
+    Page,
     validate_schedule_constraints,
 )
 
@@ -17,14 +24,23 @@ router = APIRouter(prefix="/dispatch", tags=["dispatch"])
 
 
 async def _get_job(job_id: str) -> Job:
-    snap = db.collection("jobs").document(job_id).get()
-    if not snap.exists:
+    snap = await loader.documents(db, "jobs").load(job_id)
+    if snap is None:
         raise HTTPException(status_code=404, detail="Job not found for schedule entry")
     data = snap.to_dict()
     data["id"] = snap.id
     return Job(**data)
 
 
+async def _get_entry(ref, if_match: Optional[datetime]):
+    snap = await rollups.read(ref)
+    if not snap.exists:
+        raise HTTPException(status_code=404, detail="Schedule entry not found")
+    if if_match is not None and format_etag(if_match) != format_etag(snap.update_time):
+        raise HTTPException(status_code=409, detail="Document was modified by another request")
+    return snap
+
+
 async def _fetch_weather_for_job(job: Job, date: str) -> Optional[dict]:
     """Fetch weather data for a job location and date."""
     try:
@@ -63,19 +79,21 @@ async def create_schedule(entry: ScheduleEntry):
     if weather:
         data["weather"] = weather
     
-    _, ref = db.collection("schedule").add(data)
+    _, ref = await rollups.add(db, db.collection("schedule"), data)
     entry.id = ref.id
     if weather:
         entry.weather = weather
     return entry
 
 
-@router.get("/schedule", response_model=List[ScheduleEntry])
+@router.get("/schedule", response_model=Page[ScheduleEntry])
 async def list_schedule(
     date: Optional[str] = Query(default=None),
     start_date: Optional[str] = Query(default=None),
     end_date: Optional[str] = Query(default=None),
-    crew_id: Optional[str] = Query(default=None)
+    crew_id: Optional[str] = Query(default=None),
+    page: PageParams = Depends(),
+    ndjson: bool = Depends(wants_ndjson),
 ):
     """List schedule entries with optional filters."""
     col = db.collection("schedule")
@@ -88,22 +106,22 @@ async def list_schedule(
     if crew_id:
         col = col.where("crewId", "==", crew_id)
 
-    docs = col.stream()
-    items: List[ScheduleEntry] = []
-    for d in docs:
-        data = d.to_dict()
-        data["id"] = d.id
-        items.append(ScheduleEntry(**data))
-    return items
+    # A date range must be ordered by date first; (crewId, date) covers the
+    # crew filter.
+    if ndjson:
+        return ndjson_response(col, page, ("date",), "date", ScheduleEntry)
+    docs, next_token = await fetch_page(col, page, ("date",), "date")
+    return page_response(ScheduleEntry, docs, next_token)
 
 
 @router.put("/schedule/{entry_id}", response_model=ScheduleEntry)
-async def update_schedule(entry_id: str, entry: ScheduleEntry):
+async def update_schedule(
+    entry_id: str,
+    entry: ScheduleEntry,
+    response: Response,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     ref = db.collection("schedule").document(entry_id)
-    snap = ref.get()
-    if not snap.exists:
-        raise HTTPException(status_code=404, detail="Schedule entry not found")
-
     job = await _get_job(entry.jobId)
     try:
         validate_schedule_constraints(job, entry)
@@ -111,17 +129,22 @@ async def update_schedule(entry_id: str, entry: ScheduleEntry):
         raise HTTPException(status_code=400, detail=str(exc))
 
     data = entry.model_dump(exclude={"id"})
-    ref.update(data)
+    # The entry's job rollup changes with its job and type, so the current
+    # entry is read; the write is conditional on that version.
+    snap = await _get_entry(ref, if_match)
+    result = await rollups.update(db, ref, data, snap)
+    response.headers["ETag"] = format_etag(result.update_time)
     entry.id = entry_id
     return entry
 
 
 @router.delete("/schedule/{entry_id}")
-async def delete_schedule(entry_id: str):
+async def delete_schedule(
+    entry_id: str,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     ref = db.collection("schedule").document(entry_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Schedule entry not found")
-    ref.delete()
+    await rollups.delete(db, ref, await _get_entry(ref, if_match))
     return {"deleted": True}
 
 
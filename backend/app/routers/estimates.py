@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from typing import List
-from app.models.schemas import Estimate, EstimateLineItem
+from app.models.schemas import Estimate, EstimateLineItem, Page
 from app.main import db
+from app.data import aio, denormalize, rollups, sequences
+from app.data.pagination import PageParams, fetch_page
+from app.data.serialization import page_response
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/estimates", tags=["estimates"])
@@ -27,40 +30,39 @@ async def create_estimate(estimate: Estimate):
     estimate.subtotal = totals["subtotal"]
     estimate.taxAmount = totals["taxAmount"]
     estimate.total = totals["total"]
+    estimate.estimateNumber = await sequences.estimate_number(db)
     
-    estimate_dict = estimate.model_dump(exclude={"id"})
-    _, estimate_ref = db.collection("estimates").add(estimate_dict)
+    estimate_dict = await denormalize.fill(db, "estimates", estimate.model_dump(exclude={"id"}))
+    estimate.customerName = estimate_dict.get("customerName")
+    _, estimate_ref = await aio.add(db.collection("estimates"), estimate_dict)
     estimate.id = estimate_ref.id
     return estimate
 
 
-@router.get("/", response_model=List[Estimate])
-async def get_estimates(jobId: str = None, status: str = None):
+@router.get("/", response_model=Page[Estimate])
+async def get_estimates(jobId: str = None, status: str = None, page: PageParams = Depends()):
     """List estimates with optional filters."""
     estimates_ref = db.collection("estimates")
     query = estimates_ref
+    allowed = ("-createdAt", "createdAt")
     
     if jobId:
         query = query.where(filter=FieldFilter("jobId", "==", jobId))
     if status:
         query = query.where(filter=FieldFilter("status", "==", status))
+    if jobId or status:
+        allowed = ("-createdAt",)
     
-    docs = query.stream()
+    docs, next_token = await fetch_page(query, page, allowed, "-createdAt")
     
-    estimates = []
-    for doc in docs:
-        est_data = doc.to_dict()
-        est_data["id"] = doc.id
-        estimates.append(Estimate(**est_data))
-    
-    return estimates
+    return page_response(Estimate, docs, next_token)
 
 
 @router.get("/{estimate_id}", response_model=Estimate)
 async def get_estimate(estimate_id: str):
     """Get a single estimate by ID."""
     doc_ref = db.collection("estimates").document(estimate_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Estimate not found")
     
@@ -73,7 +75,7 @@ async def get_estimate(estimate_id: str):
 async def update_estimate(estimate_id: str, estimate: Estimate):
     """Update an estimate. Totals are recalculated."""
     doc_ref = db.collection("estimates").document(estimate_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Estimate not found")
     
@@ -82,9 +84,10 @@ async def update_estimate(estimate_id: str, estimate: Estimate):
     estimate.subtotal = totals["subtotal"]
     estimate.taxAmount = totals["taxAmount"]
     estimate.total = totals["total"]
+    estimate.estimateNumber = doc.to_dict().get("estimateNumber")
     
     data = estimate.model_dump(exclude={"id"})
-    doc_ref.update(data)
+    await aio.update(doc_ref, data)
     estimate.id = estimate_id
     return estimate
 
@@ -93,7 +96,7 @@ async def update_estimate(estimate_id: str, estimate: Estimate):
 async def recalculate_estimate(estimate_id: str, tax_rate: float = 0):
     """Recalculate estimate totals from line items."""
     doc_ref = db.collection("estimates").document(estimate_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Estimate not found")
     
@@ -101,12 +104,12 @@ async def recalculate_estimate(estimate_id: str, tax_rate: float = 0):
     line_items = [EstimateLineItem(**item) for item in est_data.get("lineItems", [])]
     
     totals = calculate_estimate_totals(line_items, tax_rate)
-    doc_ref.update({
+    await aio.update(doc_ref, {
         "taxRate": tax_rate,
         **totals
     })
     
-    updated = doc_ref.get().to_dict()
+    updated = (await aio.get(doc_ref)).to_dict()
     updated["id"] = estimate_id
     return Estimate(**updated)
 
@@ -118,7 +121,7 @@ async def create_invoice_from_estimate(estimate_id: str, invoice_type: str = "De
     from datetime import datetime, timedelta
     
     doc_ref = db.collection("estimates").document(estimate_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Estimate not found")
     
@@ -157,8 +160,7 @@ async def create_invoice_from_estimate(estimate_id: str, invoice_type: str = "De
             "total": item_amount
         })
     
-    # Generate invoice number
-    invoice_number = f"INV-{datetime.now().year}-{str(datetime.now().timestamp()).split('.')[0][-6:]}"
+    invoice_number = await sequences.invoice_number(db)
     
     # Create invoice
     invoice_data = {
@@ -177,13 +179,14 @@ async def create_invoice_from_estimate(estimate_id: str, invoice_type: str = "De
         "total": invoice_amount + (invoice_amount * est_data.get("taxRate", 0)),
         "paidAmount": 0,
         "balanceDue": invoice_amount + (invoice_amount * est_data.get("taxRate", 0)),
-        "dueDate": (datetime.now() + timedelta(days=30)).isoformat(),
+        "dueDate": datetime.now() + timedelta(days=30),
         "notes": f"Invoice created from estimate {estimate_id}",
-        "createdAt": datetime.utcnow().isoformat(),
-        "updatedAt": datetime.utcnow().isoformat()
+        "createdAt": datetime.utcnow(),
+        "updatedAt": datetime.utcnow()
     }
     
-    _, invoice_ref = db.collection("invoices").add(invoice_data)
+    await denormalize.fill(db, "invoices", invoice_data)
+    _, invoice_ref = await rollups.add(db, db.collection("invoices"), invoice_data)
     invoice_data["id"] = invoice_ref.id
     
     return {"invoice": invoice_data, "message": f"Invoice {invoice_number} created successfully"}
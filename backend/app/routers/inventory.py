@@ -1,49 +1,124 @@
-from typing import List
-
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 
 from app.main import db
+from app.data import aio, counters, sequences, write_behind
+from app.data.pagination import PageParams, fetch_page
+from app.data.serialization import page_response
+from app.data.streaming import ndjson_response, wants_ndjson
 from app.models.schemas import (
     InventoryItem,
     InventoryBin,
     InventoryActivity,
     InventoryActivityType,
+    Page,
 )
 
 
 router = APIRouter(prefix="/inventory", tags=["inventory"])
 
 
-@router.get("/items", response_model=List[InventoryItem])
-async def list_items():
-    docs = db.collection("inventoryItems").stream()
-    items: List[InventoryItem] = []
-    for d in docs:
-        data = d.to_dict()
-        data["id"] = d.id
-        items.append(InventoryItem(**data))
-    return items
+@router.get("/items", response_model=Page[InventoryItem])
+async def list_items(page: PageParams = Depends(), ndjson: bool = Depends(wants_ndjson)):
+    query = db.collection("inventoryItems")
+    allowed = ("itemName", "sku", "totalQuantity")
+    if ndjson:
+        return ndjson_response(query, page, allowed, "itemName", InventoryItem)
+    docs, next_token = await fetch_page(query, page, allowed, "itemName")
+    return page_response(InventoryItem, docs, next_token)
 
 
-@router.get("/bins", response_model=List[InventoryBin])
-async def list_bins():
-    docs = db.collection("inventoryBins").stream()
-    bins: List[InventoryBin] = []
-    for d in docs:
-        data = d.to_dict()
-        data["id"] = d.id
-        bins.append(InventoryBin(**data))
-    return bins
+@router.get("/bins", response_model=Page[InventoryBin])
+async def list_bins(page: PageParams = Depends(), ndjson: bool = Depends(wants_ndjson)):
+    query = db.collection("inventoryBins")
+    if ndjson:
+        return ndjson_response(query, page, ("binCode", "itemId"), "binCode", InventoryBin)
+    docs, next_token = await fetch_page(query, page, ("binCode", "itemId"), "binCode")
+    return page_response(InventoryBin, docs, next_token)
 
 
 @router.post("/items", response_model=InventoryItem)
 async def create_item(item: InventoryItem):
     data = item.model_dump(exclude={"id"})
-    _, ref = db.collection("inventoryItems").add(data)
+    _, ref = await aio.add(db.collection("inventoryItems"), data)
     item.id = ref.id
     return item
 
 
+@router.get("/items/{item_id}/quantity")
+async def get_item_quantity(item_id: str):
+    """Live total quantity, including adjustments not yet compacted into the item."""
+    quantity = counters.item_quantity(item_id)
+    snap = await aio.get(quantity.base_ref)
+    if not snap.exists:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return {"itemId": item_id, "totalQuantity": await quantity.value()}
+
+
+@router.post("/items/{item_id}/adjust", response_model=InventoryActivity)
+async def adjust_item_quantity(item_id: str, quantityChange: int, reference: str = None):
+    """
+    Add ``quantityChange`` (negative to deduct) to an item's total quantity.
+
+    The change goes to a counter shard rather than the item document, so
+    concurrent adjustments of the same item do not contend. A deduction that
+    would overdraw the stock is put back and refused (see
+    ``ShardedCounter.take``).
+    """
+    if quantityChange == 0:
+        raise HTTPException(status_code=400, detail="Quantity change must be non-zero")
+    quantity = counters.item_quantity(item_id)
+    snap = await aio.get(quantity.base_ref)
+    if not snap.exists:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if quantityChange > 0:
+        await quantity.increment(quantityChange)
+    elif not await quantity.take(-quantityChange):
+        raise HTTPException(status_code=400, detail="Insufficient quantity")
+
+    activity = InventoryActivity(
+        itemId=item_id,
+        type=InventoryActivityType.ADJUSTMENT,
+        quantityChange=quantityChange,
+        reference=reference,
+    )
+    log_ref = await write_behind.append(
+        db.collection("inventoryActivity"), activity.model_dump(exclude={"id"})
+    )
+    activity.id = log_ref.id
+    return activity
+
+
+@router.post("/items/{item_id}/rma", response_model=InventoryActivity)
+async def create_rma(item_id: str, quantity: int, reason: str = None):
+    """
+    Return ``quantity`` units of an item to the vendor under a new RMA number.
+
+    The units leave stock; the activity's ``reference`` is the RMA number.
+    """
+    if quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    stock = counters.item_quantity(item_id)
+    snap = await aio.get(stock.base_ref)
+    if not snap.exists:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if not await stock.take(quantity):
+        raise HTTPException(status_code=400, detail="Insufficient quantity")
+
+    rma_number = await sequences.rma_number(db)
+    activity = InventoryActivity(
+        itemId=item_id,
+        type=InventoryActivityType.RMA,
+        quantityChange=-quantity,
+        reference=rma_number,
+        metadata={"reason": reason} if reason else {},
+    )
+    log_ref = await write_behind.append(
+        db.collection("inventoryActivity"), activity.model_dump(exclude={"id"})
+    )
+    activity.id = log_ref.id
+    return activity
+
+
 @router.post("/bins/transfer", response_model=InventoryActivity)
 async def transfer_between_bins(
     itemId: str,
@@ -58,8 +133,8 @@ async def transfer_between_bins(
     from_ref = bins_col.document(fromBinId)
     to_ref = bins_col.document(toBinId)
 
-    from_snap = from_ref.get()
-    to_snap = to_ref.get()
+    from_snap = await aio.get(from_ref)
+    to_snap = await aio.get(to_ref)
 
     if not from_snap.exists or not to_snap.exists:
         raise HTTPException(status_code=404, detail="One or both bins not found")
@@ -74,8 +149,8 @@ async def transfer_between_bins(
         raise HTTPException(status_code=400, detail="Insufficient quantity in source bin")
 
     # Apply transfer
-    from_ref.update({"quantity": from_data["quantity"] - quantity})
-    to_ref.update({"quantity": to_data.get("quantity", 0) + quantity})
+    await aio.update(from_ref, {"quantity": from_data["quantity"] - quantity})
+    await aio.update(to_ref, {"quantity": to_data.get("quantity", 0) + quantity})
 
     # Log activity
     activity = InventoryActivity(
@@ -87,7 +162,7 @@ async def transfer_between_bins(
         metadata={"quantity": quantity},
     )
     activity_data = activity.model_dump(exclude={"id"})
-    _, log_ref = db.collection("inventoryActivity").add(activity_data)
+    log_ref = await write_behind.append(db.collection("inventoryActivity"), activity_data)
     activity.id = log_ref.id
     return activity
 
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from app.models.schemas import Invoice, InvoiceStatus, InvoiceType
+from fastapi import APIRouter, HTTPException, Depends
+from typing import List, Literal, Optional
+from app.models.schemas import Invoice, InvoiceSummary, InvoiceStatus, InvoiceType, Page
 from app.main import db
+from app.data import aio, denormalize, rollups, sequences
+from app.data.pagination import PageParams, fetch_page
+from app.data.projection import project, projected_page, resolve_select, summary_page
+from app.data.serialization import page_response
+from app.data.streaming import ndjson_response, wants_ndjson
 from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime, timedelta
 
@@ -30,22 +35,35 @@ async def create_invoice(invoice: Invoice):
     invoice.taxAmount = totals["taxAmount"]
     invoice.total = totals["total"]
     invoice.balanceDue = invoice.total - invoice.paidAmount
+    if not invoice.invoiceNumber:
+        invoice.invoiceNumber = await sequences.invoice_number(db)
     
-    invoice_dict = invoice.model_dump(exclude={"id"})
-    _, invoice_ref = db.collection("invoices").add(invoice_dict)
+    invoice_dict = await denormalize.fill(db, "invoices", invoice.model_dump(exclude={"id"}))
+    invoice.customerName = invoice_dict["customerName"]
+    invoice.partnerName = invoice_dict.get("partnerName")
+    _, invoice_ref = await rollups.add(db, db.collection("invoices"), invoice_dict)
     invoice.id = invoice_ref.id
     return invoice
 
 
-@router.get("/", response_model=List[Invoice])
+@router.get("/", response_model=Page[Invoice])
 async def get_invoices(
     jobId: str = None,
     status: InvoiceStatus = None,
-    type: InvoiceType = None
+    type: InvoiceType = None,
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    page: PageParams = Depends(),
+    ndjson: bool = Depends(wants_ndjson),
 ):
-    """List invoices with optional filters."""
+    """
+    List invoices with optional filters. ``view=summary`` drops line items;
+    ``fields=`` returns only the named fields. ``Accept:
+    application/x-ndjson`` streams every matching invoice instead.
+    """
     invoices_ref = db.collection("invoices")
     query = invoices_ref
+    allowed = ("-createdAt", "createdAt", "dueDate", "-dueDate")
     
     if jobId:
         query = query.where(filter=FieldFilter("jobId", "==", jobId))
@@ -53,23 +71,33 @@ async def get_invoices(
         query = query.where(filter=FieldFilter("status", "==", status.value))
     if type:
         query = query.where(filter=FieldFilter("type", "==", type.value))
+    if jobId or status or type:
+        # Each equality filter has a (field, createdAt DESC) index, which
+        # Firestore merges for combined filters.
+        allowed = ("-createdAt",)
     
-    docs = query.stream()
-    
-    invoices = []
-    for doc in docs:
-        inv_data = doc.to_dict()
-        inv_data["id"] = doc.id
-        invoices.append(Invoice(**inv_data))
+    selected = resolve_select(fields, view, Invoice, InvoiceSummary)
+    if ndjson:
+        return ndjson_response(
+            query, page, allowed, "-createdAt",
+            InvoiceSummary if view == "summary" else Invoice,
+            select=selected, fields=selected if fields else None,
+        )
+    docs, next_token = await fetch_page(query, page, allowed, "-createdAt", select=selected)
+
+    if fields:
+        return projected_page([project(doc, selected) for doc in docs], next_token)
+    if view == "summary":
+        return summary_page(docs, InvoiceSummary, next_token)
     
-    return invoices
+    return page_response(Invoice, docs, next_token)
 
 
 @router.get("/{invoice_id}", response_model=Invoice)
 async def get_invoice(invoice_id: str):
     """Get a single invoice by ID."""
     doc_ref = db.collection("invoices").document(invoice_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
@@ -82,7 +110,7 @@ async def get_invoice(invoice_id: str):
 async def update_invoice(invoice_id: str, invoice: Invoice):
     """Update an invoice. Totals are recalculated."""
     doc_ref = db.collection("invoices").document(invoice_id)
-    doc = doc_ref.get()
+    doc = await rollups.read(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
@@ -93,9 +121,11 @@ async def update_invoice(invoice_id: str, invoice: Invoice):
     invoice.taxAmount = totals["taxAmount"]
     invoice.total = totals["total"]
     invoice.balanceDue = invoice.total - invoice.paidAmount
+    if not invoice.invoiceNumber:
+        invoice.invoiceNumber = doc.to_dict().get("invoiceNumber", "")
     
     data = invoice.model_dump(exclude={"id"})
-    doc_ref.update(data)
+    await rollups.update(db, doc_ref, data, doc)
     invoice.id = invoice_id
     return invoice
 
@@ -104,11 +134,11 @@ async def update_invoice(invoice_id: str, invoice: Invoice):
 async def trigger_pdf_generation(invoice_id: str):
     """Trigger PDF generation for an invoice (Cloud Function will handle actual generation)."""
     doc_ref = db.collection("invoices").document(invoice_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
     # Set a flag that Cloud Function will pick up
-    doc_ref.update({"pdfGenerationRequested": True, "pdfGenerationRequestedAt": datetime.utcnow()})
+    await aio.update(doc_ref, {"pdfGenerationRequested": True, "pdfGenerationRequestedAt": datetime.utcnow()})
     return {"message": "PDF generation requested", "invoiceId": invoice_id}
 
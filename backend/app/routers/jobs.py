@@ -1,65 +1,137 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import Literal, Optional, Set
 from app.models.schemas import (
     Job,
+    JobSummary,
+    Page,
     JobStatus,
     JobWorkflowState,
     JobPhoto,
     validate_job_state_transition,
 )
 from app.main import db
+from app.data import aio, archive, counters, denormalize, rollups
+from app.data.conditional import document_etag, if_none_match, matches, not_modified
+from app.data.pagination import PageParams, fetch_page
+from app.data.projection import project, projected_page, resolve_select, summary_page
+from app.data.serialization import page_response
+from app.data.streaming import ndjson_response, wants_ndjson
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
+JOB_ORDERS = ("-createdAt", "createdAt", "scheduledDate", "-scheduledDate")
+
 @router.post("/", response_model=Job)
 async def create_job(job: Job):
-    job_dict = job.model_dump(exclude={"id"})
+    job_dict = await denormalize.fill(db, "jobs", job.model_dump(exclude={"id", "archivedAt", "archiveState"}))
     # Firestore handles datetime serialization automatically if using the admin SDK correctly,
     # but sometimes it's safer to convert to native datetime or server timestamp.
     # Pydantic's datetime is fine.
     
-    update_time, job_ref = db.collection("jobs").add(job_dict)
+    update_time, job_ref = await rollups.add(db, db.collection("jobs"), job_dict)
+    await counters.job_state_changed(None, job.workflowState.value)
     job.id = job_ref.id
     return job
 
-@router.get("/", response_model=List[Job])
-async def get_jobs(status: JobStatus = None):
-    jobs_ref = db.collection("jobs")
+@router.get("/", response_model=Page[Job])
+async def get_jobs(
+    status: JobStatus = None,
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    page: PageParams = Depends(),
+    ndjson: bool = Depends(wants_ndjson),
+):
+    """
+    List jobs. ``view=summary`` returns JobSummary items and ``fields=``
+    returns only the named fields; both are projected in Firestore.
+    Archived jobs are listed from their stubs: items with ``archivedAt`` set
+    carry only the summary fields, and ``GET /jobs/{id}`` restores the rest.
+    ``Accept: application/x-ndjson`` streams every matching job instead.
+    """
+    query = db.collection("jobs")
+    allowed = JOB_ORDERS
     if status:
-        query = jobs_ref.where(filter=FieldFilter("status", "==", status.value))
-        docs = query.stream()
-    else:
-        docs = jobs_ref.stream()
-        
-    jobs: List[Job] = []
-    for doc in docs:
-        job_data = doc.to_dict()
-        job_data["id"] = doc.id
-        jobs.append(Job(**job_data))
-    return jobs
+        query = query.where(filter=FieldFilter("status", "==", status.value))
+        # Only (status, createdAt DESC) is indexed
+        allowed = ("-createdAt",)
+
+    selected = resolve_select(fields, view, Job, JobSummary)
+    if ndjson:
+        return ndjson_response(
+            query, page, allowed, "-createdAt",
+            JobSummary if view == "summary" else Job,
+            select=selected, fields=selected if fields else None,
+        )
+    docs, next_token = await fetch_page(query, page, allowed, "-createdAt", select=selected)
+
+    if fields:
+        return projected_page([project(doc, selected) for doc in docs], next_token)
+    if view == "summary":
+        return summary_page(docs, JobSummary, next_token)
+
+    return page_response(Job, docs, next_token)
 
 @router.get("/{job_id}", response_model=Job)
-async def get_job(job_id: str):
+async def get_job(
+    job_id: str,
+    response: Response,
+    etags: Optional[Set[str]] = Depends(if_none_match),
+):
+    """
+    Get a job. Sends an ETag and answers a matching ``If-None-Match`` with
+    304; when the document comes from a cache that costs no Firestore read.
+    An archived job is restored first.
+    """
     doc_ref = db.collection("jobs").document(job_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Job not found")
-    
+    doc = await archive.restore_if_archived(db, doc)
+
+    etag = document_etag(doc)
+    if matches(etag, etags):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     job_data = doc.to_dict()
     job_data["id"] = doc.id
     return Job(**job_data)
 
 
+@router.get("/{job_id}/rollup")
+async def get_job_rollup(job_id: str):
+    """
+    The job's state, invoice totals, schedule entries by type and tech form
+    counts and completion flags, from its rollup document.
+    """
+    rollup = await rollups.get(db, rollups.JOB_ROLLUPS, job_id)
+    if "workflowState" not in rollup:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "jobId": job_id,
+        "workflowState": rollup["workflowState"],
+        "customerId": rollup.get("customerId"),
+        "partnerId": rollup.get("partnerId"),
+        "invoices": rollups.amounts(rollup),
+        "schedule": rollup.get("schedule") or {"count": 0, "byType": {}},
+        "forms": rollup.get("forms") or {},
+        "formsComplete": {
+            name: bool((rollup.get("formsComplete") or {}).get(name))
+            for name in rollups.FORMS.values()
+        },
+    }
+
+
 @router.put("/{job_id}", response_model=Job)
 async def update_job(job_id: str, job: Job):
     """
     Full update of a job record with workflow state validation.
     """
     doc_ref = db.collection("jobs").document(job_id)
-    snap = doc_ref.get()
+    snap = await rollups.read(doc_ref)
     if not snap.exists:
         raise HTTPException(status_code=404, detail="Job not found")
+    snap = await archive.restore_if_archived(db, snap)
 
     existing = snap.to_dict()
     existing_state = JobWorkflowState(existing.get("workflowState", JobWorkflowState.INTAKE_QUOTING))
@@ -70,8 +142,9 @@ async def update_job(job_id: str, job: Job):
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
-    data = job.model_dump(exclude={"id"})
-    doc_ref.update(data)
+    data = job.model_dump(exclude={"id", "archivedAt", "archiveState"})
+    await rollups.update(db, doc_ref, data, snap)
+    await counters.job_state_changed(existing_state.value, new_state.value)
     job.id = job_id
     return job
 
@@ -82,9 +155,10 @@ async def transition_job(job_id: str, new_state: JobWorkflowState):
     Convenience endpoint to transition a job workflow state only.
     """
     doc_ref = db.collection("jobs").document(job_id)
-    snap = doc_ref.get()
+    snap = await rollups.read(doc_ref)
     if not snap.exists:
         raise HTTPException(status_code=404, detail="Job not found")
+    snap = await archive.restore_if_archived(db, snap)
 
     data = snap.to_dict()
     current_state = JobWorkflowState(data.get("workflowState", JobWorkflowState.INTAKE_QUOTING))
@@ -121,10 +195,11 @@ async def transition_job(job_id: str, new_state: JobWorkflowState):
     elif new_state == JobWorkflowState.CLOSED and not data.get("closedAt"):
         update_payload["closedAt"] = now
 
-    doc_ref.update(update_payload)
+    await rollups.update(db, doc_ref, update_payload, snap)
+    await counters.job_state_changed(current_state.value, new_state.value)
 
-    # Return updated job
-    updated = doc_ref.get().to_dict()
+    # Served from the request's identity map: the merged write, no second read
+    updated = (await aio.get(doc_ref)).to_dict()
     updated["id"] = job_id
     return Job(**updated)
 
@@ -135,16 +210,17 @@ async def add_job_photo(job_id: str, photo: JobPhoto):
     Append a system photo (already uploaded to storage) to the job record.
     """
     doc_ref = db.collection("jobs").document(job_id)
-    snap = doc_ref.get()
+    snap = await aio.get(doc_ref)
     if not snap.exists:
         raise HTTPException(status_code=404, detail="Job not found")
+    snap = await archive.restore_if_archived(db, snap)
 
     data = snap.to_dict() or {}
     photos = data.get("photos", [])
     photos.append(photo.model_dump())
 
-    doc_ref.update({"photos": photos})
+    await aio.update(doc_ref, {"photos": photos})
 
-    updated = doc_ref.get().to_dict()
+    updated = (await aio.get(doc_ref)).to_dict()
     updated["id"] = job_id
     return Job(**updated)
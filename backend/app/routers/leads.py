@@ -1,14 +1,23 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Literal, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 from app.main import db
-from app.models.schemas import Lead, LeadStatus
+from app.data import aio
+from app.data.pagination import PageParams, fetch_page
+from app.data.projection import project, projected_page, resolve_select
+from app.data.streaming import ndjson_response, wants_ndjson
+from app.data.writes import delete_existing, expected_update_time, update_existing
+from app.models.schemas import Lead, LeadSummary, LeadStatus, Page
 
 
 router = APIRouter(prefix="/leads", tags=["leads"])
 
+LEAD_ORDERS = ("-createdAt", "createdAt", "-score")
+SEARCH_FIELDS = ("customerName", "address", "email")
+
 
 def get_user_role(x_user_role: Optional[str] = Header(default="user")) -> str:
     return x_user_role.lower()
@@ -19,52 +28,76 @@ def require_sales(role: str = Depends(get_user_role)) -> None:
         raise HTTPException(status_code=403, detail="Insufficient permissions")
 
 
+def _matches_search(data: dict, term: str) -> bool:
+    """In-memory search on customerName, address, email."""
+    return any(str(data.get(field, "")).lower().find(term) != -1 for field in SEARCH_FIELDS)
+
+
 @router.post("/", response_model=Lead, dependencies=[Depends(require_sales)])
 async def create_lead(lead: Lead):
     data = lead.model_dump(exclude={"id"})
-    _, ref = db.collection("leads").add(data)
+    _, ref = await aio.add(db.collection("leads"), data)
     lead.id = ref.id
     return lead
 
 
-@router.get("/", response_model=List[Lead])
+@router.get("/", response_model=Page[Lead])
 async def list_leads(
     status: Optional[LeadStatus] = None,
     partnerId: Optional[str] = Query(default=None, alias="partnerId"),
     search: Optional[str] = None,
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    page: PageParams = Depends(),
+    ndjson: bool = Depends(wants_ndjson),
 ):
     col = db.collection("leads")
+    allowed = LEAD_ORDERS
 
     if status:
         col = col.where(filter=FieldFilter("status", "==", status.value))
+        allowed = ("-createdAt", "-score")
 
     if partnerId:
         col = col.where(filter=FieldFilter("partnerId", "==", partnerId))
-
-    docs = col.stream()
-    leads: List[Lead] = []
+        allowed = ("-createdAt",)
+
+    # search is applied to each fetched page, so a page may hold fewer
+    # than `limit` leads while nextPageToken is still set.
+    selected = resolve_select(fields, view, Lead, LeadSummary)
+    select = selected
+    if selected is not None and search:
+        select = [*selected, *SEARCH_FIELDS]
+    model = LeadSummary if view == "summary" else Lead
+    predicate = (lambda data: _matches_search(data, search.lower())) if search else None
+    if ndjson:
+        return ndjson_response(
+            col, page, allowed, "-createdAt", model,
+            select=select, fields=selected if fields else None, predicate=predicate,
+        )
+
+    docs, next_token = await fetch_page(col, page, allowed, "-createdAt", select=select)
+    leads = []
     for doc in docs:
         data = doc.to_dict()
         data["id"] = doc.id
 
-        # In-memory search on customerName, address, email
-        if search:
-            term = search.lower()
-            if not (
-                str(data.get("customerName", "")).lower().find(term) != -1
-                or str(data.get("address", "")).lower().find(term) != -1
-                or str(data.get("email", "")).lower().find(term) != -1
-            ):
-                continue
+        if predicate is not None and not predicate(data):
+            continue
 
-        leads.append(Lead(**data))
+        if fields:
+            leads.append(project(doc, selected))
+        else:
+            leads.append(model(**data))
 
-    return leads
+    if selected is not None:
+        return projected_page(leads, next_token)
+    return Page(items=leads, nextPageToken=next_token)
 
 
 @router.get("/{lead_id}", response_model=Lead)
 async def get_lead(lead_id: str):
-    doc = db.collection("leads").document(lead_id).get()
+    doc = await aio.get(db.collection("leads").document(lead_id))
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Lead not found")
     data = doc.to_dict()
@@ -73,23 +106,26 @@ async def get_lead(lead_id: str):
 
 
 @router.put("/{lead_id}", response_model=Lead, dependencies=[Depends(require_sales)])
-async def update_lead(lead_id: str, lead: Lead):
+async def update_lead(
+    lead_id: str,
+    lead: Lead,
+    response: Response,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     doc_ref = db.collection("leads").document(lead_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Lead not found")
-
     data = lead.model_dump(exclude={"id"})
-    doc_ref.update(data)
+    await update_existing(doc_ref, data, "Lead not found", if_match, response)
     lead.id = lead_id
     return lead
 
 
 @router.delete("/{lead_id}", dependencies=[Depends(require_sales)])
-async def delete_lead(lead_id: str):
+async def delete_lead(
+    lead_id: str,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     doc_ref = db.collection("leads").document(lead_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Lead not found")
-    doc_ref.delete()
+    await delete_existing(doc_ref, "Lead not found", if_match)
     return {"deleted": True}
 
 
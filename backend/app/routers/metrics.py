@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends
+
+from app.data import (
+    aio, archive, counters, denormalize, limiter, replica, rollups, sequences, single_flight, storage,
+    write_behind,
+)
+from app.data.cache import documents as document_cache
+from app.main import db
+from app.routers.auth import get_current_active_user, User
+
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/db")
+async def get_db_metrics(current_user: User = Depends(get_current_active_user)):
+    """Firestore executor pool usage and per-operation latency."""
+    return aio.stats()
+
+
+@router.get("/replicas")
+async def get_replica_metrics(current_user: User = Depends(get_current_active_user)):
+    """Size, staleness and hit rate of the reference-collection replicas."""
+    return replica.stats()
+
+
+@router.get("/cache")
+async def get_cache_metrics(current_user: User = Depends(get_current_active_user)):
+    """Hit, miss and eviction counters for each document cache namespace."""
+    return document_cache.snapshot_stats()
+
+
+@router.get("/write-behind")
+async def get_write_behind_metrics(current_user: User = Depends(get_current_active_user)):
+    """Queue depth and commit counters of the write-behind buffer."""
+    return write_behind.buffer.stats()
+
+
+@router.get("/counters")
+async def get_counter_metrics(current_user: User = Depends(get_current_active_user)):
+    """Increment, read and compaction counters of the sharded counters."""
+    return counters.stats()
+
+
+@router.get("/sequences")
+async def get_sequence_metrics(current_user: User = Depends(get_current_active_user)):
+    """Block leases and numbers left in this worker's sequence blocks."""
+    return sequences.stats()
+
+
+@router.get("/concurrency")
+async def get_concurrency_metrics(current_user: User = Depends(get_current_active_user)):
+    """Adaptive concurrency limit, in-flight requests and per-priority queue and shed counts."""
+    return limiter.stats()
+
+
+@router.get("/coalescing")
+async def get_coalescing_metrics(current_user: User = Depends(get_current_active_user)):
+    """Requests that led a backend call versus those that shared one in flight."""
+    return single_flight.stats()
+
+
+@router.get("/storage")
+async def get_storage_metrics(current_user: User = Depends(get_current_active_user)):
+    """Storage engine in use and, for SQLite, query, index and write counters."""
+    return storage.stats(db)
+
+
+@router.get("/denormalization")
+async def get_denormalization_metrics(current_user: User = Depends(get_current_active_user)):
+    """Registered denormalized fields and the propagator's job, batch and update counters."""
+    return denormalize.stats()
+
+
+@router.get("/rollups")
+async def get_rollup_metrics(current_user: User = Depends(get_current_active_user)):
+    """Source commits that updated rollups, rollup reads and rebuilds."""
+    return rollups.stats()
+
+
+@router.get("/archive")
+async def get_archive_metrics(current_user: User = Depends(get_current_active_user)):
+    """Archive store and the jobs and records archived and restored."""
+    return archive.stats()
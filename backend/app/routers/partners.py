@@ -1,10 +1,14 @@
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 from app.main import db
-from app.models.schemas import RoofingPartner
+from app.data import aio, denormalize, rollups
+from app.data.pagination import PageParams, fetch_page
+from app.data.writes import delete_existing, expected_update_time, update_existing
+from app.models.schemas import RoofingPartner, Page
 
 
 router = APIRouter(prefix="/partners", tags=["partners"])
@@ -26,15 +30,16 @@ def require_admin(role: str = Depends(get_user_role)) -> None:
 @router.post("/", response_model=RoofingPartner, dependencies=[Depends(require_admin)])
 async def create_partner(partner: RoofingPartner):
     data = partner.model_dump(exclude={"id"})
-    _, ref = db.collection("roofingPartners").add(data)
+    _, ref = await aio.add(db.collection("roofingPartners"), data)
     partner.id = ref.id
     return partner
 
 
-@router.get("/", response_model=List[RoofingPartner])
+@router.get("/", response_model=Page[RoofingPartner])
 async def list_partners(
     status: Optional[str] = None,
     search: Optional[str] = None,
+    page: PageParams = Depends(),
 ):
     col = db.collection("roofingPartners")
 
@@ -42,7 +47,7 @@ async def list_partners(
     if status:
         col = col.where(filter=FieldFilter("status", "==", status))
 
-    docs = col.stream()
+    docs, next_token = await fetch_page(col, page, ("companyName",), "companyName")
     partners: List[RoofingPartner] = []
     for doc in docs:
         data = doc.to_dict()
@@ -59,12 +64,12 @@ async def list_partners(
 
         partners.append(RoofingPartner(**data))
 
-    return partners
+    return Page(items=partners, nextPageToken=next_token)
 
 
 @router.get("/{partner_id}", response_model=RoofingPartner)
 async def get_partner(partner_id: str):
-    doc = db.collection("roofingPartners").document(partner_id).get()
+    doc = await aio.get(db.collection("roofingPartners").document(partner_id))
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Partner not found")
     data = doc.to_dict()
@@ -73,23 +78,33 @@ async def get_partner(partner_id: str):
 
 
 @router.put("/{partner_id}", response_model=RoofingPartner, dependencies=[Depends(require_admin)])
-async def update_partner(partner_id: str, partner: RoofingPartner):
+async def update_partner(
+    partner_id: str,
+    partner: RoofingPartner,
+    response: Response,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     doc_ref = db.collection("roofingPartners").document(partner_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Partner not found")
-
+    before = await rollups.read(doc_ref)
     data = partner.model_dump(exclude={"id"})
-    doc_ref.update(data)
+    await update_existing(doc_ref, data, "Partner not found", if_match, response)
+    await denormalize.source_changed(
+        db,
+        doc_ref,
+        denormalize.source_fields("roofingPartners", before.to_dict()),
+        denormalize.source_fields("roofingPartners", data),
+    )
     partner.id = partner_id
     return partner
 
 
 @router.delete("/{partner_id}", dependencies=[Depends(require_admin)])
-async def delete_partner(partner_id: str):
+async def delete_partner(
+    partner_id: str,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     doc_ref = db.collection("roofingPartners").document(partner_id)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Partner not found")
-    doc_ref.delete()
+    await delete_existing(doc_ref, "Partner not found", if_match)
     return {"deleted": True}
 
 
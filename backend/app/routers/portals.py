@@ -1,17 +1,28 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from typing import Literal, Optional, Set
 from datetime import datetime
 from app.models.schemas import (
     Job,
+    JobSummary,
     Invoice,
+    InvoiceSummary,
     PortalDocument,
     PaymentIntent,
     Notification,
     UserRole,
     JobWorkflowState,
+    Page,
 )
 from app.routers.auth import get_current_active_user, require_role, User
 from app.main import db
+from app.data import aio, archive, counters, loader, rollups
+from app.data.conditional import conditional, if_none_match, result_etag
+from app.data.pagination import PageParams, fetch_page
+from app.data.projection import project, projected_page, resolve_select, summary_page
+from app.data.serialization import page_response
+from app.data.writes import update_existing
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/portals", tags=["portals"])
@@ -19,23 +30,30 @@ router = APIRouter(prefix="/portals", tags=["portals"])
 
 # ---------- Homeowner Portal Endpoints ----------
 
-@router.get("/homeowner/jobs", response_model=List[Job])
-async def get_homeowner_jobs(current_user: User = Depends(require_role([UserRole.HOMEOWNER]))):
-    """Get all jobs for the authenticated homeowner."""
+@router.get("/homeowner/jobs", response_model=Page[Job])
+async def get_homeowner_jobs(
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    page: PageParams = Depends(),
+    etags: Optional[Set[str]] = Depends(if_none_match),
+    current_user: User = Depends(require_role([UserRole.HOMEOWNER]))
+):
+    """Get all jobs for the authenticated homeowner. Supports ``If-None-Match``."""
     if not current_user.customerId:
         raise HTTPException(status_code=400, detail="Customer ID not found for user")
     
     jobs_ref = db.collection("jobs")
     query = jobs_ref.where(filter=FieldFilter("customerId", "==", current_user.customerId))
-    docs = query.stream()
-    
-    jobs = []
-    for doc in docs:
-        job_data = doc.to_dict()
-        job_data["id"] = doc.id
-        jobs.append(Job(**job_data))
-    
-    return jobs
+    selected = resolve_select(fields, view, Job, JobSummary)
+    docs, next_token = await fetch_page(query, page, ("-createdAt",), "-createdAt", select=selected)
+
+    if fields:
+        response = projected_page([project(doc, selected) for doc in docs], next_token)
+    elif view == "summary":
+        response = summary_page(docs, JobSummary, next_token)
+    else:
+        response = page_response(Job, docs, next_token)
+    return conditional(response, result_etag(docs, next_token), etags)
 
 
 @router.get("/homeowner/jobs/{job_id}", response_model=Job)
@@ -43,27 +61,29 @@ async def get_homeowner_job(
     job_id: str,
     current_user: User = Depends(require_role([UserRole.HOMEOWNER]))
 ):
-    """Get a specific job for the authenticated homeowner."""
+    """Get a specific job for the authenticated homeowner, restoring it if it is archived."""
     if not current_user.customerId:
         raise HTTPException(status_code=400, detail="Customer ID not found for user")
     
-    job_ref = db.collection("jobs").document(job_id)
-    job_doc = job_ref.get()
+    job_doc = await loader.documents(db, "jobs").load(job_id)
     
-    if not job_doc.exists:
+    if job_doc is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job_data = job_doc.to_dict()
-    if job_data.get("customerId") != current_user.customerId:
+    # The stub keeps customerId, so a foreign job is refused before it is restored
+    if job_doc.to_dict().get("customerId") != current_user.customerId:
         raise HTTPException(status_code=403, detail="Access denied")
-    
+
+    job_doc = await archive.restore_if_archived(db, job_doc)
+    job_data = job_doc.to_dict()
     job_data["id"] = job_doc.id
     return Job(**job_data)
 
 
-@router.get("/homeowner/documents", response_model=List[PortalDocument])
+@router.get("/homeowner/documents", response_model=Page[PortalDocument])
 async def get_homeowner_documents(
     job_id: str = None,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_role([UserRole.HOMEOWNER]))
 ):
     """Get documents for the authenticated homeowner."""
@@ -76,19 +96,16 @@ async def get_homeowner_documents(
     if job_id:
         query = query.where(filter=FieldFilter("jobId", "==", job_id))
     
-    docs = query.stream()
-    
-    documents = []
-    for doc in docs:
-        doc_data = doc.to_dict()
-        doc_data["id"] = doc.id
-        documents.append(PortalDocument(**doc_data))
+    docs, next_token = await fetch_page(query, page, ("-uploadedAt",), "-uploadedAt")
     
-    return documents
+    return page_response(PortalDocument, docs, next_token)
 
 
-@router.get("/homeowner/invoices", response_model=List[Invoice])
+@router.get("/homeowner/invoices", response_model=Page[Invoice])
 async def get_homeowner_invoices(
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_role([UserRole.HOMEOWNER]))
 ):
     """Get invoices for the authenticated homeowner."""
@@ -97,15 +114,33 @@ async def get_homeowner_invoices(
     
     invoices_ref = db.collection("invoices")
     query = invoices_ref.where(filter=FieldFilter("customerId", "==", current_user.customerId))
-    docs = query.stream()
-    
-    invoices = []
-    for doc in docs:
-        inv_data = doc.to_dict()
-        inv_data["id"] = doc.id
-        invoices.append(Invoice(**inv_data))
+    selected = resolve_select(fields, view, Invoice, InvoiceSummary)
+    docs, next_token = await fetch_page(query, page, ("-createdAt",), "-createdAt", select=selected)
+
+    if fields:
+        return projected_page([project(doc, selected) for doc in docs], next_token)
+    if view == "summary":
+        return summary_page(docs, InvoiceSummary, next_token)
     
-    return invoices
+    return page_response(Invoice, docs, next_token)
+
+
+@router.get("/homeowner/summary")
+async def get_homeowner_summary(
+    current_user: User = Depends(require_role([UserRole.HOMEOWNER]))
+):
+    """Invoice totals, paid and balance amounts and jobs by state, from the customer's rollup."""
+    if not current_user.customerId:
+        raise HTTPException(status_code=400, detail="Customer ID not found for user")
+
+    rollup = await rollups.get(db, rollups.CUSTOMER_ROLLUPS, current_user.customerId)
+    jobs = rollup.get("jobs") or {}
+    return {
+        "customerId": current_user.customerId,
+        "invoices": rollups.amounts(rollup),
+        "totalJobs": int(jobs.get("count", 0)),
+        "jobsByState": jobs.get("byState") or {},
+    }
 
 
 @router.post("/homeowner/payments/create-intent", response_model=PaymentIntent)
@@ -119,7 +154,7 @@ async def create_payment_intent(
     
     # Get invoice
     invoice_ref = db.collection("invoices").document(invoice_id)
-    invoice_doc = invoice_ref.get()
+    invoice_doc = await aio.get(invoice_ref)
     
     if not invoice_doc.exists:
         raise HTTPException(status_code=404, detail="Invoice not found")
@@ -137,7 +172,7 @@ async def create_payment_intent(
     )
     
     payment_dict = payment_intent.model_dump(exclude={"id"})
-    _, payment_ref = db.collection("payment_intents").add(payment_dict)
+    _, payment_ref = await aio.add(db.collection("payment_intents"), payment_dict)
     payment_intent.id = payment_ref.id
     
     return payment_intent
@@ -153,10 +188,20 @@ async def get_roofer_dashboard(
     if not current_user.partnerId:
         raise HTTPException(status_code=400, detail="Partner ID not found for user")
     
-    # Get jobs for this partner
+    # Stats come from the partner's rollup document; only the recent jobs
+    # are read.
     jobs_ref = db.collection("jobs")
-    query = jobs_ref.where(filter=FieldFilter("partnerId", "==", current_user.partnerId))
-    job_docs = query.stream()
+    query = (
+        jobs_ref.where(filter=FieldFilter("partnerId", "==", current_user.partnerId))
+        .order_by("createdAt", direction="DESCENDING")
+        .limit(10)
+    )
+    rollup, job_docs = await asyncio.gather(
+        rollups.get(db, rollups.PARTNER_ROLLUPS, current_user.partnerId),
+        aio.stream(query),
+    )
+    by_state = {state.value: 0 for state in JobWorkflowState}
+    by_state.update((rollup.get("jobs") or {}).get("byState") or {})
     
     jobs = []
     for doc in job_docs:
@@ -164,23 +209,22 @@ async def get_roofer_dashboard(
         job_data["id"] = doc.id
         jobs.append(Job(**job_data))
     
-    # Calculate stats
-    total_jobs = len(jobs)
-    active_jobs = [j for j in jobs if j.workflowState != JobWorkflowState.CLOSED]
-    roofing_complete_jobs = [j for j in jobs if j.workflowState == JobWorkflowState.ROOFING_COMPLETE]
-    ready_for_reset = [j for j in jobs if j.workflowState == JobWorkflowState.READY_FOR_RESET]
-    
     return {
-        "totalJobs": total_jobs,
-        "activeJobs": len(active_jobs),
-        "roofingCompleteJobs": len(roofing_complete_jobs),
-        "readyForReset": len(ready_for_reset),
-        "recentJobs": jobs[:10]
+        "totalJobs": sum(by_state.values()),
+        "activeJobs": sum(by_state.values()) - by_state[JobWorkflowState.CLOSED.value],
+        "roofingCompleteJobs": by_state[JobWorkflowState.ROOFING_COMPLETE.value],
+        "readyForReset": by_state[JobWorkflowState.READY_FOR_RESET.value],
+        "jobsByState": by_state,
+        "invoices": rollups.amounts(rollup),
+        "recentJobs": jobs
     }
 
 
-@router.get("/roofer/jobs", response_model=List[Job])
+@router.get("/roofer/jobs", response_model=Page[Job])
 async def get_roofer_jobs(
+    view: Literal["full", "summary"] = "full",
+    fields: Optional[str] = None,
+    page: PageParams = Depends(),
     current_user: User = Depends(require_role([UserRole.PARTNER]))
 ):
     """Get all jobs for the authenticated roofer."""
@@ -189,15 +233,15 @@ async def get_roofer_jobs(
     
     jobs_ref = db.collection("jobs")
     query = jobs_ref.where(filter=FieldFilter("partnerId", "==", current_user.partnerId))
-    docs = query.stream()
-    
-    jobs = []
-    for doc in docs:
-        job_data = doc.to_dict()
-        job_data["id"] = doc.id
-        jobs.append(Job(**job_data))
+    selected = resolve_select(fields, view, Job, JobSummary)
+    docs, next_token = await fetch_page(query, page, ("-createdAt",), "-createdAt", select=selected)
+
+    if fields:
+        return projected_page([project(doc, selected) for doc in docs], next_token)
+    if view == "summary":
+        return summary_page(docs, JobSummary, next_token)
     
-    return jobs
+    return page_response(Job, docs, next_token)
 
 
 @router.post("/roofer/jobs/{job_id}/roof-complete")
@@ -210,7 +254,7 @@ async def mark_roof_complete(
         raise HTTPException(status_code=400, detail="Partner ID not found for user")
     
     job_ref = db.collection("jobs").document(job_id)
-    job_doc = job_ref.get()
+    job_doc = await rollups.read(job_ref)
     
     if not job_doc.exists:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -235,7 +279,8 @@ async def mark_roof_complete(
         "roofingCompletedAt": datetime.utcnow()
     }
     
-    job_ref.update(update_payload)
+    await rollups.update(db, job_ref, update_payload, job_doc)
+    await counters.job_state_changed(current_state.value, JobWorkflowState.ROOFING_COMPLETE.value)
     
     # Create notification
     notification = Notification(
@@ -247,33 +292,36 @@ async def mark_roof_complete(
         relatedEntityType="job",
         relatedEntityId=job_id
     )
-    notification_dict = notification.model_dump(exclude={"id"})
-    db.collection("notifications").add(notification_dict)
+    # Written with its unread count rather than buffered, so the two cannot drift
+    await counters.add_notification(notification.model_dump(exclude={"id"}))
     
     return {"message": "Roof marked as complete", "jobId": job_id}
 
 
 # ---------- Notifications ----------
 
-@router.get("/notifications", response_model=List[Notification])
+@router.get("/notifications", response_model=Page[Notification])
 async def get_notifications(
+    page: PageParams = Depends(),
+    etags: Optional[Set[str]] = Depends(if_none_match),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get notifications for the current user."""
+    """Get notifications for the current user, newest first. Supports ``If-None-Match``."""
     notifications_ref = db.collection("notifications")
     query = notifications_ref.where(filter=FieldFilter("userId", "==", current_user.id))
-    docs = query.stream()
+    docs, next_token = await fetch_page(query, page, ("-createdAt",), "-createdAt")
     
-    notifications = []
-    for doc in docs:
-        notif_data = doc.to_dict()
-        notif_data["id"] = doc.id
-        notifications.append(Notification(**notif_data))
-    
-    # Sort by created date descending
-    notifications.sort(key=lambda x: x.createdAt, reverse=True)
-    
-    return notifications
+    return conditional(
+        page_response(Notification, docs, next_token), result_etag(docs, next_token), etags
+    )
+
+
+@router.get("/notifications/unread-count")
+async def get_unread_notification_count(
+    current_user: User = Depends(get_current_active_user)
+):
+    """Number of unread notifications for the current user, from a sharded counter."""
+    return {"unread": await counters.unread_notification_count(current_user.id)}
 
 
 @router.put("/notifications/{notification_id}/read")
@@ -283,7 +331,7 @@ async def mark_notification_read(
 ):
     """Mark a notification as read."""
     notif_ref = db.collection("notifications").document(notification_id)
-    notif_doc = notif_ref.get()
+    notif_doc = await aio.get(notif_ref)
     
     if not notif_doc.exists:
         raise HTTPException(status_code=404, detail="Notification not found")
@@ -292,6 +340,12 @@ async def mark_notification_read(
     if notif_data.get("userId") != current_user.id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    notif_ref.update({"isRead": True})
+    # The ownership check needs the read; the precondition keeps the write
+    # from landing on a notification that changed after it.
+    await update_existing(
+        notif_ref, {"isRead": True}, "Notification not found", notif_doc.update_time
+    )
+    if not notif_data.get("isRead"):
+        await counters.unread_notifications_counter(current_user.id).increment(-1)
     return {"message": "Notification marked as read"}
 
@@ -1,13 +1,27 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List, Optional
+from typing import List, Optional, Set
 from datetime import datetime, timedelta
 from app.routers.auth import get_current_active_user, User
 from app.main import db
+from app.data import aio, counters, rollups, scan
+from app.data.conditional import conditional_json, if_none_match
+from app.data.replica import fresh_replica
+from app.models.schemas import JobWorkflowState
+from google.api_core import exceptions as gexc
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/reporting", tags=["reporting"])
 
 
+async def _crew_docs() -> List:
+    replica = fresh_replica("crews")
+    if replica:
+        return replica.where()
+    return await aio.stream(db.collection("crews"))
+
+
 @router.get("/revenue")
 async def get_revenue_report(
     start_date: str = Query(...),
@@ -19,16 +33,11 @@ async def get_revenue_report(
         start = datetime.fromisoformat(start_date)
         end = datetime.fromisoformat(end_date)
         
-        # Get invoices in date range
-        invoices_ref = db.collection("invoices")
-        query = invoices_ref.where(
-            filter=FieldFilter("createdAt", ">=", start)
-        ).where(
-            filter=FieldFilter("createdAt", "<=", end)
-        )
+        # Get invoices in date range, reading sub-ranges in parallel
+        partitions = scan.range_partitions(db.collection("invoices"), "createdAt", start, end)
         
         invoices = []
-        for doc in query.stream():
+        for doc in await scan.collect(partitions):
             data = doc.to_dict()
             invoices.append(data)
         
@@ -57,6 +66,8 @@ async def get_revenue_report(
             "byType": by_type,
             "invoices": invoices[:100]  # Limit to 100 for response size
         }
+    except gexc.DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to generate report: {str(e)}")
 
@@ -72,16 +83,11 @@ async def get_jobs_report(
         start = datetime.fromisoformat(start_date)
         end = datetime.fromisoformat(end_date)
         
-        # Get jobs in date range
-        jobs_ref = db.collection("jobs")
-        query = jobs_ref.where(
-            filter=FieldFilter("createdAt", ">=", start)
-        ).where(
-            filter=FieldFilter("createdAt", "<=", end)
-        )
+        # Get jobs in date range, reading sub-ranges in parallel
+        partitions = scan.range_partitions(db.collection("jobs"), "createdAt", start, end)
         
         jobs = []
-        for doc in query.stream():
+        for doc in await scan.collect(partitions):
             data = doc.to_dict()
             data["id"] = doc.id
             jobs.append(data)
@@ -105,6 +111,8 @@ async def get_jobs_report(
             },
             "jobs": jobs[:100]
         }
+    except gexc.DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to generate report: {str(e)}")
 
@@ -118,9 +126,8 @@ async def get_performance_report(
     """Generate performance report (crew utilization, etc.)."""
     try:
         # Get crews and their schedules
-        crews_ref = db.collection("crews")
         crews = []
-        for doc in crews_ref.stream():
+        for doc in await _crew_docs():
             data = doc.to_dict()
             data["id"] = doc.id
             crews.append(data)
@@ -129,15 +136,14 @@ async def get_performance_report(
         start = datetime.fromisoformat(start_date)
         end = datetime.fromisoformat(end_date)
         
-        schedules_ref = db.collection("schedule")
-        query = schedules_ref.where(
-            filter=FieldFilter("date", ">=", start_date.split('T')[0])
-        ).where(
-            filter=FieldFilter("date", "<=", end_date.split('T')[0])
+        # Schedule dates are stored as YYYY-MM-DD strings
+        partitions = scan.range_partitions(
+            db.collection("schedule"), "date", start, end,
+            as_value=lambda value: value.date().isoformat(),
         )
         
         schedules = []
-        for doc in query.stream():
+        for doc in await scan.collect(partitions):
             data = doc.to_dict()
             schedules.append(data)
         
@@ -161,64 +167,81 @@ async def get_performance_report(
             "crewUtilization": crew_utilization,
             "totalSchedules": len(schedules),
         }
+    except gexc.DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to generate report: {str(e)}")
 
 
 @router.get("/kpis")
 async def get_kpi_metrics(
+    etags: Optional[Set[str]] = Depends(if_none_match),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get KPI metrics for dashboard."""
+    """Get KPI metrics for dashboard. Supports ``If-None-Match``."""
     try:
         # Get date range (last 30 days)
         end = datetime.utcnow()
         start = end - timedelta(days=30)
-        
-        # Total Revenue
-        invoices_ref = db.collection("invoices")
-        invoices_query = invoices_ref.where(
-            filter=FieldFilter("createdAt", ">=", start.isoformat())
-        ).where(
-            filter=FieldFilter("createdAt", "<=", end.isoformat())
+
+        # The scans and counter reads run concurrently; each scan reads its
+        # own partitions in parallel and aggregates as rows arrive.
+        async def revenue() -> float:
+            partitions = scan.range_partitions(db.collection("invoices"), "createdAt", start, end)
+            total = 0
+            async for doc in scan.iterate(partitions):
+                total += doc.to_dict().get("total", 0)
+            return total
+
+        async def job_counts() -> tuple:
+            # Active jobs from the per-state counters, recently closed ones
+            # from a count() aggregation; neither reads job documents.
+            open_states = [
+                state.value for state in JobWorkflowState if state != JobWorkflowState.CLOSED
+            ]
+            closed = (
+                db.collection("jobs")
+                .where(filter=FieldFilter("workflowState", "==", JobWorkflowState.CLOSED.value))
+                .where(filter=FieldFilter("closedAt", ">=", start))
+            )
+            by_state, completed = await asyncio.gather(
+                counters.job_state_counts(open_states), counters.count(closed)
+            )
+            return sum(by_state.values()), completed
+
+        async def scheduled_dates() -> set:
+            dates = set()
+            async for doc in scan.iterate(await scan.collection_partitions(db, "schedule")):
+                date = doc.to_dict().get("date")
+                if date:
+                    dates.add(date)
+            return dates
+
+        async def jsa_count() -> int:
+            return await counters.count(db.collection("tech_jsa"))
+
+        total_revenue, (active_jobs, completed_jobs), dates, jsas, crew_docs = await asyncio.gather(
+            revenue(), job_counts(), scheduled_dates(), jsa_count(), _crew_docs()
         )
-        invoices = [doc.to_dict() for doc in invoices_query.stream()]
-        total_revenue = sum(inv.get("total", 0) for inv in invoices)
-        
-        # Active Jobs
-        jobs_ref = db.collection("jobs")
-        all_jobs = list(jobs_ref.stream())
-        active_jobs = [doc for doc in all_jobs if doc.to_dict().get("workflowState") != "closed"]
-        
-        completed_jobs = [
-            doc for doc in all_jobs 
-            if doc.to_dict().get("workflowState") == "closed" 
-            and doc.to_dict().get("closedAt", "") >= start.isoformat()
-        ]
         
         # Crew Utilization
-        crews_ref = db.collection("crews")
-        crews = [doc.to_dict() for doc in crews_ref.stream()]
-        schedules_ref = db.collection("schedule")
-        schedules = [doc.to_dict() for doc in schedules_ref.stream()]
-        
-        total_crew_days = len(crews) * 30
-        scheduled_days = len(set(s.get("date") for s in schedules if s.get("date")))
+        total_crew_days = len(crew_docs) * 30
+        scheduled_days = len(dates)
         crew_utilization = (scheduled_days / total_crew_days * 100) if total_crew_days > 0 else 0
         
         # Compliance Rate (JSA completion)
-        jsa_ref = db.collection("tech_jsa")
-        jsas = list(jsa_ref.stream())
-        total_jobs_count = len(active_jobs) + len(completed_jobs)
-        jsa_completion_rate = (len(jsas) / total_jobs_count * 100) if total_jobs_count > 0 else 0
+        total_jobs_count = active_jobs + completed_jobs
+        jsa_completion_rate = (jsas / total_jobs_count * 100) if total_jobs_count > 0 else 0
         
-        return {
+        return conditional_json({
             "totalRevenue": round(total_revenue, 2),
-            "activeJobs": len(active_jobs),
-            "completedJobs": len(completed_jobs),
+            "activeJobs": active_jobs,
+            "completedJobs": completed_jobs,
             "crewUtilization": round(crew_utilization, 2),
             "complianceRate": round(jsa_completion_rate, 2),
-        }
+        }, etags)
+    except gexc.DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get KPIs: {str(e)}")
 
@@ -234,32 +257,29 @@ async def get_compliance_report(
         start = datetime.fromisoformat(start_date)
         end = datetime.fromisoformat(end_date)
         
-        # Get jobs in date range
-        jobs_ref = db.collection("jobs")
-        jobs_query = jobs_ref.where(
-            filter=FieldFilter("createdAt", ">=", start.isoformat())
-        ).where(
-            filter=FieldFilter("createdAt", "<=", end.isoformat())
+        # Get jobs in date range, reading sub-ranges in parallel
+        jobs_docs = await scan.collect(
+            scan.range_partitions(db.collection("jobs"), "createdAt", start, end)
         )
-        jobs_docs = list(jobs_query.stream())
         jobs = [doc.to_dict() for doc in jobs_docs]
         job_ids = [doc.id for doc in jobs_docs]
         
-        # Get JSAs
-        jsa_ref = db.collection("tech_jsa")
-        jsas = []
-        for job_id in job_ids:
-            jsa_query = jsa_ref.where(filter=FieldFilter("jobId", "==", job_id))
-            jsas.extend([doc.to_dict() for doc in jsa_query.stream()])
+        # JSA presence comes from each job's rollup, read in one batch
+        job_rollups = await rollups.get_many(db, rollups.JOB_ROLLUPS, job_ids)
         
         # Calculate compliance
         total_jobs = len(jobs)
-        jsas_completed = len(jsas)
+        jsas_completed = sum(
+            int((rollup.get("forms") or {}).get("jsa", 0)) for rollup in job_rollups.values()
+        )
         jsa_completion_rate = (jsas_completed / total_jobs * 100) if total_jobs > 0 else 0
         missing_jsas = total_jobs - jsas_completed
         
         # Find non-compliant jobs
-        jobs_with_jsa = set(jsa.get("jobId") for jsa in jsas)
+        jobs_with_jsa = set(
+            job_id for job_id, rollup in job_rollups.items()
+            if (rollup.get("formsComplete") or {}).get("jsa")
+        )
         non_compliant_jobs = [
             {
                 "id": job_id,
@@ -280,6 +300,8 @@ async def get_compliance_report(
             "documentCompliance": document_compliance,
             "nonCompliantJobs": non_compliant_jobs[:50],  # Limit to 50
         }
+    except gexc.DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to generate compliance report: {str(e)}")
 
@@ -369,5 +391,7 @@ async def export_report(
                 "Content-Disposition": f"attachment; filename={report_type}_report_{start_date}_{end_date}.csv"
             }
         )
+    except gexc.DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to export report: {str(e)}")
\ No newline at end of file
@@ -1,37 +1,53 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from app.models.schemas import ProductServiceSKU, SKUType
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import List, Optional
+from datetime import datetime
+from app.models.schemas import ProductServiceSKU, SKUType, Page
 from app.main import db
+from app.data import aio
+from app.data.pagination import PageParams, fetch_page, paginate_local
+from app.data.replica import fresh_replica
+from app.data.writes import expected_update_time, update_existing
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/skus", tags=["skus"])
 
 
+async def _find_by_code(code: str) -> List:
+    replica = fresh_replica("skus")
+    if replica:
+        return replica.where(sku=code)
+    return await aio.stream(
+        db.collection("skus").where(filter=FieldFilter("sku", "==", code))
+    )
+
+
 @router.post("/", response_model=ProductServiceSKU)
 async def create_sku(sku: ProductServiceSKU):
     """Create a new product or service SKU."""
     sku_dict = sku.model_dump(exclude={"id"})
     
     # Check for duplicate SKU code
-    existing = db.collection("skus").where(filter=FieldFilter("sku", "==", sku.sku)).limit(1).stream()
-    if list(existing):
+    existing = await _find_by_code(sku.sku)
+    if existing:
         raise HTTPException(status_code=400, detail=f"SKU code '{sku.sku}' already exists")
     
-    _, sku_ref = db.collection("skus").add(sku_dict)
+    _, sku_ref = await aio.add(db.collection("skus"), sku_dict)
     sku.id = sku_ref.id
     return sku
 
 
-@router.get("/", response_model=List[ProductServiceSKU])
+@router.get("/", response_model=Page[ProductServiceSKU])
 async def get_skus(
     type: SKUType = None,
     category: str = None,
     isActive: bool = None,
-    search: str = None
+    search: str = None,
+    page: PageParams = Depends(),
 ):
     """List all SKUs with optional filters."""
     skus_ref = db.collection("skus")
     query = skus_ref
+    allowed = ("name", "sku")
     
     if type:
         query = query.where(filter=FieldFilter("type", "==", type.value))
@@ -39,8 +55,22 @@ async def get_skus(
         query = query.where(filter=FieldFilter("category", "==", category))
     if isActive is not None:
         query = query.where(filter=FieldFilter("isActive", "==", isActive))
+    if type or category or isActive is not None:
+        allowed = ("name",)
     
-    docs = query.stream()
+    # Search is applied per page, so a page may be short of `limit`.
+    replica = fresh_replica("skus")
+    if replica:
+        filters = {}
+        if type:
+            filters["type"] = type.value
+        if category:
+            filters["category"] = category
+        if isActive is not None:
+            filters["isActive"] = isActive
+        docs, next_token = paginate_local(replica.where(**filters), page, allowed, "name")
+    else:
+        docs, next_token = await fetch_page(query, page, allowed, "name")
     
     skus = []
     for doc in docs:
@@ -59,14 +89,14 @@ async def get_skus(
         
         skus.append(ProductServiceSKU(**sku_data))
     
-    return skus
+    return Page(items=skus, nextPageToken=next_token)
 
 
 @router.get("/{sku_id}", response_model=ProductServiceSKU)
 async def get_sku(sku_id: str):
     """Get a single SKU by ID."""
     doc_ref = db.collection("skus").document(sku_id)
-    doc = doc_ref.get()
+    doc = await aio.get(doc_ref)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="SKU not found")
     
@@ -76,21 +106,23 @@ async def get_sku(sku_id: str):
 
 
 @router.put("/{sku_id}", response_model=ProductServiceSKU)
-async def update_sku(sku_id: str, sku: ProductServiceSKU):
+async def update_sku(
+    sku_id: str,
+    sku: ProductServiceSKU,
+    response: Response,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     """Update an existing SKU."""
     doc_ref = db.collection("skus").document(sku_id)
-    doc = doc_ref.get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="SKU not found")
     
     # Check for duplicate SKU code (excluding current doc)
-    existing = db.collection("skus").where(filter=FieldFilter("sku", "==", sku.sku)).stream()
+    existing = await _find_by_code(sku.sku)
     for existing_doc in existing:
         if existing_doc.id != sku_id:
             raise HTTPException(status_code=400, detail=f"SKU code '{sku.sku}' already exists")
     
     data = sku.model_dump(exclude={"id"})
-    doc_ref.update(data)
+    await update_existing(doc_ref, data, "SKU not found", if_match, response)
     sku.id = sku_id
     return sku
 
@@ -99,10 +131,6 @@ async def update_sku(sku_id: str, sku: ProductServiceSKU):
 async def delete_sku(sku_id: str):
     """Delete a SKU (soft delete by setting isActive=False)."""
     doc_ref = db.collection("skus").document(sku_id)
-    doc = doc_ref.get()
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="SKU not found")
-    
-    doc_ref.update({"isActive": False})
+    await update_existing(doc_ref, {"isActive": False}, "SKU not found")
     return {"message": "SKU deactivated successfully"}
 
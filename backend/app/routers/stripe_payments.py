@@ -6,6 +6,7 @@ from app.models.schemas import PaymentIntent
 from app.routers.auth import get_current_active_user, require_role, User
 from app.models.schemas import UserRole
 from app.main import db
+from app.data import aio, rollups
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 router = APIRouter(prefix="/payments", tags=["payments"])
@@ -26,7 +27,7 @@ async def create_payment_intent(
     
     # Get invoice
     invoice_ref = db.collection("invoices").document(invoice_id)
-    invoice_doc = invoice_ref.get()
+    invoice_doc = await aio.get(invoice_ref)
     
     if not invoice_doc.exists:
         raise HTTPException(status_code=404, detail="Invoice not found")
@@ -59,7 +60,7 @@ async def create_payment_intent(
         )
         
         payment_dict = payment_intent.model_dump(exclude={"id"})
-        _, payment_ref = db.collection("payment_intents").add(payment_dict)
+        _, payment_ref = await aio.add(db.collection("payment_intents"), payment_dict)
         payment_intent.id = payment_ref.id
         
         return {
@@ -94,7 +95,7 @@ async def stripe_webhook(request: dict):
         if invoice_id:
             # Update invoice payment status
             invoice_ref = db.collection("invoices").document(invoice_id)
-            invoice_doc = invoice_ref.get()
+            invoice_doc = await rollups.read(invoice_ref)
             
             if invoice_doc.exists:
                 invoice_data = invoice_doc.to_dict()
@@ -111,17 +112,17 @@ async def stripe_webhook(request: dict):
                 if balance_due <= 0:
                     update_data["status"] = "Paid"
                 
-                invoice_ref.update(update_data)
+                await rollups.update(db, invoice_ref, update_data, invoice_doc)
             
             # Update payment intent status
             payment_intents_ref = db.collection("payment_intents")
             query = payment_intents_ref.where(
                 filter=FieldFilter("stripePaymentIntentId", "==", payment_intent["id"])
             )
-            payment_docs = list(query.stream())
+            payment_docs = await aio.stream(query)
             
             if payment_docs:
-                payment_docs[0].reference.update({"status": "succeeded"})
+                await aio.update(payment_docs[0].reference, {"status": "succeeded"})
     
     return {"status": "success"}
 
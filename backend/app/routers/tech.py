@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List
 from app.models.schemas import TechJSA, TechDamageScan, TechDetach, TechReset
 from app.main import db
+from app.data import aio, rollups
 from app.routers.auth import get_current_active_user, User
 from google.cloud.firestore_v1.base_query import FieldFilter
 
@@ -19,7 +20,7 @@ async def create_jsa(jsa: TechJSA, current_user: User = Depends(get_current_acti
         
     jsa_dict = jsa.model_dump(exclude={"id"})
     
-    update_time, doc_ref = db.collection("tech_jsa").add(jsa_dict)
+    update_time, doc_ref = await rollups.add(db, db.collection("tech_jsa"), jsa_dict)
     jsa.id = doc_ref.id
     return jsa
 
@@ -40,7 +41,7 @@ async def get_jsas(job_id: str = None, current_user: User = Depends(get_current_
         else:
             query = jsa_ref.where(filter=FieldFilter("technicianId", "==", current_user.id))
             
-    docs = query.stream()
+    docs = await aio.stream(query)
     jsas = []
     for doc in docs:
         data = doc.to_dict()
@@ -59,7 +60,7 @@ async def create_damage_scan(scan: TechDamageScan, current_user: User = Depends(
         
     scan_dict = scan.model_dump(exclude={"id"})
     
-    update_time, doc_ref = db.collection("damage_scans").add(scan_dict)
+    update_time, doc_ref = await rollups.add(db, db.collection("damage_scans"), scan_dict)
     scan.id = doc_ref.id
     return scan
 
@@ -73,7 +74,7 @@ async def create_detach(detach: TechDetach, current_user: User = Depends(get_cur
         
     detach_dict = detach.model_dump(exclude={"id"})
     
-    update_time, doc_ref = db.collection("detach_workflows").add(detach_dict)
+    update_time, doc_ref = await rollups.add(db, db.collection("detach_workflows"), detach_dict)
     detach.id = doc_ref.id
     return detach
 
@@ -87,6 +88,6 @@ async def create_reset(reset: TechReset, current_user: User = Depends(get_curren
         
     reset_dict = reset.model_dump(exclude={"id"})
     
-    update_time, doc_ref = db.collection("reset_workflows").add(reset_dict)
+    update_time, doc_ref = await rollups.add(db, db.collection("reset_workflows"), reset_dict)
     reset.id = doc_ref.id
     return reset
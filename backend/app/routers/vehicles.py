@@ -1,9 +1,15 @@
-from typing import List
+from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Response
 
 from app.main import db
-from app.models.schemas import Vehicle
+from app.data import aio
+from app.data.pagination import PageParams, fetch_page, paginate_local
+from app.data.replica import fresh_replica
+from app.data.serialization import page_response
+from app.data.writes import delete_existing, expected_update_time, update_existing
+from app.models.schemas import Vehicle, Page
 
 
 router = APIRouter(prefix="/vehicles", tags=["vehicles"])
@@ -12,25 +18,24 @@ router = APIRouter(prefix="/vehicles", tags=["vehicles"])
 @router.post("/", response_model=Vehicle)
 async def create_vehicle(vehicle: Vehicle):
     data = vehicle.model_dump(exclude={"id"})
-    _, ref = db.collection("vehicles").add(data)
+    _, ref = await aio.add(db.collection("vehicles"), data)
     vehicle.id = ref.id
     return vehicle
 
 
-@router.get("/", response_model=List[Vehicle])
-async def list_vehicles():
-    docs = db.collection("vehicles").stream()
-    vehicles: List[Vehicle] = []
-    for doc in docs:
-        data = doc.to_dict()
-        data["id"] = doc.id
-        vehicles.append(Vehicle(**data))
-    return vehicles
+@router.get("/", response_model=Page[Vehicle])
+async def list_vehicles(page: PageParams = Depends()):
+    replica = fresh_replica("vehicles")
+    if replica:
+        docs, next_token = paginate_local(replica.where(), page, ("name",), "name")
+    else:
+        docs, next_token = await fetch_page(db.collection("vehicles"), page, ("name",), "name")
+    return page_response(Vehicle, docs, next_token)
 
 
 @router.get("/{vehicle_id}", response_model=Vehicle)
 async def get_vehicle(vehicle_id: str):
-    snap = db.collection("vehicles").document(vehicle_id).get()
+    snap = await aio.get(db.collection("vehicles").document(vehicle_id))
     if not snap.exists:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     data = snap.to_dict()
@@ -39,22 +44,26 @@ async def get_vehicle(vehicle_id: str):
 
 
 @router.put("/{vehicle_id}", response_model=Vehicle)
-async def update_vehicle(vehicle_id: str, vehicle: Vehicle):
+async def update_vehicle(
+    vehicle_id: str,
+    vehicle: Vehicle,
+    response: Response,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     ref = db.collection("vehicles").document(vehicle_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
     data = vehicle.model_dump(exclude={"id"})
-    ref.update(data)
+    await update_existing(ref, data, "Vehicle not found", if_match, response)
     vehicle.id = vehicle_id
     return vehicle
 
 
 @router.delete("/{vehicle_id}")
-async def delete_vehicle(vehicle_id: str):
+async def delete_vehicle(
+    vehicle_id: str,
+    if_match: Optional[datetime] = Depends(expected_update_time),
+):
     ref = db.collection("vehicles").document(vehicle_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-    ref.delete()
+    await delete_existing(ref, "Vehicle not found", if_match)
     return {"deleted": True}
 
 
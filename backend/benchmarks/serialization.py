@@ -0,0 +1,127 @@
+"""
+Per-document cost of serializing a page of ``GET /jobs`` and ``GET /invoices``.
+
+``before`` reproduces the old path: ``Model(**data)`` per document, then
+FastAPI's response_model handling (dump, validate against ``Page[Model]``,
+serialize in JSON mode) and the stdlib JSON encoder. ``after`` is
+``app.data.serialization.page_response``.
+
+No Firestore access is needed; documents are synthetic snapshots shaped like
+the ones the routers write. Run from ``backend/``:
+
+    python -m benchmarks.serialization [page_size] [rounds]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from app.data.serialization import page_response
+from app.models.schemas import Invoice, Job, Page
+
+
+class _Snapshot:
+    def __init__(self, doc_id: str, data: Dict[str, Any]):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._data)
+
+
+def _job(i: int) -> Dict[str, Any]:
+    now = datetime(2024, 5, 1) + timedelta(minutes=i)
+    return {
+        "customerId": f"cust-{i % 300}",
+        "status": "scheduled",
+        "type": "detach-reset",
+        "scheduledDate": now,
+        "assignedCrewId": f"crew-{i % 12}",
+        "technicianIds": [f"tech-{i % 40}", f"tech-{(i + 1) % 40}"],
+        "address": {"street": f"{i} Main St", "city": "Denver", "state": "CO", "zip": "80202"},
+        "workflowState": "scheduled_detach",
+        "systemType": "roof-mount",
+        "systemSizeKw": 7.2,
+        "panel": {"brand": "Acme", "model": "P-400", "count": 18, "wattage": 400, "totalKw": 7.2},
+        "photos": [
+            {
+                "url": f"https://example.com/{i}/{n}.jpg",
+                "label": "Array",
+                "category": "roof_before",
+                "uploadedAt": now,
+            }
+            for n in range(4)
+        ],
+        "notes": "Gate code 1234",
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+
+def _invoice(i: int) -> Dict[str, Any]:
+    now = datetime(2024, 5, 1) + timedelta(minutes=i)
+    return {
+        "invoiceNumber": f"INV-2024-{i:05d}",
+        "jobId": f"job-{i}",
+        "customerId": f"cust-{i % 300}",
+        "customerName": "Jane Homeowner",
+        "type": "Deposit",
+        "status": "Pending",
+        "lineItems": [
+            {"description": "Detach", "quantity": 1, "unitPrice": 1800.0, "total": 1800.0},
+            {"description": "Reset", "quantity": 1, "unitPrice": 2200.0, "total": 2200.0},
+        ],
+        "subtotal": 4000.0,
+        "taxRate": 0.08,
+        "taxAmount": 320.0,
+        "total": 4320.0,
+        "balanceDue": 4320.0,
+        "dueDate": now + timedelta(days=30),
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+
+def _before(model: Any, docs: List[_Snapshot]) -> bytes:
+    items = []
+    for doc in docs:
+        data = doc.to_dict()
+        data["id"] = doc.id
+        items.append(model(**data))
+    page = Page(items=items, nextPageToken="token")
+    adapter = TypeAdapter(Page[model])
+    value = adapter.validate_python(page.model_dump())
+    content = adapter.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _after(model: Any, docs: List[_Snapshot]) -> bytes:
+    return page_response(model, docs, "token").body
+
+
+def _per_doc_us(fn: Callable[[], Any], docs: int, rounds: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds / docs * 1e6
+
+
+def main() -> None:
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    for name, model, build in (("GET /jobs", Job, _job), ("GET /invoices", Invoice, _invoice)):
+        docs = [_Snapshot(f"doc-{i}", build(i)) for i in range(page_size)]
+        before = _per_doc_us(lambda: _before(model, docs), page_size, rounds)
+        after = _per_doc_us(lambda: _after(model, docs), page_size, rounds)
+        print(
+            f"{name:<14} before {before:8.1f} us/doc   after {after:8.1f} us/doc"
+            f"   speedup {before / after:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Contract checks and a benchmark for the storage engines (see ``app.data.storage``).
+
+Every check in ``CHECKS`` runs against each engine with the same
+expectations, covering the Firestore behaviour routers rely on: value
+round trips, create/update/delete preconditions, field-path updates and
+transforms, merges, filters, ordering with cursors, projections,
+subcollections and collection groups, ``count()``, batches, transactions
+and ``get_all``. The benchmark then loads synthetic jobs and schedule
+entries and times the reads routers make most.
+
+Documents are written under collections prefixed with a random run id
+and deleted afterwards. The Firestore engine needs the Firebase Admin SDK
+configured as for the API; point it at the emulator
+(``FIRESTORE_EMULATOR_HOST``) rather than a live project. Run from
+``backend/``:
+
+    python -m benchmarks.storage_engines [engines] [documents] [rounds]
+
+``engines`` is a comma-separated list, ``sqlite`` by default. The contract
+also runs under pytest (``tests/test_storage_engines.py``).
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+from google.cloud.firestore_v1 import Query
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.data import storage
+from benchmarks.serialization import _job
+
+T0 = datetime(2026, 3, 1, 8, 0, tzinfo=timezone.utc)
+
+
+class Contract:
+    """Collections of one run on one engine, and cleanup of what was written."""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.prefix = f"contract{uuid.uuid4().hex[:8]}"
+        self._collections: List[Any] = []
+
+    def collection(self, name: str) -> Any:
+        collection = self.client.collection(f"{self.prefix}{name}")
+        self._collections.append(collection)
+        return collection
+
+    def cleanup(self) -> None:
+        for collection in self._collections:
+            for snap in collection.stream():
+                for sub in ("entries",):
+                    for child in snap.reference.collection(sub).stream():
+                        child.reference.delete()
+                snap.reference.delete()
+
+
+def _raises(error: type, fn: Callable[[], Any]) -> None:
+    try:
+        fn()
+    except error:
+        return
+    raise AssertionError(f"expected {error.__name__}")
+
+
+def _ids(docs: Any) -> List[str]:
+    return [doc.id for doc in docs]
+
+
+def check_round_trip(c: Contract) -> None:
+    ref = c.collection("jobs").document("a")
+    data = {
+        "status": "scheduled",
+        "count": 3,
+        "ratio": 0.5,
+        "done": False,
+        "notes": None,
+        "scheduledDate": T0,
+        "address": {"city": "Denver", "zip": "80202"},
+        "technicianIds": ["t1", "t2"],
+    }
+    result = ref.set(data)
+    snap = ref.get()
+    assert snap.exists and snap.id == "a"
+    assert snap.to_dict() == data, snap.to_dict()
+    assert snap.update_time == result.update_time
+    assert snap.update_time.tzinfo is not None
+    assert snap.get("address.city") == "Denver"
+    assert not c.collection("jobs").document("missing").get().exists
+
+
+def check_preconditions(c: Contract) -> None:
+    jobs = c.collection("jobs")
+    ref = jobs.document("a")
+    ref.create({"status": "new"})
+    _raises(gexc.AlreadyExists, lambda: ref.create({"status": "new"}))
+    _raises(gexc.NotFound, lambda: jobs.document("missing").update({"status": "x"}))
+    first = ref.get().update_time
+    ref.update({"status": "scheduled"})
+    stale = c.client.write_option(last_update_time=first)
+    _raises(gexc.FailedPrecondition, lambda: ref.update({"status": "closed"}, option=stale))
+    current = c.client.write_option(last_update_time=ref.get().update_time)
+    ref.update({"status": "closed"}, option=current)
+    assert ref.get().get("status") == "closed"
+    _raises(gexc.NotFound, lambda: jobs.document("missing").delete(option=c.client.write_option(exists=True)))
+    ref.delete()
+    assert not ref.get().exists
+
+
+def check_updates_and_transforms(c: Contract) -> None:
+    ref = c.collection("jobs").document("a")
+    ref.set({"address": {"city": "Denver", "zip": "80202"}, "tags": ["a"], "visits": 1, "old": True})
+    ref.update({
+        "address.city": "Boulder",
+        "visits": firestore.Increment(2),
+        "tags": firestore.ArrayUnion(["a", "b"]),
+        "old": firestore.DELETE_FIELD,
+        "touchedAt": firestore.SERVER_TIMESTAMP,
+    })
+    data = ref.get().to_dict()
+    assert data["address"] == {"city": "Boulder", "zip": "80202"}, data
+    assert data["visits"] == 3 and data["tags"] == ["a", "b"] and "old" not in data
+    assert isinstance(data["touchedAt"], datetime)
+    ref.update({"tags": firestore.ArrayRemove(["a"])})
+    assert ref.get().get("tags") == ["b"]
+    ref.set({"address": {"state": "CO"}, "visits": firestore.Increment(1)}, merge=True)
+    data = ref.get().to_dict()
+    assert data["address"] == {"city": "Boulder", "zip": "80202", "state": "CO"}, data
+    assert data["visits"] == 4
+    ref.set({"status": "new"})
+    assert ref.get().to_dict() == {"status": "new"}
+
+
+def _seed_schedule(c: Contract) -> Any:
+    schedule = c.collection("schedule")
+    batch = c.client.batch()
+    for i in range(12):
+        batch.set(schedule.document(f"s{i:02d}"), {
+            "date": f"2026-03-{1 + i % 4:02d}",
+            "crewId": f"crew-{i % 3}",
+            "status": "done" if i % 4 == 0 else "planned",
+            "hours": i % 5,
+            "skills": ["electrical"] if i % 2 else ["roofing"],
+            "startAt": T0 + timedelta(hours=i),
+        })
+    batch.commit()
+    return schedule
+
+
+def check_filters(c: Contract) -> None:
+    schedule = _seed_schedule(c)
+    assert _ids(schedule.where(filter=FieldFilter("crewId", "==", "crew-1")).stream()) == [
+        "s01", "s04", "s07", "s10"
+    ]
+    assert _ids(schedule.where("date", "==", "2026-03-02").where("crewId", "==", "crew-1").stream()) == ["s01"]
+    in_crews = schedule.where(filter=FieldFilter("crewId", "in", ["crew-0", "crew-2"]))
+    assert len(list(in_crews.stream())) == 8
+    between = schedule.where("date", ">=", "2026-03-02").where("date", "<=", "2026-03-03")
+    assert _ids(between.stream()) == ["s01", "s05", "s09", "s02", "s06", "s10"]
+    after = schedule.where(filter=FieldFilter("startAt", ">", T0 + timedelta(hours=9)))
+    assert _ids(after.stream()) == ["s10", "s11"]
+    assert len(list(schedule.where(filter=FieldFilter("status", "!=", "done")).stream())) == 9
+    contains = schedule.where(filter=FieldFilter("skills", "array_contains", "electrical"))
+    assert len(list(contains.stream())) == 6
+    # Values of another type never match
+    assert not list(schedule.where(filter=FieldFilter("hours", "==", "1")).stream())
+
+
+def check_order_and_cursors(c: Contract) -> None:
+    schedule = _seed_schedule(c)
+    ordered = schedule.order_by("hours", direction=Query.DESCENDING).order_by(
+        "__name__", direction=Query.DESCENDING
+    )
+    everything = _ids(ordered.stream())
+    assert everything == ["s09", "s04", "s08", "s03", "s07", "s02", "s11", "s06", "s01", "s10", "s05", "s00"]
+    page, seen = ordered.limit(5), []
+    while True:
+        docs = list(page.stream())
+        seen += _ids(docs)
+        if len(docs) < 5:
+            break
+        last = docs[-1]
+        page = ordered.start_after({"hours": last.get("hours"), "__name__": last.id}).limit(5)
+    assert seen == everything
+    by_time = schedule.order_by("startAt").limit(3)
+    assert _ids(by_time.stream()) == ["s00", "s01", "s02"]
+
+
+def check_projection(c: Contract) -> None:
+    schedule = _seed_schedule(c)
+    snap = list(schedule.where("crewId", "==", "crew-0").select(["date", "status"]).limit(1).stream())[0]
+    assert snap.to_dict() == {"date": "2026-03-01", "status": "done"}, snap.to_dict()
+
+
+def check_subcollections(c: Contract) -> None:
+    jobs = c.collection("jobs")
+    for job in ("a", "b"):
+        jobs.document(job).set({"status": "scheduled"})
+        for i in range(2):
+            jobs.document(job).collection("entries").document(f"{job}{i}").set({"jobId": job, "n": i})
+    entries = jobs.document("a").collection("entries")
+    assert _ids(entries.stream()) == ["a0", "a1"]
+    assert entries.parent.id == "a" and jobs.parent is None
+    group = c.client.collection_group("entries").where(filter=FieldFilter("n", "==", 1))
+    found = [snap for snap in group.stream() if snap.reference.path.startswith(c.prefix)]
+    assert sorted(_ids(found)) == ["a1", "b1"]
+
+
+def check_count(c: Contract) -> None:
+    schedule = _seed_schedule(c)
+    results = schedule.where(filter=FieldFilter("status", "==", "planned")).count().get()
+    assert int(results[0][0].value) == 9
+
+
+def check_batch_is_atomic(c: Contract) -> None:
+    jobs = c.collection("jobs")
+    jobs.document("a").set({"status": "new"})
+    batch = c.client.batch()
+    batch.set(jobs.document("b"), {"status": "new"})
+    batch.update(jobs.document("missing"), {"status": "x"})
+    _raises(gexc.NotFound, batch.commit)
+    assert not jobs.document("b").get().exists
+    update_time, ref = jobs.add({"status": "added"})
+    assert ref.get().update_time == update_time and len(ref.id) == 20
+
+
+def check_transaction(c: Contract) -> None:
+    ref = c.collection("sequences").document("invoice-2026")
+
+    def lease(transaction: Any) -> int:
+        snap = ref.get(transaction=transaction)
+        start = (snap.to_dict() or {}).get("next", 1) if snap.exists else 1
+        transaction.set(ref, {"next": start + 20}, merge=True)
+        return start
+
+    assert storage.run_transaction(c.client, lease) == 1
+    assert storage.run_transaction(c.client, lease) == 21
+    assert ref.get().get("next") == 41
+
+
+def check_get_all(c: Contract) -> None:
+    jobs = c.collection("jobs")
+    jobs.document("a").set({"status": "a"})
+    jobs.document("b").set({"status": "b"})
+    refs = [jobs.document("b"), jobs.document("missing"), jobs.document("a")]
+    snaps = {snap.id: snap for snap in c.client.get_all(refs)}
+    assert snaps["a"].get("status") == "a" and snaps["b"].get("status") == "b"
+    assert not snaps["missing"].exists
+
+
+CHECKS = [
+    check_round_trip,
+    check_preconditions,
+    check_updates_and_transforms,
+    check_filters,
+    check_order_and_cursors,
+    check_projection,
+    check_subcollections,
+    check_count,
+    check_batch_is_atomic,
+    check_transaction,
+    check_get_all,
+]
+
+
+def run_contract(client: Any) -> int:
+    failures = 0
+    for check in CHECKS:
+        contract = Contract(client)
+        try:
+            check(contract)
+            print(f"  ok    {check.__name__}")
+        except Exception as exc:
+            failures += 1
+            print(f"  FAIL  {check.__name__}: {type(exc).__name__}: {exc}")
+        finally:
+            contract.cleanup()
+    return failures
+
+
+def _ms(fn: Callable[[], Any], rounds: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def run_benchmark(client: Any, documents: int, rounds: int) -> None:
+    contract = Contract(client)
+    jobs = contract.collection("jobs")
+    schedule = contract.collection("schedule")
+    try:
+        started = time.perf_counter()
+        for start in range(0, documents, 500):
+            batch = client.batch()
+            for i in range(start, min(documents, start + 500)):
+                job = {**_job(i), "partnerId": f"partner-{i % 25}"}
+                batch.set(jobs.document(f"job-{i:06d}"), job)
+                batch.set(schedule.document(f"sched-{i:06d}"), {
+                    "jobId": f"job-{i:06d}",
+                    "crewId": f"crew-{i % 12}",
+                    "date": (T0 + timedelta(days=i % 90)).date().isoformat(),
+                    "status": "planned",
+                })
+            batch.commit()
+        load_ms = (time.perf_counter() - started) * 1000 / (documents * 2)
+
+        ids = [f"job-{i:06d}" for i in range(0, documents, max(1, documents // rounds))]
+        timings: Dict[str, float] = {
+            "write (batched, per doc)": load_ms,
+            "get job": _ms(lambda: jobs.document(ids[len(ids) // 2]).get(), rounds),
+            "get_all 20 jobs": _ms(lambda: list(client.get_all([jobs.document(i) for i in ids[:20]])), rounds),
+            "jobs by customerId": _ms(
+                lambda: list(jobs.where(filter=FieldFilter("customerId", "==", "cust-7")).stream()), rounds
+            ),
+            "jobs by partnerId, limit 50": _ms(
+                lambda: list(jobs.where(filter=FieldFilter("partnerId", "==", "partner-3")).limit(50).stream()),
+                rounds,
+            ),
+            "schedule by crewId + date": _ms(
+                lambda: list(schedule.where("crewId", "==", "crew-4").where("date", "==", "2026-03-05").stream()),
+                rounds,
+            ),
+            "schedule for a week": _ms(
+                lambda: list(schedule.where("date", ">=", "2026-03-08").where("date", "<=", "2026-03-14").stream()),
+                rounds,
+            ),
+            "jobs page by -createdAt, 50": _ms(
+                lambda: list(
+                    jobs.order_by("createdAt", direction=Query.DESCENDING)
+                    .order_by("__name__", direction=Query.DESCENDING)
+                    .limit(50)
+                    .stream()
+                ),
+                rounds,
+            ),
+            "count jobs by status": _ms(
+                lambda: jobs.where(filter=FieldFilter("status", "==", "scheduled")).count().get(), rounds
+            ),
+        }
+        for name, ms in timings.items():
+            print(f"  {name:<30} {ms:9.3f} ms")
+    finally:
+        contract.cleanup()
+
+
+def connect(engine: str) -> Any:
+    """A client for ``engine``; SQLite gets a fresh database in a temporary directory."""
+    if engine == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="dtrs-storage-"), "bench.sqlite3")
+        return storage.sqlite_store.Client(path)
+    import firebase_admin
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app()
+    return storage.connect("firestore")
+
+
+def main() -> None:
+    engines = (sys.argv[1] if len(sys.argv) > 1 else "sqlite").split(",")
+    documents = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    failures = 0
+    for engine in engines:
+        client = connect(engine.strip())
+        print(f"{engine} contract")
+        failures += run_contract(client)
+        print(f"{engine} benchmark ({documents} jobs, {documents} schedule entries)")
+        run_benchmark(client, documents, rounds)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+JSON versus MessagePack for ``Job`` documents as the tech app receives them.
+
+Encodes a single job and a page of jobs (the JSON the API produces, parsed
+back to Python values) with orjson and msgpack, and reports payload size,
+gzipped size and encode/decode time. Run from ``backend/``:
+
+    python -m benchmarks.wire_formats [page_size] [rounds]
+"""
+import gzip
+import sys
+import time
+from typing import Any, Callable
+
+import msgpack
+import orjson
+
+from app.data.serialization import page_response
+from app.models.schemas import Job
+from benchmarks.serialization import _job, _Snapshot
+
+
+def _us(fn: Callable[[], Any], rounds: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def _report(name: str, value: Any, rounds: int) -> None:
+    as_json = orjson.dumps(value)
+    as_msgpack = msgpack.packb(value)
+    print(f"{name}")
+    for label, payload, encode, decode in (
+        ("json", as_json, lambda: orjson.dumps(value), lambda: orjson.loads(as_json)),
+        ("msgpack", as_msgpack, lambda: msgpack.packb(value), lambda: msgpack.unpackb(as_msgpack)),
+    ):
+        print(
+            f"  {label:<8} {len(payload):>8} B   gzip {len(gzip.compress(payload)):>7} B"
+            f"   encode {_us(encode, rounds):8.1f} us   decode {_us(decode, rounds):8.1f} us"
+        )
+
+
+def main() -> None:
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    docs = [_Snapshot(f"doc-{i}", _job(i)) for i in range(page_size)]
+    page = orjson.loads(page_response(Job, docs, "token").body)
+    _report("GET /jobs/{id}", page["items"][0], rounds * 10)
+    _report(f"GET /jobs ({page_size} per page)", page, rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Backfill for the fields list endpoints order by in Firestore.
+
+``fetch_page`` orders in the query, so a list is only in order when every
+document holds its ordering field with one value type. Two kinds of
+document break that:
+
+- Timestamps stored as ISO strings, as the Cloud Functions, the web client
+  and ``create_invoice_from_estimate`` wrote them. Firestore orders values
+  by type first, so string ``createdAt`` values sort after every timestamp
+  instead of among them. They are parsed and rewritten as timestamps
+  (naive values are taken as UTC, as the API writes them).
+- Documents missing the field. ``order_by`` leaves them out of the results
+  altogether, while ``null`` sorts first. Missing ``createdAt`` and
+  ``uploadedAt`` get the document's create (or update) time, the other
+  fields the value in ``DEFAULTS``. Missing fields with no default are
+  reported, not written.
+
+Run it once before deploying server-side ordering, and again whenever old
+clients may have written strings. Run from ``backend/``:
+
+    python -m tools.backfill_order_fields [collections...] [--dry-run]
+
+``STORAGE_ENGINE`` picks the store, as for the API. ``--dry-run`` reports
+the changes without writing them.
+"""
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.data import storage
+
+# The fields each list endpoint may order by (see the routers' ``allowed``)
+ORDERED: Dict[str, Tuple[str, ...]] = {
+    "jobs": ("createdAt", "scheduledDate"),
+    "leads": ("createdAt", "score"),
+    "estimates": ("createdAt",),
+    "invoices": ("createdAt", "dueDate"),
+    "notifications": ("createdAt",),
+    "portal_documents": ("uploadedAt",),
+    "schedule": ("date",),
+    "partners": ("companyName",),
+    "contacts": ("lastName",),
+    "crews": ("name",),
+    "vehicles": ("name",),
+    "skus": ("name", "sku"),
+    "inventoryItems": ("itemName", "sku", "totalQuantity"),
+    "inventoryBins": ("binCode", "itemId"),
+}
+# Stored as timestamps; ``updatedAt`` is not ordered on, but is compared
+TIMESTAMPS = {"createdAt", "updatedAt", "dueDate", "scheduledDate", "uploadedAt"}
+# Filled from the document's create time when missing
+CREATED = {"createdAt", "uploadedAt"}
+DEFAULTS: Dict[str, Any] = {
+    "score": None,
+    "totalQuantity": 0,
+    "lastName": "",
+    "companyName": "",
+    "name": "",
+    "itemName": "",
+    "sku": "",
+    "binCode": "",
+    "itemId": "",
+}
+BATCH_SIZE = 400
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """An ISO 8601 string as an aware datetime, or ``None`` if it is not one."""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def fixes(snapshot: Any, fields: Tuple[str, ...]) -> Tuple[Dict[str, Any], List[str]]:
+    """The updates ``snapshot`` needs, and the fields that could not be fixed."""
+    data = snapshot.to_dict() or {}
+    updates: Dict[str, Any] = {}
+    unfixed: List[str] = []
+    for field in TIMESTAMPS.intersection(data):
+        if isinstance(data[field], str):
+            parsed = parse_timestamp(data[field])
+            if parsed is None:
+                unfixed.append(field)
+            else:
+                updates[field] = parsed
+    for field in fields:
+        if field in data:
+            continue
+        if field in CREATED:
+            created = getattr(snapshot, "create_time", None) or snapshot.update_time
+            if created is not None:
+                updates[field] = created
+                continue
+        if field in DEFAULTS:
+            updates[field] = DEFAULTS[field]
+        else:
+            unfixed.append(field)
+    return updates, unfixed
+
+
+def backfill(client: Any, collection: str, dry_run: bool = False) -> Tuple[int, int, int]:
+    """Fix ``collection``; returns (documents scanned, fixed, left unfixed)."""
+    fields = ORDERED[collection]
+    scanned = fixed = unfixed = 0
+    batch, pending = client.batch(), 0
+    for snapshot in client.collection(collection).stream():
+        scanned += 1
+        updates, missing = fixes(snapshot, fields)
+        if missing:
+            unfixed += 1
+            print(f"  {collection}/{snapshot.id}: cannot fix {', '.join(sorted(missing))}")
+        if not updates:
+            continue
+        fixed += 1
+        if dry_run:
+            continue
+        batch.update(snapshot.reference, updates)
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch, pending = client.batch(), 0
+    if pending:
+        batch.commit()
+    return scanned, fixed, unfixed
+
+
+def main() -> None:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    dry_run = "--dry-run" in sys.argv[1:]
+    unknown = [name for name in args if name not in ORDERED]
+    if unknown:
+        sys.exit(f"Unknown collections: {', '.join(unknown)}. Expected some of: {', '.join(ORDERED)}")
+
+    if storage.ENGINE == "firestore":
+        import firebase_admin
+
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app()
+    client = storage.connect()
+
+    for collection in args or list(ORDERED):
+        scanned, fixed, unfixed = backfill(client, collection, dry_run)
+        verb = "to fix" if dry_run else "fixed"
+        print(f"{collection}: {scanned} documents, {fixed} {verb}, {unfixed} with fields left unfixed")
+
+
+if __name__ == "__main__":
+    main()
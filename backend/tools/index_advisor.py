@@ -0,0 +1,691 @@
+"""
+Index advisor: checks ``firestore.indexes.json`` against the queries the API runs.
+
+Query shapes come from three places:
+
+- The source of ``app/routers`` and ``app/data``. Each function is walked
+  along every branch, following query variables through ``where``,
+  ``order_by`` and reassignments, so ``if status: query =
+  query.where(...)`` yields both the filtered and the unfiltered shape.
+  ``fetch_page``, ``ndjson_response`` and ``ordered_query`` add one
+  ordering per entry of their ``allowed`` argument, ``range_partitions``
+  a range filter, and ``loader.by_field`` an ``in`` filter.
+- The web client and the Cloud Functions, which query Firestore directly.
+  Their JavaScript is scanned lexically for ``where`` and ``orderBy``
+  clauses on a literal collection.
+- Query logs written by the API with ``QUERY_LOG_PATH`` set (see
+  ``app.data.query_log``). These cover the sites the source walk reports
+  as unresolved, where the collection name is not a literal.
+
+Each shape needs either nothing beyond Firestore's automatic single-field
+indexes (equality filters only, or one field filtered and ordered), a
+single-field collection-group override, or a composite index. A composite
+requirement is met by an index with exactly its fields, or by merging
+indexes that share its ordering suffix, one per equality field, as
+Firestore does. Composite indexes no shape uses are reported as unused:
+every write to their collection pays for them.
+
+Run from ``backend/``:
+
+    python -m tools.index_advisor [indexes.json] [query logs...] [--write]
+
+``--write`` adds the missing indexes to the indexes file. The exit status
+is 1 when indexes are missing, so CI can run it as a check.
+"""
+import ast
+import json
+import re
+import sys
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+BACKEND = Path(__file__).resolve().parent.parent
+SOURCES = (BACKEND / "app" / "routers", BACKEND / "app" / "data")
+# Web client (modular SDK) and Cloud Functions (Admin SDK) query Firestore directly
+JS_SOURCES = (BACKEND.parent / "frontend" / "src", BACKEND.parent / "functions")
+# The engine and the recorder handle queries generically; they build none
+SKIPPED = {"sqlite_store.py", "query_log.py"}
+DEFAULT_INDEXES = BACKEND.parent / "firestore.indexes.json"
+
+EQUALITY = {"==", "in"}
+ARRAY = {"array_contains", "array_contains_any"}
+INEQUALITY = {"<", "<=", ">", ">=", "!=", "not-in"}
+ASCENDING, DESCENDING, CONTAINS = "ASCENDING", "DESCENDING", "CONTAINS"
+# Calls that pass a query through unchanged
+PASSTHROUGH = {"limit", "limit_to_last", "offset", "select", "start_after", "start_at", "end_before", "end_at"}
+# Calls that run a query
+TERMINAL = {"stream", "get", "count", "sum", "avg", "get_partitions"}
+# Helpers that order a query by each entry of their ``allowed`` argument
+ORDERING_HELPERS = {"fetch_page", "ndjson_response", "ordered_query"}
+MAX_PATHS = 256
+
+
+@dataclass(frozen=True)
+class Shape:
+    collection: str
+    scope: str = "COLLECTION"
+    filters: Tuple[Tuple[str, str], ...] = ()
+    orders: Tuple[Tuple[str, str], ...] = ()
+
+    def where(self, field: str, op: str) -> "Shape":
+        return replace(self, filters=self.filters + ((field, op),))
+
+    def order_by(self, field: str, direction: str) -> "Shape":
+        return replace(self, orders=self.orders + ((field, direction),))
+
+
+@dataclass(frozen=True)
+class Orders:
+    """A tuple of ``order_by`` strings, e.g. ``("-createdAt", "dueDate")``."""
+
+    values: Tuple[str, ...]
+
+
+_DOCUMENT = object()  # A document reference: ``.collection()`` on it is a subcollection
+_UNRESOLVED = object()  # A query on a collection whose name is not known statically
+
+
+@dataclass(frozen=True)
+class Site:
+    path: str
+    line: int
+    function: str
+
+    def __str__(self) -> str:
+        return f"{self.path}:{self.line} {self.function}".rstrip()
+
+
+# ---------- Source walk ----------
+
+class _Walker:
+    def __init__(self, path: str, constants: Dict[str, Any]):
+        self.path = path
+        self.constants = constants
+        self.function = "<module>"
+        self.shapes: Dict[Shape, Set[Site]] = {}
+        self.unresolved: Set[Site] = set()
+
+    def _site(self, node: ast.AST) -> Site:
+        return Site(self.path, node.lineno, self.function)
+
+    def _record(self, value: Any, node: ast.AST) -> None:
+        if isinstance(value, Shape):
+            self.shapes.setdefault(value, set()).add(self._site(node))
+        elif value is _UNRESOLVED:
+            self.unresolved.add(self._site(node))
+
+    # ----- statements -----
+
+    def function_body(self, node: Any, env: Dict[str, Any]) -> None:
+        outer, self.function = self.function, node.name
+        self.block(node.body, [dict(env)])
+        self.function = outer
+
+    def block(self, body: Sequence[ast.stmt], envs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for stmt in body:
+            if not envs:
+                break
+            envs = self._dedupe(self.statement(stmt, envs))
+        return envs
+
+    @staticmethod
+    def _dedupe(envs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        unique = {tuple(sorted(env.items(), key=lambda item: item[0])): env for env in envs}
+        return list(unique.values())[:MAX_PATHS]
+
+    def statement(self, stmt: ast.stmt, envs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            self.function_body(stmt, envs[0])
+            return envs
+        if isinstance(stmt, ast.If):
+            taken, skipped = [], []
+            for env in envs:
+                self.evaluate(stmt.test, env)
+                known = self._truth(stmt.test, env)
+                if known is not False:
+                    taken.append(self._assume(stmt.test, True, dict(env)))
+                if known is not True:
+                    skipped.append(self._assume(stmt.test, False, dict(env)))
+            return self.block(stmt.body, taken) + self.block(stmt.orelse, skipped)
+        if isinstance(stmt, (ast.For, ast.AsyncFor, ast.While)):
+            # Zero or one pass is enough to see every shape the loop builds
+            looped = []
+            for env in envs:
+                inner = dict(env)
+                if isinstance(stmt, ast.While):
+                    self.evaluate(stmt.test, inner)
+                else:
+                    self._bind(stmt.target, self.evaluate(stmt.iter, inner), inner)
+                looped.append(inner)
+            return envs + self.block(stmt.body, looped) + self.block(stmt.orelse, envs)
+        if isinstance(stmt, (ast.With, ast.AsyncWith)):
+            for env in envs:
+                for item in stmt.items:
+                    self.evaluate(item.context_expr, env)
+            return self.block(stmt.body, envs)
+        if isinstance(stmt, ast.Try):
+            after = self.block(stmt.body, [dict(e) for e in envs])
+            for handler in stmt.handlers:
+                after += self.block(handler.body, [dict(e) for e in envs])
+            return self.block(stmt.finalbody, self.block(stmt.orelse, after) or after)
+        if isinstance(stmt, (ast.Return, ast.Raise)):
+            value = stmt.value if isinstance(stmt, ast.Return) else stmt.exc
+            if value is not None:
+                for env in envs:
+                    self.evaluate(value, env)
+            return []
+        if isinstance(stmt, ast.Assign):
+            result = []
+            for env in envs:
+                value = self.evaluate(stmt.value, env)
+                for target in stmt.targets:
+                    self._bind(target, value, env)
+                result.append(env)
+            return result
+        if isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+            for env in envs:
+                self._bind(stmt.target, self.evaluate(stmt.value, env), env)
+            return envs
+        for env in envs:
+            for child in ast.iter_child_nodes(stmt):
+                if isinstance(child, ast.expr):
+                    self.evaluate(child, env)
+        return envs
+
+    # ----- branch conditions -----
+    # A path remembers the outcome of each condition it took (``?`` keys), so
+    # ``if status: ...`` and a later ``if status or type: ...`` stay correlated.
+
+    def _truth(self, test: ast.expr, env: Dict[str, Any]) -> Optional[bool]:
+        if isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not):
+            inner = self._truth(test.operand, env)
+            return None if inner is None else not inner
+        if isinstance(test, ast.BoolOp):
+            values = [self._truth(value, env) for value in test.values]
+            decisive = isinstance(test.op, ast.Or)
+            if decisive in values:
+                return decisive
+            return None if None in values else not decisive
+        return env.get("?" + ast.dump(test))
+
+    def _assume(self, test: ast.expr, outcome: bool, env: Dict[str, Any]) -> Dict[str, Any]:
+        if isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not):
+            return self._assume(test.operand, not outcome, env)
+        if isinstance(test, ast.BoolOp):
+            # Each operand's outcome is known only when all of them share it
+            if isinstance(test.op, ast.And) == outcome:
+                for value in test.values:
+                    self._assume(value, outcome, env)
+            return env
+        env["?" + ast.dump(test)] = outcome
+        return env
+
+    @staticmethod
+    def _bind(target: ast.expr, value: Any, env: Dict[str, Any]) -> None:
+        if isinstance(target, ast.Name):
+            if value is None:
+                env.pop(target.id, None)
+            else:
+                env[target.id] = value
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                _Walker._bind(element, None, env)
+
+    # ----- expressions -----
+
+    def evaluate(self, node: Optional[ast.expr], env: Dict[str, Any]) -> Any:
+        if node is None:
+            return None
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return env.get(node.id, self.constants.get(node.id))
+        if isinstance(node, (ast.Tuple, ast.List)):
+            values = [self.evaluate(element, env) for element in node.elts]
+            if values and all(isinstance(value, str) for value in values):
+                return Orders(tuple(values))
+            return values[0] if len(values) == 1 and isinstance(values[0], Shape) else None
+        if isinstance(node, (ast.Await, ast.Starred)):
+            return self.evaluate(node.value, env)
+        if isinstance(node, ast.Lambda):
+            self.evaluate(node.body, dict(env))
+            return None
+        if isinstance(node, ast.IfExp):
+            self.evaluate(node.test, env)
+            body = self.evaluate(node.body, env)
+            orelse = self.evaluate(node.orelse, env)
+            return body if body is not None else orelse
+        if isinstance(node, (ast.GeneratorExp, ast.ListComp, ast.SetComp)):
+            inner = dict(env)
+            for generator in node.generators:
+                self._bind(generator.target, self.evaluate(generator.iter, inner), inner)
+            self.evaluate(node.elt, inner)
+            return None
+        if isinstance(node, ast.Call):
+            return self._call(node, env)
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.expr):
+                self.evaluate(child, env)
+        return None
+
+    def _call(self, node: ast.Call, env: Dict[str, Any]) -> Any:
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", "")
+        receiver = self.evaluate(func.value, env) if isinstance(func, ast.Attribute) else None
+        args = [self.evaluate(arg, env) for arg in node.args]
+        kwargs = {kw.arg: self.evaluate(kw.value, env) for kw in node.keywords if kw.arg}
+
+        if isinstance(func, ast.Attribute) and name in ("collection", "collection_group"):
+            collection = args[0] if args else None
+            if not isinstance(collection, str):
+                return _UNRESOLVED
+            return Shape(collection, "COLLECTION_GROUP" if name == "collection_group" else "COLLECTION")
+        if receiver is _UNRESOLVED:
+            if name in TERMINAL:
+                self._record(receiver, node)
+                return None
+            return _UNRESOLVED if name != "document" else _DOCUMENT
+        if isinstance(receiver, Shape):
+            if name == "where":
+                return self._where(receiver, node, env)
+            if name == "order_by":
+                field = args[0] if args else kwargs.get("field_path")
+                direction = kwargs.get("direction", args[1] if len(args) > 1 else ASCENDING)
+                if field == "__name__" or not isinstance(field, str):
+                    return receiver
+                return receiver.order_by(field, direction if direction in (ASCENDING, DESCENDING) else ASCENDING)
+            if name in PASSTHROUGH:
+                return receiver
+            if name == "document":
+                return _DOCUMENT
+            if name in TERMINAL:
+                self._record(receiver, node)
+                return None
+
+        if name in ORDERING_HELPERS and args and (isinstance(args[0], Shape) or args[0] is _UNRESOLVED):
+            allowed = args[2] if len(args) > 2 else kwargs.get("allowed")
+            default = args[3] if len(args) > 3 else kwargs.get("default")
+            orders = allowed.values if isinstance(allowed, Orders) else (default,)
+            for order in orders:
+                if isinstance(args[0], Shape) and isinstance(order, str):
+                    direction = DESCENDING if order.startswith("-") else ASCENDING
+                    self._record(args[0].order_by(order.lstrip("-"), direction), node)
+                else:
+                    self._record(args[0], node)
+            return None
+        if name == "range_partitions" and args and isinstance(args[0], Shape) and len(args) > 1:
+            if isinstance(args[1], str):
+                return args[0].where(args[1], ">=").where(args[1], "<")
+        if name == "by_field" and len(args) > 2:
+            if isinstance(args[1], str) and isinstance(args[2], str):
+                self._record(Shape(args[1]).where(args[2], "in"), node)
+            return None
+
+        # Any other call that receives a query runs it
+        for value in [*args, *kwargs.values()]:
+            self._record(value, node)
+        return None
+
+    def _where(self, shape: Shape, node: ast.Call, env: Dict[str, Any]) -> Shape:
+        for keyword in node.keywords:
+            if keyword.arg == "filter":
+                for field, op in self._filters(keyword.value, env):
+                    shape = shape.where(field, op)
+        if len(node.args) >= 2:
+            field, op = self.evaluate(node.args[0], env), self.evaluate(node.args[1], env)
+            if isinstance(field, str) and isinstance(op, str):
+                shape = shape.where(field, op)
+        return shape
+
+    def _filters(self, node: ast.expr, env: Dict[str, Any]) -> Iterable[Tuple[str, str]]:
+        if not isinstance(node, ast.Call):
+            return
+        name = getattr(node.func, "id", getattr(node.func, "attr", ""))
+        if name == "FieldFilter" and len(node.args) >= 2:
+            field, op = self.evaluate(node.args[0], env), self.evaluate(node.args[1], env)
+            if isinstance(field, str) and isinstance(op, str):
+                yield field, op
+        elif name == "And" and node.args and isinstance(node.args[0], (ast.List, ast.Tuple)):
+            for element in node.args[0].elts:
+                yield from self._filters(element, env)
+
+
+def _module_constants(tree: ast.Module) -> Dict[str, Any]:
+    constants: Dict[str, Any] = {}
+    walker = _Walker("", {})
+    for stmt in tree.body:
+        if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+            value = walker.evaluate(stmt.value, {})
+            if isinstance(value, (str, Orders)):
+                constants[stmt.targets[0].id] = value
+    return constants
+
+
+def source_shapes(roots: Sequence[Path] = SOURCES) -> Tuple[Dict[Shape, Set[Site]], Set[Site]]:
+    """Query shapes built in the Python sources under ``roots``, and unresolved query sites."""
+    shapes: Dict[Shape, Set[Site]] = {}
+    unresolved: Set[Site] = set()
+    for root in roots:
+        for file in sorted(root.glob("*.py")):
+            if file.name in SKIPPED:
+                continue
+            tree = ast.parse(file.read_text(encoding="utf-8"), str(file))
+            walker = _Walker(str(file.relative_to(BACKEND)), _module_constants(tree))
+            for node in tree.body:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    walker.function_body(node, {})
+                elif isinstance(node, ast.ClassDef):
+                    for member in node.body:
+                        if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                            walker.function_body(member, {})
+            for shape, sites in walker.shapes.items():
+                shapes.setdefault(shape, set()).update(sites)
+            unresolved |= walker.unresolved
+    return shapes, unresolved
+
+
+# ---------- JavaScript ----------
+# A lexical scan, not a parse: ``query(collection(db, "x"), where(...),
+# orderBy(...))`` calls and ``collection("x").where(...).orderBy(...)``
+# chains, also through a variable holding the collection reference.
+
+_JS_COLLECTION = re.compile(r"""\bcollection(Group)?\(\s*(?:\w+\s*,\s*)?(['"])([\w-]+)\2\s*\)""")
+_JS_REFERENCE = re.compile(
+    r"""\b(?:const|let|var)\s+(\w+)\s*=\s*[\w.]*\bcollection(Group)?\(\s*(?:\w+\s*,\s*)?(['"])([\w-]+)\3\s*\)\s*;"""
+)
+_JS_CALL = re.compile(r"\s*\.?\s*(\w+)\s*\(")
+_JS_STRING = re.compile(r"""(['"`])(.*?)\1""")
+_JS_QUERY = re.compile(r"\bquery\(")
+_JS_OPERATORS = {"array-contains": "array_contains", "array-contains-any": "array_contains_any"}
+
+
+def _closing(text: str, open_paren: int) -> int:
+    depth = 0
+    for position in range(open_paren, len(text)):
+        if text[position] == "(":
+            depth += 1
+        elif text[position] == ")":
+            depth -= 1
+            if depth == 0:
+                return position
+    return len(text)
+
+
+def _js_clause(shape: Shape, name: str, args: str) -> Shape:
+    strings = [value for _, value in _JS_STRING.findall(args)]
+    if name == "where" and len(strings) >= 2:
+        return shape.where(strings[0], _JS_OPERATORS.get(strings[1], strings[1]))
+    if name == "orderBy" and strings and strings[0] != "__name__":
+        descending = len(strings) > 1 and strings[1].lower() == "desc"
+        return shape.order_by(strings[0], DESCENDING if descending else ASCENDING)
+    return shape
+
+
+def _js_chain(text: str, position: int, shape: Shape) -> Shape:
+    """``shape`` with the ``.where``/``.orderBy`` calls chained at ``position`` applied."""
+    while True:
+        call = _JS_CALL.match(text, position)
+        if call is None or not text[position:call.start(1)].strip().startswith("."):
+            return shape
+        end = _closing(text, call.end() - 1)
+        shape = _js_clause(shape, call.group(1), text[call.end():end])
+        position = end + 1
+
+
+def js_shapes(roots: Sequence[Path] = JS_SOURCES) -> Dict[Shape, Set[Site]]:
+    """Query shapes in the JavaScript sources under ``roots``."""
+    shapes: Dict[Shape, Set[Site]] = {}
+    for root in roots:
+        files = [file for pattern in ("*.js", "*.jsx", "*.ts", "*.tsx") for file in root.rglob(pattern)]
+        for file in sorted(files):
+            if "node_modules" in file.parts:
+                continue
+            text = file.read_text(encoding="utf-8", errors="replace")
+            relative = str(file.relative_to(BACKEND.parent))
+            found: List[Tuple[int, Shape]] = []
+
+            def scope(group: Optional[str]) -> str:
+                return "COLLECTION_GROUP" if group else "COLLECTION"
+
+            for match in _JS_COLLECTION.finditer(text):
+                shape = Shape(match.group(3), scope(match.group(1)))
+                found.append((match.start(), _js_chain(text, match.end(), shape)))
+            for reference in _JS_REFERENCE.finditer(text):
+                shape = Shape(reference.group(4), scope(reference.group(2)))
+                for use in re.finditer(rf"\b{reference.group(1)}\b(?=\s*\.\s*(?:where|orderBy)\b)", text):
+                    found.append((use.start(), _js_chain(text, use.end(), shape)))
+            for match in _JS_QUERY.finditer(text):
+                args = text[match.end():_closing(text, match.end() - 1)]
+                collection = _JS_COLLECTION.search(args)
+                if collection is None:
+                    continue
+                shape = Shape(collection.group(3), scope(collection.group(1)))
+                for clause in re.finditer(r"\b(where|orderBy)\(", args):
+                    end = _closing(args, clause.end() - 1)
+                    shape = _js_clause(shape, clause.group(1), args[clause.end():end])
+                found.append((match.start(), shape))
+            for position, shape in found:
+                if shape.filters or shape.orders:
+                    site = Site(relative, text.count("\n", 0, position) + 1, "")
+                    shapes.setdefault(shape, set()).add(site)
+    return shapes
+
+
+def logged_shapes(paths: Sequence[str]) -> Set[Shape]:
+    """Shapes from query logs written by ``app.data.query_log``."""
+    shapes = set()
+    for path in paths:
+        with open(path, encoding="utf-8") as log:
+            for line in log:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                shapes.add(Shape(
+                    entry["collection"],
+                    entry.get("scope", "COLLECTION"),
+                    tuple((field, op) for field, op in entry.get("filters", [])),
+                    tuple(
+                        (field, direction) for field, direction in entry.get("orders", [])
+                        if field != "__name__"
+                    ),
+                ))
+    return shapes
+
+
+# ---------- Requirements ----------
+
+@dataclass(frozen=True)
+class Composite:
+    collection: str
+    scope: str
+    # (field, ASCENDING or CONTAINS) for equality and array filters, any order
+    prefix: frozenset
+    # (field, direction) after the prefix, in order
+    suffix: Tuple[Tuple[str, str], ...]
+
+    def fields(self) -> List[Tuple[str, str]]:
+        return sorted(self.prefix) + list(self.suffix)
+
+
+@dataclass(frozen=True)
+class Override:
+    collection: str
+    field: str
+    mode: str
+
+
+def requirement(shape: Shape) -> Tuple[Optional[Composite], List[Override]]:
+    """The composite index, or the collection-group overrides, ``shape`` needs."""
+    equality = {field for field, op in shape.filters if op in EQUALITY}
+    arrays = {field for field, op in shape.filters if op in ARRAY}
+    orders = [(field, direction) for field, direction in shape.orders if field not in equality]
+    ordered = {field for field, _ in orders}
+    ranges = list(dict.fromkeys(field for field, op in shape.filters if op in INEQUALITY))
+    suffix = tuple(orders + [(field, ASCENDING) for field in ranges if field not in ordered])
+    prefix = frozenset({(field, ASCENDING) for field in equality} | {(field, CONTAINS) for field in arrays})
+
+    if suffix and (prefix or len(suffix) > 1):
+        return Composite(shape.collection, shape.scope, prefix, suffix), []
+    if shape.scope != "COLLECTION_GROUP":
+        # Served by automatic single-field indexes, merged for equalities
+        return None, []
+    return None, [Override(shape.collection, field, mode) for field, mode in sorted(prefix) + list(suffix)]
+
+
+@dataclass(frozen=True)
+class Index:
+    collection: str
+    scope: str
+    fields: Tuple[Tuple[str, str], ...]
+
+    @classmethod
+    def parse(cls, entry: Dict[str, Any]) -> "Index":
+        fields = tuple(
+            (field["fieldPath"], field.get("order") or field.get("arrayConfig"))
+            for field in entry["fields"]
+            if field["fieldPath"] != "__name__"
+        )
+        return cls(entry["collectionGroup"], entry.get("queryScope", "COLLECTION"), fields)
+
+    def split(self, suffix_length: int) -> Tuple[Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str], ...]]:
+        cut = len(self.fields) - suffix_length
+        return self.fields[:cut], self.fields[cut:]
+
+
+def _prefix(fields: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+    # Equality fields may be indexed in either direction
+    return {(field, CONTAINS if mode == CONTAINS else ASCENDING) for field, mode in fields}
+
+
+def covering(need: Composite, indexes: Sequence[Index]) -> Optional[List[Index]]:
+    """The indexes that serve ``need``, exactly or by merging, or ``None``."""
+    candidates = []
+    for index in indexes:
+        if index.collection != need.collection or index.scope != need.scope:
+            continue
+        prefix, suffix = index.split(len(need.suffix))
+        if suffix == need.suffix and _prefix(prefix) <= need.prefix and (prefix or not need.prefix):
+            if _prefix(prefix) == need.prefix:
+                return [index]
+            candidates.append(index)
+    # Merged: each equality field in the prefix of some index with the same suffix
+    covered: Set[Tuple[str, str]] = set()
+    used = []
+    for index in candidates:
+        fields = _prefix(index.split(len(need.suffix))[0])
+        if not fields <= covered:
+            covered |= fields
+            used.append(index)
+    return used if used and covered == need.prefix else None
+
+
+def _override_present(override: Override, overrides: Sequence[Dict[str, Any]]) -> bool:
+    for entry in overrides:
+        if entry.get("collectionGroup") != override.collection or entry.get("fieldPath") != override.field:
+            continue
+        for index in entry.get("indexes", []):
+            mode = index.get("order") or index.get("arrayConfig")
+            if index.get("queryScope") == "COLLECTION_GROUP" and mode == override.mode:
+                return True
+    return False
+
+
+def _entry(need: Composite) -> Dict[str, Any]:
+    return {
+        "collectionGroup": need.collection,
+        "queryScope": need.scope,
+        "fields": [
+            {"fieldPath": field, "arrayConfig": CONTAINS} if mode == CONTAINS
+            else {"fieldPath": field, "order": mode}
+            for field, mode in need.fields()
+        ],
+    }
+
+
+def _describe(collection: str, fields: Iterable[Tuple[str, str]]) -> str:
+    short = {ASCENDING: "ASC", DESCENDING: "DESC", CONTAINS: "CONTAINS"}
+    return f"{collection} ({', '.join(f'{field} {short.get(mode, mode)}' for field, mode in fields)})"
+
+
+def advise(
+    config: Dict[str, Any], shapes: Dict[Shape, Set[Any]]
+) -> Tuple[Dict[Composite, Set[Any]], Dict[Override, Set[Any]], List[Index]]:
+    """Missing composite indexes, missing overrides and unused indexes for ``shapes``."""
+    indexes = [Index.parse(entry) for entry in config.get("indexes", [])]
+    overrides = config.get("fieldOverrides", [])
+    missing: Dict[Composite, Set[Any]] = {}
+    missing_overrides: Dict[Override, Set[Any]] = {}
+    used: Set[Index] = set()
+    for shape, sources in shapes.items():
+        need, group_overrides = requirement(shape)
+        for override in group_overrides:
+            if not _override_present(override, overrides):
+                missing_overrides.setdefault(override, set()).update(sources)
+        if need is None:
+            continue
+        found = covering(need, indexes)
+        if found is None:
+            missing.setdefault(need, set()).update(sources)
+        else:
+            used.update(found)
+    unused = [index for index in indexes if index not in used]
+    return missing, missing_overrides, unused
+
+
+def main() -> None:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    write = "--write" in sys.argv[1:]
+    indexes_path = Path(args[0]) if args else DEFAULT_INDEXES
+    config = json.loads(indexes_path.read_text(encoding="utf-8"))
+
+    found, unresolved = source_shapes()
+    client = js_shapes()
+    logged = logged_shapes(args[1:])
+    shapes: Dict[Shape, Set[Any]] = {}
+    for source in (found, client):
+        for shape, sites in source.items():
+            shapes.setdefault(shape, set()).update(sites)
+    for shape in logged:
+        shapes.setdefault(shape, set()).add("query log")
+    missing, missing_overrides, unused = advise(config, shapes)
+
+    print(
+        f"{len(found)} query shapes in the API, {len(client)} in the web client and Cloud Functions, "
+        f"{len(logged)} in query logs"
+    )
+    print(f"\nMissing composite indexes ({len(missing)}):")
+    for need, sources in sorted(missing.items(), key=lambda item: (item[0].collection, item[0].fields())):
+        print(f"  {_describe(need.collection, need.fields())}")
+        for source in sorted(map(str, sources)):
+            print(f"      {source}")
+    print(f"\nMissing collection-group field overrides ({len(missing_overrides)}):")
+    for override, sources in sorted(missing_overrides.items(), key=lambda item: str(item[0])):
+        print(f"  {override.collection}.{override.field} {override.mode}")
+        for source in sorted(map(str, sources)):
+            print(f"      {source}")
+    print(f"\nUnused composite indexes ({len(unused)}), each adding index writes to every write of its collection:")
+    for index in unused:
+        print(f"  {_describe(index.collection, index.fields)}")
+    if unresolved:
+        print(
+            f"\nQuery sites whose collection is not a literal ({len(unresolved)}); "
+            "pass a query log to check them:"
+        )
+        for site in sorted(unresolved, key=str):
+            print(f"  {site}")
+
+    if missing:
+        entries = [_entry(need) for need in sorted(missing, key=lambda need: (need.collection, need.fields()))]
+        if write:
+            config["indexes"] = config.get("indexes", []) + entries
+            indexes_path.write_text(json.dumps(config, indent=2) + "\n", encoding="utf-8")
+            print(f"\nAdded {len(entries)} indexes to {indexes_path}")
+        else:
+            print("\nIndexes to add to firestore.indexes.json:")
+            print(json.dumps(entries, indent=2))
+    sys.exit(1 if missing and not write else 0)
+
+
+if __name__ == "__main__":
+    main()
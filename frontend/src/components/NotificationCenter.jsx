@@ -14,6 +14,7 @@ import { Label } from './ui/label';
 import { Switch } from './ui/switch';
 import { useNavigate } from 'react-router-dom';
 import { cn } from '../lib/utils';
+import { toDate } from '../utils/dates';
 
 const NotificationCenter = () => {
     const { notifications, unreadCount, markAsRead, markAllAsRead, settings, updateSettings } = useNotifications();
@@ -93,7 +94,7 @@ const NotificationCenter = () => {
                                                 {notification.message}
                                             </p>
                                             <p className="text-[10px] text-gray-400">
-                                                {new Date(notification.createdAt).toLocaleString()}
+                                                {toDate(notification.createdAt).toLocaleString()}
                                             </p>
                                         </div>
                                         {!notification.read && (
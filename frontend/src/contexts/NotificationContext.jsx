@@ -81,7 +81,7 @@ export const NotificationProvider = ({ children }) => {
                 ...notificationData,
                 recipientId: user.uid, // Self-notification for demo
                 read: false,
-                createdAt: new Date().toISOString()
+                createdAt: new Date()
             });
         } catch (error) {
             console.error("Error adding notification:", error);
@@ -13,6 +13,7 @@ import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card'
 import { Badge } from '../components/ui/badge';
 import { useAuth } from '../contexts/AuthContextFirebase';
 import { useFirestore } from '../hooks/useFirestore';
+import { toDate } from '../utils/dates';
 
 const Dashboard = () => {
   const { user } = useAuth();
@@ -30,12 +31,12 @@ const Dashboard = () => {
 
     // Revenue (Paid invoices in last 30 days)
     const totalRevenue = invoices
-      .filter(inv => inv.status === 'Paid' && new Date(inv.paidDate || inv.updatedAt) >= thirtyDaysAgo)
+      .filter(inv => inv.status === 'Paid' && toDate(inv.paidDate || inv.updatedAt) >= thirtyDaysAgo)
       .reduce((sum, inv) => sum + (inv.paidAmount || inv.total || 0), 0);
 
     // Active Jobs (Not closed)
     const activeJobs = jobs.filter(j => j.workflowState !== 'closed' && j.status !== 'Cancelled').length;
-    const completedJobs = jobs.filter(j => j.workflowState === 'closed' && new Date(j.updatedAt) >= thirtyDaysAgo).length;
+    const completedJobs = jobs.filter(j => j.workflowState === 'closed' && toDate(j.updatedAt) >= thirtyDaysAgo).length;
 
     // Pending Invoices
     const pendingInvoicesList = invoices.filter(inv => inv.status === 'Pending');
@@ -63,20 +64,20 @@ const Dashboard = () => {
   // Recent Data
   const recentJobs = useMemo(() => {
     return [...jobs]
-      .sort((a, b) => new Date(b.createdAt || 0) - new Date(a.createdAt || 0))
+      .sort((a, b) => (toDate(b.createdAt) || 0) - (toDate(a.createdAt) || 0))
       .slice(0, 5);
   }, [jobs]);
 
   const recentLeads = useMemo(() => {
     return [...leads]
-      .sort((a, b) => new Date(b.createdAt || 0) - new Date(a.createdAt || 0))
+      .sort((a, b) => (toDate(b.createdAt) || 0) - (toDate(a.createdAt) || 0))
       .slice(0, 5);
   }, [leads]);
 
   const pendingInvoicesList = useMemo(() => {
     return invoices
       .filter(inv => inv.status === 'Pending')
-      .sort((a, b) => new Date(a.dueDate || 0) - new Date(b.dueDate || 0)) // Sort by due date ascending (urgent first)
+      .sort((a, b) => (toDate(a.dueDate) || 0) - (toDate(b.dueDate) || 0)) // Sort by due date ascending (urgent first)
       .slice(0, 5);
   }, [invoices]);
 
@@ -317,7 +318,7 @@ const Dashboard = () => {
                         ${(invoice.balanceDue || invoice.total || 0).toLocaleString()}
                       </td>
                       <td className="py-3 px-4">
-                        {invoice.dueDate ? new Date(invoice.dueDate).toLocaleDateString() : 'N/A'}
+                        {invoice.dueDate ? toDate(invoice.dueDate).toLocaleDateString() : 'N/A'}
                       </td>
                       <td className="py-3 px-4">
                         <Badge className={getStatusColor(invoice.status)}>{invoice.status}</Badge>
@@ -136,7 +136,7 @@ const Inventory = () => {
         reorderPoint: Number(formData.reorderPoint),
         initialStock: Number(formData.initialStock),
         imageUrl: formData.image[0] || null,
-        updatedAt: new Date().toISOString(),
+        updatedAt: new Date(),
         updatedBy: user.uid
       };
 
@@ -146,7 +146,7 @@ const Inventory = () => {
       } else {
         const docRef = await addDoc(collection(db, 'inventory_items'), {
           ...itemData,
-          createdAt: new Date().toISOString(),
+          createdAt: new Date(),
           createdBy: user.uid
         });
 
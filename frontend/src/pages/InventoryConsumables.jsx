@@ -30,7 +30,7 @@ const InventoryConsumables = () => {
                 ...formData,
                 quantity: Number(formData.quantity),
                 minLevel: Number(formData.minLevel),
-                updatedAt: new Date().toISOString()
+                updatedAt: new Date()
             });
             toast.success('Consumable added');
             setIsAddOpen(false);
@@ -38,7 +38,7 @@ const InventoryRMA = () => {
         try {
             await addDoc(collection(db, 'inventory_rma'), {
                 ...formData,
-                createdAt: new Date().toISOString(),
+                createdAt: new Date(),
                 createdBy: user.uid
             });
             toast.success('RMA Created');
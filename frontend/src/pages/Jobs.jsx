@@ -13,6 +13,7 @@ import { generateNextJobId } from '../utils/jobUtils';
 import { ref, uploadBytesResumable, getDownloadURL } from 'firebase/storage';
 import { storage } from '../config/firebase';
 import { useNotifications } from '../contexts/NotificationContext';
+import { toDate } from '../utils/dates';
 
 const workflowStages = [
   { key: 'intake_quoting', label: 'Intake', color: 'bg-blue-500' },
@@ -118,7 +119,7 @@ const Jobs = () => {
         panelCount: Number(createForm.panelCount),
         estimatedValue: Number(createForm.estimatedValue),
         workflowState: 'intake_quoting',
-        createdAt: new Date().toISOString(),
+        createdAt: new Date(),
         createdBy: user.email,
         media: [], // Using 'media' instead of 'photos'
         activityLog: [
@@ -366,7 +367,7 @@ const Jobs = () => {
                       </div>
                       <div className="flex items-center gap-2 text-sm text-gray-600">
                         <Calendar size={16} />
-                        <span>Created: {new Date(job.createdAt).toLocaleDateString()}</span>
+                        <span>Created: {toDate(job.createdAt).toLocaleDateString()}</span>
                       </div>
                     </div>
                   </div>
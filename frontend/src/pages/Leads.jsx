@@ -126,7 +126,7 @@ const Leads = () => {
         workflowState: 'intake_quoting',
         priority: 'Medium',
         systemType: 'Solar', // Default
-        createdAt: new Date().toISOString(),
+        createdAt: new Date(),
         createdBy: user.email,
         leadId: lead.id
       };
@@ -56,7 +56,7 @@ const Settings = () => {
 
             await setDoc(doc(db, 'settings', 'branding'), {
                 logoUrl: downloadURL,
-                updatedAt: new Date().toISOString(),
+                updatedAt: new Date(),
                 updatedBy: user.email
             });
 
@@ -108,7 +108,7 @@ const Settings = () => {
                 phoneNumber: profileForm.phoneNumber,
                 phone: profileForm.phoneNumber,
                 photoURL: photoURL,
-                updatedAt: new Date().toISOString()
+                updatedAt: new Date()
             });
 
             toast.success('Profile updated successfully!');
@@ -19,6 +19,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '.
 import { toast } from 'sonner';
 import { useParams, useNavigate } from 'react-router-dom';
 import { X } from 'lucide-react';
+import { toDate } from '../utils/dates';
 
 // Schema for Pre-Work Photos
 const preWorkSchema = z.object({
@@ -82,7 +83,7 @@ const TechDamageScan = () => {
     try {
       const data = {
         ...values,
-        createdAt: new Date().toISOString(),
+        createdAt: new Date(),
         technicianId: user?.uid || 'offline_user',
         type: 'pre_work_photos'
       };
@@ -114,7 +115,7 @@ const TechDamageScan = () => {
       type: damageType,
       photos: damagePhoto,
       note: damageNote,
-      createdAt: new Date().toISOString(),
+      createdAt: new Date(),
       technicianId: user?.uid || 'offline_user',
     };
 
@@ -284,7 +285,7 @@ const TechDamageScan = () => {
                       <p className="text-xs text-red-600">{item.note}</p>
                     </div>
                     <span className="text-[10px] text-gray-400">
-                      {new Date(item.createdAt).toLocaleTimeString()}
+                      {toDate(item.createdAt).toLocaleTimeString()}
                     </span>
                   </div>
                   {item.photos && item.photos.length > 0 && (
@@ -74,7 +74,7 @@ const TechJSA = () => {
     try {
       const data = {
         ...values,
-        createdAt: new Date().toISOString(),
+        createdAt: new Date(),
         technicianId: user?.uid || 'offline_user',
         technicianName: user?.name || values.signatureName,
       };
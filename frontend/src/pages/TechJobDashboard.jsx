@@ -57,7 +57,7 @@ const TechJobDashboard = () => {
                 message: `Technician reported ${reportData.type} at Job ${job.jobId || job.id}. ${reportData.description}`,
                 type: 'issue',
                 jobId: job.id,
-                createdAt: new Date().toISOString(),
+                createdAt: new Date(),
                 read: false,
                 recipientId: 'admin' // Or specific role/user
             });
@@ -78,7 +78,7 @@ const TechJobDashboard = () => {
                     message: `Microinverter Failed at Job ${job.jobId || job.id}. Please process warranty claim.`,
                     type: 'task',
                     jobId: job.id,
-                    createdAt: new Date().toISOString(),
+                    createdAt: new Date(),
                     read: false,
                     recipientId: 'warehouse_manager' // Target role
                 });
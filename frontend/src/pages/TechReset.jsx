@@ -87,7 +87,7 @@ const TechReset = () => {
     try {
       const data = {
         ...values,
-        createdAt: new Date().toISOString(),
+        createdAt: new Date(),
         technicianId: user?.uid || 'offline_user',
         stringSizingValid: !voltageWarning,
       };
@@ -15,6 +15,7 @@ import { collection, addDoc, getDocs, query, where, orderBy } from 'firebase/fir
 import { db } from '../../config/firebase';
 import { useAuth } from '../../contexts/AuthContextFirebase';
 import moment from 'moment';
+import { toDate } from '../../utils/dates';
 
 const API_BASE = process.env.REACT_APP_API_BASE || 'http://localhost:8000';
 
@@ -216,7 +217,7 @@ const Automation = () => {
 
       let collectionAlerts = 0;
       for (const invoice of invoices) {
-        if (invoice.status === 'Overdue' || (invoice.dueDate && moment().diff(moment(invoice.dueDate), 'days') > 3 && invoice.status !== 'Paid')) {
+        if (invoice.status === 'Overdue' || (invoice.dueDate && moment().diff(moment(toDate(invoice.dueDate)), 'days') > 3 && invoice.status !== 'Paid')) {
           await logExecution('The Collection Bot', `Invoice ${invoice.invoiceNumber} is overdue. SMS payment link sent to customer.`);
           collectionAlerts++;
         }
@@ -29,7 +29,7 @@ const FieldApp = () => {
       const response = await axios.get(`${API_BASE}/jobs?status=in-progress`, {
         headers: { Authorization: `Bearer ${token}` }
       });
-      setActiveJobs(response.data);
+      setActiveJobs(response.data.items);
     } catch (error) {
       console.error('Failed to fetch jobs:', error);
     } finally {
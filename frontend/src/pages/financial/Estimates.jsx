@@ -120,7 +120,7 @@ const EstimateCalculator = () => {
         total,
         notes: notes || null,
         status: 'draft',
-        updatedAt: new Date().toISOString(),
+        updatedAt: new Date(),
         updatedBy: user.uid
       };
 
@@ -130,7 +130,7 @@ const EstimateCalculator = () => {
       } else {
         const docRef = await addDoc(collection(db, 'quotes'), {
           ...estimateData,
-          createdAt: new Date().toISOString(),
+          createdAt: new Date(),
           createdBy: user.uid
         });
         setEstimateId(docRef.id);
@@ -166,8 +166,8 @@ const EstimateCalculator = () => {
         paidAmount: 0,
         balanceDue: total,
         status: 'Pending',
-        dueDate: new Date(Date.now() + 7 * 24 * 60 * 60 * 1000).toISOString(), // Due in 7 days
-        createdAt: new Date().toISOString(),
+        dueDate: new Date(Date.now() + 7 * 24 * 60 * 60 * 1000), // Due in 7 days
+        createdAt: new Date(),
         createdBy: user.uid
       };
 
@@ -12,6 +12,7 @@ import { Plus, Search, DollarSign, Calendar, FileText, Download, Eye, CreditCard
 import { toast } from 'sonner';
 import { useAuth } from '../../contexts/AuthContextFirebase';
 import { useNotifications } from '../../contexts/NotificationContext';
+import { toDate } from '../../utils/dates';
 
 const Invoices = () => {
   const [invoices, setInvoices] = useState([]);
@@ -152,8 +153,8 @@ const Invoices = () => {
             </div>
             <div class="text-right">
               <div class="label">Dates</div>
-              <div class="value">Issued: ${new Date(selectedInvoice.createdAt).toLocaleDateString()}</div>
-              <div class="value">Due: ${new Date(selectedInvoice.dueDate).toLocaleDateString()}</div>
+              <div class="value">Issued: ${toDate(selectedInvoice.createdAt).toLocaleDateString()}</div>
+              <div class="value">Due: ${toDate(selectedInvoice.dueDate).toLocaleDateString()}</div>
               <div style="margin-top: 8px;">
                 <span class="status-badge ${selectedInvoice.status === 'Paid' ? 'status-paid' : 'status-pending'}">
                   ${selectedInvoice.status}
@@ -404,7 +405,7 @@ const Invoices = () => {
                     <td className="py-3 px-4">
                       <div className="flex items-center gap-2 text-sm text-gray-600">
                         <Calendar size={14} />
-                        <span>{invoice.dueDate ? new Date(invoice.dueDate).toLocaleDateString() : 'N/A'}</span>
+                        <span>{invoice.dueDate ? toDate(invoice.dueDate).toLocaleDateString() : 'N/A'}</span>
                       </div>
                     </td>
                     <td className="py-3 px-4">
@@ -479,7 +480,7 @@ const Invoices = () => {
                 </div>
                 <div>
                   <Label>Due Date</Label>
-                  <p>{selectedInvoice.dueDate ? new Date(selectedInvoice.dueDate).toLocaleDateString() : 'N/A'}</p>
+                  <p>{selectedInvoice.dueDate ? toDate(selectedInvoice.dueDate).toLocaleDateString() : 'N/A'}</p>
                 </div>
                 <div>
                   <Label>Type</Label>
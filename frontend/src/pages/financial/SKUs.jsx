@@ -49,7 +49,7 @@ const SKUManager = () => {
       const skuData = {
         ...formData,
         unitPrice: Number(formData.unitPrice),
-        updatedAt: new Date().toISOString(),
+        updatedAt: new Date(),
         updatedBy: user.uid
       };
 
@@ -59,7 +59,7 @@ const SKUManager = () => {
       } else {
         await addDoc(collection(db, 'skus'), {
           ...skuData,
-          createdAt: new Date().toISOString(),
+          createdAt: new Date(),
           createdBy: user.uid
         });
         toast.success('SKU created successfully');
@@ -8,6 +8,7 @@ import { FileText, Clock, CreditCard, Bell, CheckCircle, Circle, Loader2 } from
 import { collection, query, where, onSnapshot, orderBy, doc, updateDoc, addDoc } from 'firebase/firestore';
 import { db } from '../../config/firebase';
 import { toast } from 'sonner';
+import { toDate } from '../../utils/dates';
 
 const HomeownerPortal = () => {
   const { user } = useAuth();
@@ -107,7 +108,7 @@ const HomeownerPortal = () => {
 
   const formatDate = (dateString) => {
     if (!dateString) return 'N/A';
-    return new Date(dateString).toLocaleDateString();
+    return toDate(dateString).toLocaleDateString();
   };
 
   const handleMockPayment = async (invoice) => {
@@ -8,6 +8,7 @@ import { Briefcase, CheckCircle, Clock, TrendingUp, Bell, Loader2 } from 'lucide
 import { collection, query, where, onSnapshot, orderBy, doc, updateDoc } from 'firebase/firestore';
 import { db } from '../../config/firebase';
 import { toast } from 'sonner';
+import { toDate } from '../../utils/dates';
 
 const RooferPortal = () => {
   const { user } = useAuth();
@@ -64,7 +65,7 @@ const RooferPortal = () => {
       await updateDoc(doc(db, 'jobs', jobId), {
         workflowState: 'roofing_complete',
         roofingCompletedAt: new Date().toISOString(),
-        updatedAt: new Date().toISOString(),
+        updatedAt: new Date(),
         updatedBy: user.email
       });
 
@@ -90,7 +91,7 @@ const RooferPortal = () => {
 
   const formatDate = (dateString) => {
     if (!dateString) return 'N/A';
-    return new Date(dateString).toLocaleDateString();
+    return toDate(dateString).toLocaleDateString();
   };
 
   const canMarkRoofComplete = (job) => {
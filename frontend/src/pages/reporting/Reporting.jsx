@@ -9,6 +9,7 @@ import { collection, getDocs, query, where, orderBy } from 'firebase/firestore';
 import { db } from '../../config/firebase';
 import { toast } from 'sonner';
 import moment from 'moment';
+import { toDate } from '../../utils/dates';
 
 const Reporting = () => {
   const { user } = useAuth();
@@ -77,7 +78,7 @@ const Reporting = () => {
       // 3. Calculate Financial Health KPIs
       // Filter invoices by date range
       const periodInvoices = invoices.filter(inv => {
-        const date = moment(inv.createdAt || inv.date);
+        const date = moment(toDate(inv.createdAt) || inv.date);
         return date.isBetween(dateRange.start, dateRange.end, 'day', '[]');
       });
 
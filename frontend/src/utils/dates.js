@@ -0,0 +1,11 @@
+/**
+ * Converts a stored date to a Date.
+ *
+ * Documents hold Firestore Timestamps (written as Date or serverTimestamp()),
+ * while API responses carry ISO strings; both come back as a Date.
+ */
+export const toDate = (value) => {
+    if (!value) return null;
+    if (typeof value.toDate === "function") return value.toDate();
+    return new Date(value);
+};
@@ -6,6 +6,7 @@
 const functions = require("firebase-functions");
 const admin = require("firebase-admin");
 const axios = require("axios");
+const { addNotification } = require("./counters");
 
 // Email service (using SendGrid or similar - placeholder)
 const sendEmail = async (to, subject, htmlBody) => {
@@ -189,7 +190,7 @@ exports.rainCheckAutomation = functions.pubsub
                 }
 
                 // Create notification
-                await db.collection("notifications").add({
+                await addNotification(db, {
                     userId: job.assignedTo || "admin",
                     userRole: "admin",
                     title: "Job Rescheduled Due to Weather",
@@ -197,7 +198,7 @@ exports.rainCheckAutomation = functions.pubsub
                     type: "info",
                     relatedEntityType: "job",
                     relatedEntityId: schedule.jobId,
-                    createdAt: new Date().toISOString(),
+                    createdAt: new Date(),
                     isRead: false,
                 });
 
@@ -210,6 +211,31 @@ exports.rainCheckAutomation = functions.pubsub
         return null;
     });
 
+/**
+ * Fetch the user document for each customer ID using `in` queries of up to
+ * 30 values (Firestore's limit), run concurrently.
+ * Returns a Map of customerId -> user data.
+ */
+async function loadUsersByCustomerId(db, customerIds) {
+    const chunks = [];
+    for (let i = 0; i < customerIds.length; i += 30) {
+        chunks.push(customerIds.slice(i, i + 30));
+    }
+    const results = await Promise.all(
+        chunks.map((chunk) => db.collection("users").where("customerId", "in", chunk).get())
+    );
+    const usersByCustomerId = new Map();
+    for (const snapshot of results) {
+        for (const doc of snapshot.docs) {
+            const user = doc.data();
+            if (!usersByCustomerId.has(user.customerId)) {
+                usersByCustomerId.set(user.customerId, user);
+            }
+        }
+    }
+    return usersByCustomerId;
+}
+
 /**
  * Stalled Job Detection:
  * Detects jobs that haven't progressed in X days and sends alerts
@@ -230,54 +256,58 @@ exports.stalledJobDetection = functions.pubsub
             .where("workflowState", "!=", "closed")
             .get();
 
-        let stalledCount = 0;
-
+        const stalled = [];
         for (const jobDoc of activeJobs.docs) {
             const job = jobDoc.data();
             const lastUpdate = job.updatedAt ? new Date(job.updatedAt) : new Date(job.createdAt);
-            
             if (lastUpdate < cutoffDate) {
-                const daysStalled = Math.floor((new Date() - lastUpdate) / (1000 * 60 * 60 * 24));
+                stalled.push({ jobDoc, job, lastUpdate });
+            }
+        }
 
-                // Get customer
-                const customerRef = db.collection("users").where("customerId", "==", job.customerId).limit(1);
-                const customerDocs = await customerRef.get();
-                
-                if (!customerDocs.empty) {
-                    const customer = customerDocs.docs[0].data();
-                    const email = customer.email;
+        // Look up customers in batches instead of one query per job
+        const customerIds = [...new Set(stalled.map(({ job }) => job.customerId).filter(Boolean))];
+        const customersById = await loadUsersByCustomerId(db, customerIds);
 
-                    // Send email
-                    const emailTemplate = emailTemplates.stalledJob(
-                        jobDoc.id,
-                        job.address?.street || "your location",
-                        daysStalled
-                    );
-                    await sendEmail(email, emailTemplate.subject, emailTemplate.html);
-                }
+        let stalledCount = 0;
 
-                // Create notification for admin
-                await db.collection("notifications").add({
-                    userId: "admin",
-                    userRole: "admin",
-                    title: "Stalled Job Alert",
-                    message: `Job ${jobDoc.id} has not progressed in ${daysStalled} days`,
-                    type: "warning",
-                    relatedEntityType: "job",
-                    relatedEntityId: jobDoc.id,
-                    createdAt: new Date().toISOString(),
-                    isRead: false,
-                });
+        for (const { jobDoc, job, lastUpdate } of stalled) {
+            const daysStalled = Math.floor((new Date() - lastUpdate) / (1000 * 60 * 60 * 24));
 
-                // Mark job as stalled
-                await jobDoc.ref.update({
-                    isStalled: true,
-                    daysStalled: daysStalled,
-                    stalledSince: lastUpdate.toISOString(),
-                });
+            const customer = customersById.get(job.customerId);
+            if (customer) {
+                const email = customer.email;
 
-                stalledCount++;
+                // Send email
+                const emailTemplate = emailTemplates.stalledJob(
+                    jobDoc.id,
+                    job.address?.street || "your location",
+                    daysStalled
+                );
+                await sendEmail(email, emailTemplate.subject, emailTemplate.html);
             }
+
+            // Create notification for admin
+            await addNotification(db, {
+                userId: "admin",
+                userRole: "admin",
+                title: "Stalled Job Alert",
+                message: `Job ${jobDoc.id} has not progressed in ${daysStalled} days`,
+                type: "warning",
+                relatedEntityType: "job",
+                relatedEntityId: jobDoc.id,
+                createdAt: new Date(),
+                isRead: false,
+            });
+
+            // Mark job as stalled
+            await jobDoc.ref.update({
+                isStalled: true,
+                daysStalled: daysStalled,
+                stalledSince: lastUpdate.toISOString(),
+            });
+
+            stalledCount++;
         }
 
         console.log(`Stalled job detection completed: ${stalledCount} jobs flagged`);
@@ -332,7 +362,7 @@ exports.inventoryAlertAutomation = functions.pubsub
                 });
 
                 // Create notification
-                await db.collection("notifications").add({
+                await addNotification(db, {
                     userId: "admin",
                     userRole: "admin",
                     title: "Low Stock Alert",
@@ -340,7 +370,7 @@ exports.inventoryAlertAutomation = functions.pubsub
                     type: "warning",
                     relatedEntityType: "inventory",
                     relatedEntityId: itemDoc.id,
-                    createdAt: new Date().toISOString(),
+                    createdAt: new Date(),
                     isRead: false,
                 });
 
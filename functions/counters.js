@@ -0,0 +1,44 @@
+/**
+ * Sharded counters, same layout as backend/app/data/counters.py:
+ * increments go to one of SHARDS docs in <baseDoc>/counterShards/<field>-<i>
+ * as { field, delta }, and the backend periodically folds shard deltas into
+ * the base document's field.
+ */
+
+const admin = require("firebase-admin");
+
+const SHARDS = 10;
+const SHARD_COLLECTION = "counterShards";
+
+function shardRef(baseRef, field) {
+    const index = Math.floor(Math.random() * SHARDS);
+    return baseRef.collection(SHARD_COLLECTION).doc(`${field}-${index}`);
+}
+
+/**
+ * Add `amount` to a sharded counter. Pass a WriteBatch to include the
+ * increment in it; otherwise it is written immediately.
+ */
+function incrementCounter(db, baseRef, field, amount, batch) {
+    const ref = shardRef(baseRef, field);
+    const data = { field, delta: admin.firestore.FieldValue.increment(amount) };
+    if (batch) {
+        batch.set(ref, data, { merge: true });
+        return null;
+    }
+    return ref.set(data, { merge: true });
+}
+
+/**
+ * Create a notification and count it in the user's unread counter.
+ */
+async function addNotification(db, notification) {
+    const ref = await db.collection("notifications").add(notification);
+    if (!notification.isRead) {
+        const counterRef = db.collection("counters").doc(`notifications.unread.${notification.userId}`);
+        await incrementCounter(db, counterRef, "value", 1);
+    }
+    return ref;
+}
+
+module.exports = { SHARDS, incrementCounter, addNotification };
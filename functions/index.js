@@ -1,5 +1,8 @@
 const functions = require("firebase-functions");
 const admin = require("firebase-admin");
+const { addNotification, incrementCounter } = require("./counters");
+const { addWithRollups } = require("./rollups");
+const { nextNumber } = require("./sequences");
 
 admin.initializeApp();
 
@@ -101,7 +104,7 @@ exports.onJsaSubmitted = functions.firestore
             sourceId: snap.id,
             message: `Pre-work JSA completed by ${data.signatureName || "technician"}`,
             payload: data,
-            createdAt: new Date().toISOString(),
+            createdAt: new Date(),
         });
 
         return null;
@@ -139,7 +142,7 @@ exports.onDamageScanCreated = functions.firestore
             sourceId: snap.id,
             message,
             payload: data,
-            createdAt: new Date().toISOString(),
+            createdAt: new Date(),
         });
 
         return null;
@@ -196,9 +199,8 @@ exports.onJobWorkflowForBom = functions.firestore
 
             components.forEach((comp) => {
                 const itemRef = db.collection("inventoryItems").doc(comp.itemId);
-                batch.update(itemRef, {
-                    totalQuantity: admin.firestore.FieldValue.increment(-Math.abs(comp.quantity)),
-                });
+                // Sharded: many jobs completing at once would contend on the item doc
+                incrementCounter(db, itemRef, "totalQuantity", -Math.abs(comp.quantity), batch);
 
                 const activityRef = activityCol.doc();
                 batch.set(activityRef, {
@@ -207,7 +209,7 @@ exports.onJobWorkflowForBom = functions.firestore
                     quantityChange: -Math.abs(comp.quantity),
                     reference: context.params.jobId,
                     metadata: { ruleId: ruleDoc.id },
-                    createdAt: new Date().toISOString(),
+                    createdAt: new Date(),
                 });
             });
         });
@@ -261,7 +263,7 @@ exports.onInventoryLowStock = functions.firestore
                 totalQuantity: after.totalQuantity,
                 reorderPoint: after.reorderPoint,
             },
-            createdAt: new Date().toISOString(),
+            createdAt: new Date(),
         });
 
         return null;
@@ -587,8 +589,8 @@ exports.autoInvoiceOnJobStatus = functions.firestore
             return null;
         }
 
-        // Generate invoice number
-        const invoiceNumber = `INV-${new Date().getFullYear()}-${String(Math.floor(Math.random() * 10000)).padStart(4, "0")}`;
+        // Numbered from the same sequence as the backend's invoices
+        const invoiceNumber = await nextNumber(db, "INV");
 
         // Calculate due date (30 days from now)
         const dueDate = new Date();
@@ -611,14 +613,15 @@ exports.autoInvoiceOnJobStatus = functions.firestore
             total: invoiceAmount + invoiceAmount * (estimate.taxRate || 0),
             paidAmount: 0,
             balanceDue: invoiceAmount + invoiceAmount * (estimate.taxRate || 0),
-            dueDate: dueDate.toISOString(),
+            dueDate,
             pdfUrl: null,
             notes: `Auto-generated invoice for job ${jobId} at workflow state: ${after.workflowState}`,
-            createdAt: new Date().toISOString(),
-            updatedAt: new Date().toISOString(),
+            createdAt: new Date(),
+            updatedAt: new Date(),
         };
 
-        await db.collection("invoices").add(invoiceData);
+        // Counted in the job, customer and partner rollups in the same batch
+        await addWithRollups(db, "invoices", invoiceData);
 
         console.log(`Auto-generated ${invoiceType} invoice for job ${jobId}: ${invoiceNumber}`);
 
@@ -653,7 +656,7 @@ exports.onDetachWorkflowCreated = functions.firestore
             sourceId: snap.id,
             message: `Detach workflow completed. Production baseline: ${data.productionBaselineKw}kW. Equipment location: ${data.equipmentLocationNotes}`,
             payload: data,
-            createdAt: new Date().toISOString(),
+            createdAt: new Date(),
         });
 
         return null;
@@ -691,7 +694,7 @@ exports.onResetWorkflowCreated = functions.firestore
             sourceId: snap.id,
             message: `Reset workflow completed. String voltage: ${data.stringVoltage}V (${stringSizingStatus}). Commissioning: ${data.commissioningChecklistComplete ? "complete" : "incomplete"}`,
             payload: data,
-            createdAt: new Date().toISOString(),
+            createdAt: new Date(),
         });
 
         return null;
@@ -713,13 +716,19 @@ exports.aggregateDailyKPIs = functions.pubsub
         const today = new Date();
         today.setHours(0, 0, 0, 0);
 
-        // Aggregate revenue
-        const invoices = await db
-            .collection("invoices")
-            .where("createdAt", ">=", yesterday.toISOString())
-            .where("createdAt", "<", today.toISOString())
+        // The three range queries are independent, so run them concurrently
+        const inRange = (collection) => db
+            .collection(collection)
+            .where("createdAt", ">=", yesterday)
+            .where("createdAt", "<", today)
             .get();
+        const [invoices, jobs, jsas] = await Promise.all([
+            inRange("invoices"),
+            inRange("jobs"),
+            inRange("tech_jsa"),
+        ]);
 
+        // Aggregate revenue
         let totalRevenue = 0;
         let totalPaid = 0;
         invoices.forEach((doc) => {
@@ -728,20 +737,6 @@ exports.aggregateDailyKPIs = functions.pubsub
             totalPaid += data.paidAmount || 0;
         });
 
-        // Aggregate jobs
-        const jobs = await db
-            .collection("jobs")
-            .where("createdAt", ">=", yesterday.toISOString())
-            .where("createdAt", "<", today.toISOString())
-            .get();
-
-        // Aggregate compliance
-        const jsas = await db
-            .collection("tech_jsa")
-            .where("createdAt", ">=", yesterday.toISOString())
-            .where("createdAt", "<", today.toISOString())
-            .get();
-
         // Store aggregated data
         const kpiDoc = {
             date: yesterday.toISOString().split("T")[0],
@@ -759,7 +754,7 @@ exports.aggregateDailyKPIs = functions.pubsub
                 jsasCompleted: jsas.size,
                 jsaCompletionRate: jobs.size > 0 ? (jsas.size / jobs.size) * 100 : 0,
             },
-            createdAt: new Date().toISOString(),
+            createdAt: new Date(),
         };
 
         // Group jobs by status
@@ -790,7 +785,7 @@ exports.generateWeeklyComplianceReport = functions.pubsub
         // Get all jobs from last week
         const jobs = await db
             .collection("jobs")
-            .where("createdAt", ">=", weekAgo.toISOString())
+            .where("createdAt", ">=", weekAgo)
             .get();
 
         const jobIds = jobs.docs.map((doc) => doc.id);
@@ -833,14 +828,14 @@ exports.generateWeeklyComplianceReport = functions.pubsub
                 .get();
 
             admins.forEach((adminDoc) => {
-                db.collection("notifications").add({
+                addNotification(db, {
                     userId: adminDoc.id,
                     userRole: "admin",
                     title: "Low Compliance Rate Alert",
                     message: `Weekly compliance rate is ${complianceRate.toFixed(1)}% (${jsasCount}/${totalJobs} jobs with JSA)`,
                     type: "warning",
                     relatedEntityType: "compliance_report",
-                    createdAt: new Date().toISOString(),
+                    createdAt: new Date(),
                     isRead: false,
                 });
             });
@@ -0,0 +1,70 @@
+/**
+ * Rollup increments, same layout as backend/app/data/rollups.py: a source
+ * document adds its totals to the rollups its key fields name, committed
+ * in one batch with the source write so a rollup never misses it.
+ *
+ * Only the sources the functions create are declared here; keep them in
+ * step with SOURCES in rollups.py.
+ */
+
+const admin = require("firebase-admin");
+
+function label(value, fallback) {
+    return String(value || fallback);
+}
+
+function invoiceTotals(data) {
+    return {
+        "invoices.count": 1,
+        [`invoices.byStatus.${label(data.status, "Draft")}`]: 1,
+        "invoices.total": data.total || 0,
+        "invoices.paid": data.paidAmount || 0,
+        "invoices.balance": data.balanceDue || 0,
+    };
+}
+
+const SOURCES = {
+    invoices: [
+        { rollup: "job_rollups", key: "jobId", totals: invoiceTotals },
+        { rollup: "customer_rollups", key: "customerId", totals: invoiceTotals },
+        { rollup: "partner_rollups", key: "partnerId", totals: invoiceTotals },
+    ],
+};
+
+function nest(flat) {
+    const nested = {};
+    for (const [path, value] of Object.entries(flat)) {
+        const parts = path.split(".");
+        const last = parts.pop();
+        let node = nested;
+        for (const part of parts) {
+            node = node[part] = node[part] || {};
+        }
+        node[last] = value;
+    }
+    return nested;
+}
+
+/**
+ * Create `data` as a new document of `collection` and apply its rollup
+ * increments in the same batch. Returns the new document's reference.
+ */
+async function addWithRollups(db, collection, data) {
+    const ref = db.collection(collection).doc();
+    const batch = db.batch();
+    batch.create(ref, data);
+    for (const contribution of SOURCES[collection] || []) {
+        const key = data[contribution.key];
+        if (!key) continue;
+        const fields = {};
+        for (const [path, amount] of Object.entries(contribution.totals(data))) {
+            if (amount) fields[path] = admin.firestore.FieldValue.increment(amount);
+        }
+        fields.updatedAt = new Date();
+        batch.set(db.collection(contribution.rollup).doc(key), nest(fields), { merge: true });
+    }
+    await batch.commit();
+    return ref;
+}
+
+module.exports = { SOURCES, addWithRollups };
@@ -0,0 +1,36 @@
+/**
+ * Number sequences, same layout as backend/app/data/sequences.py: each
+ * sequence is one sequences/{prefix-year} document holding the next
+ * unleased number. The functions lease a block of one number per call in
+ * a transaction, so they never hand out a number the backend has leased.
+ */
+
+const admin = require("firebase-admin");
+
+const SEQUENCES_COLLECTION = "sequences";
+
+/**
+ * Format the next number of the `prefix` sequence for this year,
+ * e.g. INV-2026-000042.
+ */
+async function nextNumber(db, prefix, width = 6) {
+    const year = new Date().getUTCFullYear();
+    const ref = db.collection(SEQUENCES_COLLECTION).doc(`${prefix.toLowerCase()}-${year}`);
+    const number = await db.runTransaction(async (transaction) => {
+        const snap = await transaction.get(ref);
+        const start = (snap.exists && snap.data().next) || 1;
+        transaction.set(
+            ref,
+            {
+                next: start + 1,
+                leasedBy: "functions",
+                leasedAt: admin.firestore.FieldValue.serverTimestamp(),
+            },
+            { merge: true },
+        );
+        return start;
+    });
+    return `${prefix}-${year}-${String(number).padStart(width, "0")}`;
+}
+
+module.exports = { nextNumber };
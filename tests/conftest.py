@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The API and its benchmarks import as ``app`` and ``benchmarks`` from backend/
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
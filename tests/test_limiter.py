@@ -0,0 +1,45 @@
+"""``AdaptiveLimiter`` slot accounting (``app.data.limiter``)."""
+import asyncio
+
+from app.data.limiter import AdaptiveLimiter, Priority
+
+
+def test_cancelled_waiter_gives_its_slot_back():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+        await limiter.acquire(Priority.NORMAL)
+        waiter = asyncio.ensure_future(limiter.acquire(Priority.NORMAL))
+        await asyncio.sleep(0)
+        assert limiter.stats()["waiting"]["normal"] == 1
+
+        # Hand the slot over, then cancel the waiter before it runs
+        limiter.release(1.0, sample=False)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        if not waiter.cancelled():
+            # Some Pythons' wait_for return the result over a late cancel;
+            # the caller then holds the slot and releases it as usual
+            limiter.release(1.0, sample=False)
+
+        assert limiter.in_flight == 0
+        assert limiter.stats()["waiting"]["normal"] == 0
+        await asyncio.wait_for(limiter.acquire(Priority.NORMAL), 0.1)
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_queued_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+        await limiter.acquire(Priority.NORMAL)
+        waiter = asyncio.ensure_future(limiter.acquire(Priority.NORMAL))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert limiter.stats()["waiting"]["normal"] == 0
+        limiter.release(1.0, sample=False)
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
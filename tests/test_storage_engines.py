@@ -0,0 +1,40 @@
+"""
+The storage engine contract (``benchmarks.storage_engines``) as tests.
+
+Each check runs against the embedded SQLite engine and against Firestore.
+The Firestore leg needs the emulator (``FIRESTORE_EMULATOR_HOST``) and is
+skipped without it, so it never touches a live project.
+"""
+import os
+
+import pytest
+
+from benchmarks.storage_engines import CHECKS, Contract, connect
+
+ENGINES = [
+    "sqlite",
+    pytest.param(
+        "firestore",
+        marks=pytest.mark.skipif(
+            not os.environ.get("FIRESTORE_EMULATOR_HOST"),
+            reason="FIRESTORE_EMULATOR_HOST is not set",
+        ),
+    ),
+]
+
+
+@pytest.fixture(scope="module", params=ENGINES)
+def client(request):
+    return connect(request.param)
+
+
+@pytest.fixture
+def contract(client):
+    contract = Contract(client)
+    yield contract
+    contract.cleanup()
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=lambda check: check.__name__)
+def test_contract(contract, check):
+    check(contract)
@@ -0,0 +1,30 @@
+"""The request identity map (``app.data.unit_of_work``)."""
+from types import SimpleNamespace
+
+from app.data.snapshots import LocalSnapshot
+from app.data.unit_of_work import UnitOfWork
+
+REF = SimpleNamespace(id="j1", path="jobs/j1")
+
+
+def test_merge_set_keeps_sibling_keys_of_nested_maps():
+    unit = UnitOfWork()
+    unit.remember(
+        REF,
+        LocalSnapshot("j1", {"address": {"street": "1 Main", "city": "Austin"}, "status": "open"}),
+    )
+
+    unit.record_set(REF, {"address": {"city": "Dallas"}}, update_time=None, merge=True)
+
+    assert unit.lookup(REF).to_dict() == {
+        "address": {"street": "1 Main", "city": "Dallas"},
+        "status": "open",
+    }
+
+
+def test_merge_set_of_an_unknown_document_is_not_remembered():
+    unit = UnitOfWork()
+
+    unit.record_set(REF, {"address": {"city": "Dallas"}}, update_time=None, merge=True)
+
+    assert unit.lookup(REF) is None